@@ -0,0 +1,155 @@
+"""
+Update throughput of the sharded launcher with 1 vs N worker processes.
+
+Each worker is the real worker app (batch endpoint, per-user lanes, FSM
+middleware) with one handler doing the CPU work a typical trade screen does:
+Fernet-decrypting a seed, building a keypair from base58, parsing a
+DexScreener-sized JSON payload, rendering HTML and building a keyboard.
+Synthetic updates from --users users are routed by user id through the
+launcher's Shard queues over local HTTP. Needs no network, database or real
+bot token:
+
+    python -m benchmarks.shard_throughput --workers 1 2 4 --updates 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+import aiohttp
+import base58
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiohttp import web
+from cryptography.fernet import Fernet
+from solders.keypair import Keypair
+
+from benchmarks.webhook_load import synthetic_update
+from bot.middlewares.lanes import UserLanesMiddleware
+from bot.services.sharding import Shard, build_worker_app, route
+
+PAIRS = [
+    {
+        "chainId": "solana",
+        "pairAddress": f"pair{i:040d}",
+        "baseToken": {"address": f"mint{i:040d}", "name": f"Token {i}", "symbol": f"TK{i}"},
+        "priceUsd": f"{0.0001 * (i + 1):.8f}",
+        "liquidity": {"usd": 125_000.5 * (i + 1)},
+        "volume": {"h24": 98_000.25 * (i + 1), "h6": 21_000.0, "h1": 4_000.0},
+        "priceChange": {"h24": -3.2, "h6": 1.1, "h1": 0.4},
+        "fdv": 1_200_000 * (i + 1),
+        "marketCap": 900_000 * (i + 1),
+    }
+    for i in range(30)
+]
+PAYLOAD = json.dumps({"schemaVersion": "1.0.0", "pairs": PAIRS})
+
+
+def serve(port: int) -> None:
+    fernet = Fernet(os.environ["BENCH_FERNET_KEY"].encode())
+    seed_token = fernet.encrypt(base58.b58encode(bytes(Keypair())))
+    processed = 0
+    router = Router()
+
+    @router.message()
+    async def on_message(message: Message):
+        nonlocal processed
+        keypair = Keypair.from_bytes(base58.b58decode(fernet.decrypt(seed_token)))
+        pairs = json.loads(PAYLOAD)["pairs"]
+        lines = [f"<b>{p['baseToken']['name']}</b> | <code>{p['baseToken']['address']}</code>\n"
+                 f"💵 ${float(p['priceUsd']):.8f} · 💧 ${p['liquidity']['usd']:,.0f} · "
+                 f"📈 {p['priceChange']['h24']:+.2f}%" for p in pairs[:10]]
+        text = f"Wallet <code>{keypair.pubkey()}</code>\n\n" + "\n".join(lines)
+        builder = InlineKeyboardBuilder()
+        for p in pairs[:10]:
+            builder.button(text=f"Buy {p['baseToken']['symbol']}", callback_data=f"buy:{p['baseToken']['address'][:40]}")
+        builder.adjust(2)
+        builder.as_markup()
+        processed += 1
+
+    dp = Dispatcher(disable_fsm=True)
+    dp.update.outer_middleware(UserLanesMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+    dp.include_router(router)
+    bot = Bot(token="42:LOCAL-SHARD-BENCHMARK")
+
+    app = build_worker_app(dp, bot, secret=os.environ["WORKER_SECRET"])
+
+    async def count(request: web.Request) -> web.Response:
+        return web.json_response({"processed": processed})
+
+    app.router.add_get("/processed", count)
+    web.run_app(app, host="127.0.0.1", port=port, print=None)
+
+
+async def measure(workers: int, updates: int, users: int, base_port: int) -> float:
+    secret = secrets.token_urlsafe(32)
+    env = {**os.environ, "WORKER_SECRET": secret, "BENCH_FERNET_KEY": Fernet.generate_key().decode()}
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.shard_throughput", "--serve", str(i), "--port", str(base_port + i)],
+            env=env,
+        )
+        for i in range(workers)
+    ]
+    shards = [Shard(i, secret, base_port) for i in range(workers)]
+    try:
+        async with aiohttp.ClientSession() as http:
+            async def processed() -> int:
+                total = 0
+                for i in range(workers):
+                    async with http.get(f"http://127.0.0.1:{base_port + i}/processed") as resp:
+                        total += (await resp.json())["processed"]
+                return total
+
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    await processed()
+                    break
+                except aiohttp.ClientError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("workers didn't start")
+                    await asyncio.sleep(0.2)
+
+            senders = [asyncio.create_task(shard.run_sender(http)) for shard in shards]
+            started = time.perf_counter()
+            route(shards, [synthetic_update(i, users) for i in range(1, updates + 1)])
+            while await processed() < updates:
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - started
+            for task in senders:
+                task.cancel()
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+    return updates / elapsed
+
+
+async def main(worker_counts: list[int], updates: int, users: int, base_port: int) -> None:
+    print(f"{updates} updates from {users} users, {os.cpu_count()} CPUs\n")
+    baseline = None
+    for workers in worker_counts:
+        rate = await measure(workers, updates, users, base_port)
+        baseline = baseline or rate
+        print(f"{workers:>2} workers: {rate:>8,.0f} updates/s  (x{rate / baseline:.2f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve is not None:
+        serve(args.port)
+    else:
+        asyncio.run(main(args.workers, args.updates, args.users, args.port))
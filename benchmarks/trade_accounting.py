@@ -0,0 +1,112 @@
+"""
+CPU cost of the per-trade accounting done in Python, old vs new.
+
+"decimal" replays the previous path: bridge amounts turned into Decimal
+whole tokens and USD, float round-trips through Decimal(str(...)) and a
+proportional Decimal cost-basis reduction on sells. "integer" is the current
+path: lamports, atomic units and micro-USDC with integer arithmetic only.
+Needs no database or network:
+
+    python -m benchmarks.trade_accounting --trades 200000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+LAMPORTS_PER_SOL = 1_000_000_000
+MICRO_USDC_PER_USDC = 1_000_000
+DECIMALS = 6
+
+
+def make_swaps(n: int) -> list[tuple[bool, int, int]]:
+    rng = random.Random(42)
+    swaps = []
+    for i in range(n):
+        buy = i % 2 == 0
+        lamports = rng.randint(10_000_000, 5_000_000_000)
+        units = rng.randint(1_000_000, 10**12)
+        swaps.append((buy, lamports if buy else units, units if buy else lamports))
+    return swaps
+
+
+def account_decimal(swaps, sol_price: float, fee_lamports: int) -> Decimal:
+    sol_price = Decimal(sol_price)
+    fee_usdc = Decimal(fee_lamports) / Decimal(1_000_000_000) * sol_price
+    pow_ = Decimal(10) ** DECIMALS
+    amount, entry, realized = Decimal(0), Decimal(0), Decimal(0)
+    for buy, in_amount, out_amount in swaps:
+        in_amount, out_amount = Decimal(in_amount), Decimal(out_amount)
+        if buy:
+            delta_usdc = (in_amount / Decimal(1e9)) * sol_price
+            delta_tokens = out_amount / pow_
+        else:
+            delta_usdc = (out_amount / Decimal(1e9)) * sol_price - fee_usdc
+            delta_tokens = -(in_amount / pow_)
+        # record_swap_and_update took floats
+        delta_usdc = Decimal(str(float(delta_usdc)))
+        delta_tokens = Decimal(str(float(delta_tokens)))
+        if abs(delta_tokens) < Decimal("0.000001"):
+            continue
+        if delta_tokens > 0:
+            amount += delta_tokens
+            entry += delta_usdc
+        elif amount > 0:
+            sold = min(-delta_tokens, amount)
+            remaining = amount - sold
+            new_entry = entry * remaining / amount
+            pnl = abs(delta_usdc) - (entry - new_entry)
+            amount, entry = remaining, new_entry
+            if pnl > 0:
+                realized += pnl
+    return realized
+
+
+def account_integer(swaps, sol_price: float, fee_lamports: int) -> int:
+    sol_price_micro = int(Decimal(sol_price) * MICRO_USDC_PER_USDC)
+    fee_usdc = fee_lamports * sol_price_micro // LAMPORTS_PER_SOL
+    amount, entry, realized = 0, 0, 0
+    for buy, in_amount, out_amount in swaps:
+        if buy:
+            delta_usdc = in_amount * sol_price_micro // LAMPORTS_PER_SOL
+            delta_tokens = out_amount
+        else:
+            delta_usdc = out_amount * sol_price_micro // LAMPORTS_PER_SOL - fee_usdc
+            delta_tokens = -in_amount
+        if delta_tokens == 0:
+            continue
+        if delta_tokens > 0:
+            amount += delta_tokens
+            entry += delta_usdc
+        elif amount > 0:
+            remaining = amount - min(-delta_tokens, amount)
+            new_entry = entry * remaining // amount
+            pnl = abs(delta_usdc) - (entry - new_entry)
+            amount, entry = remaining, new_entry
+            if pnl > 0:
+                realized += pnl
+    return realized
+
+
+def bench(fn, swaps) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = fn(swaps, 151.37, 100_000)
+    return (time.perf_counter() - started) / len(swaps) * 1e6, result
+
+
+def main(trades: int) -> None:
+    swaps = make_swaps(trades)
+    dec_us, dec_realized = bench(account_decimal, swaps)
+    int_us, int_realized = bench(account_integer, swaps)
+
+    print(f"trades:          {trades}")
+    print(f"decimal µs/trade: {dec_us:.3f}")
+    print(f"integer µs/trade: {int_us:.3f}  ({dec_us / int_us:.1f}x faster)")
+    print(f"realized, decimal: ${dec_realized:.6f}")
+    print(f"realized, integer: ${Decimal(int_realized) / MICRO_USDC_PER_USDC:.6f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=200_000)
+    main(parser.parse_args().trades)
@@ -0,0 +1,107 @@
+"""
+Statements, commits and wall time per recorded and per credited trade.
+
+Runs against the Postgres configured through the usual POSTGRES_* variables
+and cleans up after itself:
+
+    python -m benchmarks.trade_recording --trades 200 --batch 1
+
+Trades are recorded as PENDING rows (record_swap_and_update, one INSERT and
+one commit each), then credited the way the confirmation tracker does it:
+confirm_trades on `--batch` trade ids at a time, which flips them to
+CONFIRMED and runs apply_fills (position upserts, UPDATE ... FROM for sells,
+the user's PnL) and the realized PnL write-back in one transaction.
+
+Before single-transaction recording a sell took 7-10 statements and 3-4
+commits (position selected twice, user selected, separate commits in each
+helper); crediting one now takes 2 statements for a buy and 3-5 for a sell
+in one commit, and a batch shares its statements between trades.
+"""
+import argparse
+import asyncio
+import random
+import time
+from decimal import Decimal
+
+from sqlalchemy import delete, event, select
+
+from bot.database.db import engine, async_session
+from bot.database.models import User, Trade, Position
+from bot.utils.pnl import confirm_trades, record_swap_and_update
+
+TOKEN = "BenchToken1111111111111111111111111111111111"
+WALLET = "BenchWallet111111111111111111111111111111111"
+
+
+async def main(trades: int, batch: int) -> None:
+    counters = {"statements": 0, "commits": 0}
+
+    def on_execute(*_):
+        counters["statements"] += 1
+
+    def on_commit(*_):
+        counters["commits"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    event.listen(engine.sync_engine, "commit", on_commit)
+
+    async with async_session() as session:
+        user = User(telegram_id=-random.randint(1, 2**40))
+        session.add(user)
+        await session.commit()
+
+    results = {}
+    try:
+        counters.update(statements=0, commits=0)
+        started = time.perf_counter()
+        for i in range(trades):
+            buy = i % 2 == 0
+            async with async_session() as session:
+                await record_swap_and_update(
+                    session=session,
+                    user_id=user.id,
+                    wallet_address=WALLET,
+                    token=TOKEN,
+                    delta_usdc=10_000_000 if buy else 12_000_000,
+                    delta_tokens=1_000_000_000 if buy else -500_000_000,
+                    price_per_token=Decimal("0.01"),
+                    txid=f"bench-{i}",
+                )
+        results["record"] = (dict(counters), time.perf_counter() - started, trades)
+
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(Trade.id, Trade.created_at).where(Trade.user_id == user.id).order_by(Trade.id)
+            )).all()
+
+        counters.update(statements=0, commits=0)
+        credited = 0
+        started = time.perf_counter()
+        for i in range(0, len(rows), batch):
+            chunk = rows[i:i + batch]
+            async with async_session() as session:
+                credited += await confirm_trades(
+                    session, [r.id for r in chunk], min(r.created_at for r in chunk)
+                )
+        results["confirm"] = (dict(counters), time.perf_counter() - started, credited)
+    finally:
+        async with async_session() as session:
+            await session.execute(delete(Trade).where(Trade.user_id == user.id))
+            await session.execute(delete(Position).where(Position.user_id == user.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+
+    print(f"trades:               {trades} (credited in batches of {batch})")
+    for phase, (counted, elapsed, n) in results.items():
+        print(f"{phase}:")
+        print(f"  statements per trade: {counted['statements'] / n:.2f}")
+        print(f"  commits per trade:    {counted['commits'] / n:.2f}")
+        print(f"  ms per trade:         {elapsed / n * 1000:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1, help="trade ids per confirm_trades call")
+    args = parser.parse_args()
+    asyncio.run(main(args.trades, args.batch))
@@ -0,0 +1,118 @@
+"""
+Local check of webhook mode: serves the real webhook app on 127.0.0.1 with a
+dispatcher whose only handler sleeps --handler-ms, then delivers synthetic
+updates over HTTP the way Telegram does. Verifies that a wrong secret is
+rejected, that every update is acknowledged without waiting for its handler
+and that all of them reach the dispatcher. Needs no network, database or
+real bot token; exits with status 1 on any failure:
+
+    python -m benchmarks.webhook_load --updates 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import web
+
+from bot.services.webhook import build_webhook_app
+
+SECRET = "local-load-test"
+PATH = "/webhook"
+
+
+def synthetic_update(update_id: int, users: int) -> dict:
+    user_id = 1_000 + update_id % users
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "text": "/ping",
+        },
+    }
+
+
+def pct(sorted_values: list[float], p: float) -> float:
+    return sorted_values[max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))]
+
+
+async def main(updates: int, concurrency: int, users: int, handler_ms: float) -> int:
+    handled: set[int] = set()
+    router = Router()
+
+    @router.message()
+    async def on_message(message: Message):
+        await asyncio.sleep(handler_ms / 1000)
+        handled.add(message.message_id)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="42:LOCAL-WEBHOOK-LOAD-TEST")
+
+    runner = web.AppRunner(build_webhook_app(dp, bot, secret=SECRET, path=PATH))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}{PATH}"
+
+    failures = []
+    ack_ms: list[float] = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"http://{host}:{port}/healthz") as resp:
+            if resp.status != 200:
+                failures.append(f"/healthz returned {resp.status}")
+
+        async with http.post(url, json=synthetic_update(0, users),
+                             headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as resp:
+            if resp.status != 401:
+                failures.append(f"wrong secret returned {resp.status}, expected 401")
+
+        async def deliver(update_id: int) -> None:
+            async with gate:
+                started = time.perf_counter()
+                async with http.post(url, json=synthetic_update(update_id, users),
+                                     headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as resp:
+                    ack_ms.append((time.perf_counter() - started) * 1000)
+                    if resp.status != 200:
+                        failures.append(f"update {update_id} returned {resp.status}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(deliver(i) for i in range(1, updates + 1)))
+        acked_in = time.perf_counter() - started
+
+        deadline = time.monotonic() + 30
+        while len(handled) < updates and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        handled_in = time.perf_counter() - started
+
+    await runner.cleanup()
+
+    if len(handled) < updates:
+        failures.append(f"only {len(handled)} of {updates} updates reached the dispatcher")
+
+    ack_ms.sort()
+    print(f"updates:  {updates} from {users} users, {concurrency} concurrent requests")
+    print(f"acked:    {acked_in:.2f} s ({updates / acked_in:,.0f}/s), "
+          f"ack p50 {pct(ack_ms, 50):.1f} ms, p99 {pct(ack_ms, 99):.1f} ms")
+    print(f"handled:  {len(handled)} in {handled_in:.2f} s (handler takes {handler_ms:g} ms)")
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--handler-ms", type=float, default=50)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.updates, args.concurrency, args.users, args.handler_ms)))
@@ -1,14 +1,91 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+import logging
 import os
+import time
+
 from dotenv import load_dotenv
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from bot.utils.metrics import observe
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = (
     f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
     f"@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
 )
 
-engine = create_async_engine(DATABASE_URL)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT_SEC = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# asyncpg prepared statement cache per connection; 0 behind pgbouncer in transaction mode
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+
+pool_timeouts = 0
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited and counts timeouts."""
+
+    def _do_get(self):
+        global pool_timeouts
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts += 1
+            logger.warning(f"[DB] Pool checkout timed out: {self.status()}")
+            raise
+        finally:
+            observe("db.pool_wait", (time.perf_counter() - started) * 1000)
+
+
+engine = create_async_engine(
+    f"{DATABASE_URL}?prepared_statement_cache_size={STATEMENT_CACHE_SIZE}",
+    poolclass=InstrumentedPool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT_SEC,
+    pool_recycle=POOL_RECYCLE_SEC,
+    pool_pre_ping=POOL_PRE_PING,
+)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+
+def pool_stats() -> dict[str, int]:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": MAX_OVERFLOW,
+        "timeouts": pool_timeouts,
+    }
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+    observe("db.query", elapsed_ms)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(f"[DB] Slow query {elapsed_ms:.0f} ms: {' '.join(statement.split())[:500]}")
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _drop_query_timer(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
@@ -0,0 +1,251 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage
+from dotenv import load_dotenv
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from bot.database.db import async_session
+from bot.database.models import FsmRecord
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+FSM_BACKEND = os.getenv("FSM_STORAGE", "postgres")  # postgres | redis | memory
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+FSM_TTL = timedelta(days=int(os.getenv("FSM_TTL_DAYS", "7")))
+# Writes to the same key within this window reach the backend once
+FLUSH_DELAY_SEC = 0.05
+# A key whose flush fails is retried with exponential backoff, then given up on
+FLUSH_MAX_BACKOFF_SEC = 30
+FLUSH_MAX_RETRIES = 10
+# How long a clean entry is served from memory without re-reading the backend
+CACHE_TTL_SEC = 60
+PURGE_INTERVAL_SEC = 60 * 60
+
+
+def _state_name(state: StateType) -> str | None:
+    return state.state if isinstance(state, State) else state
+
+
+class PostgresStorage(BaseStorage):
+    """FSM records in the fsm_storage table; a record expires FSM_TTL after its last write."""
+
+    def __init__(self, ttl: timedelta = FSM_TTL):
+        self.ttl = ttl
+
+    @staticmethod
+    def build_key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def _upsert(self, key: StorageKey, **values) -> None:
+        values["expires_at"] = func.now() + self.ttl
+        stmt = pg_insert(FsmRecord).values(key=self.build_key(key), **values)
+        async with async_session() as session:
+            await session.execute(stmt.on_conflict_do_update(index_elements=[FsmRecord.key], set_=values))
+            await session.commit()
+
+    async def _select(self, key: StorageKey, column):
+        async with async_session() as session:
+            return await session.scalar(
+                select(column).where(
+                    FsmRecord.key == self.build_key(key),
+                    FsmRecord.expires_at > func.now(),
+                )
+            )
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._upsert(key, state=_state_name(state))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return await self._select(key, FsmRecord.state)
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await self._upsert(key, data=data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict(await self._select(key, FsmRecord.data) or {})
+
+    async def purge_expired(self) -> int:
+        async with async_session() as session:
+            result = await session.execute(delete(FsmRecord).where(FsmRecord.expires_at <= func.now()))
+            await session.commit()
+        return result.rowcount
+
+    async def close(self) -> None:
+        pass
+
+
+class _Entry:
+    __slots__ = ("state", "data", "loaded_at")
+
+    def __init__(self, state: str | None, data: dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.loaded_at = time.monotonic()
+
+
+class CoalescingStorage(BaseStorage):
+    """
+    In-memory front for a shared storage backend. Reads are served from memory
+    once a key is loaded; writes update memory and return immediately, and a
+    background flush sends each changed key to the backend once per
+    FLUSH_DELAY_SEC however many times it changed in between.
+
+    Only correct while each user's updates are handled by one process, in
+    order: polling, or a sharded worker (see the per-user lanes). Load
+    balanced webhook replicas use the backend directly instead.
+    """
+
+    def __init__(self, backend: BaseStorage, flush_delay: float = FLUSH_DELAY_SEC, cache_ttl: float = CACHE_TTL_SEC):
+        self.backend = backend
+        self.flush_delay = flush_delay
+        self.cache_ttl = cache_ttl
+        self._entries: dict[StorageKey, _Entry] = {}
+        # key → which parts changed since the last flush: {"state", "data"}
+        self._dirty: dict[StorageKey, set[str]] = {}
+        # key → (failed flushes in a row, monotonic time of the next attempt)
+        self._retry: dict[StorageKey, tuple[int, float]] = {}
+        self._flusher: asyncio.Task | None = None
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        entry = self._entries.get(key)
+        if entry is not None and (key in self._dirty or time.monotonic() - entry.loaded_at < self.cache_ttl):
+            return entry
+
+        state = await self.backend.get_state(key)
+        data = await self.backend.get_data(key)
+        if key in self._dirty:
+            # Written locally while we were reading — the local copy is newer
+            return self._entries[key]
+        entry = self._entries[key] = _Entry(state, data)
+        return entry
+
+    def _mark_dirty(self, key: StorageKey, part: str) -> None:
+        self._dirty.setdefault(key, set()).add(part)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = _state_name(state)
+        self._mark_dirty(key, "state")
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        # Fail in the handler that stores something unserializable, not in the background flush
+        json.dumps(data)
+        entry = await self._entry(key)
+        entry.data = data.copy()
+        self._mark_dirty(key, "data")
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._entry(key)).data.copy()
+
+    async def flush(self, force: bool = False) -> None:
+        """Write changed keys to the backend; keys backing off after a failure wait unless `force`."""
+        dirty, self._dirty = self._dirty, {}
+        try:
+            for key in list(dirty):
+                failures, retry_at = self._retry.get(key, (0, 0.0))
+                if not force and retry_at > time.monotonic():
+                    continue
+                entry = self._entries[key]
+                try:
+                    if "state" in dirty[key]:
+                        await self.backend.set_state(key, entry.state)
+                    if "data" in dirty[key]:
+                        await self.backend.set_data(key, entry.data.copy())
+                    del dirty[key]
+                    self._retry.pop(key, None)
+                except Exception as e:
+                    failures += 1
+                    if failures >= FLUSH_MAX_RETRIES:
+                        logger.error(f"[FSM] Giving up on {key.user_id}/{key.destiny} after {failures} failed flushes: {e}")
+                        del dirty[key]
+                        self._retry.pop(key, None)
+                        continue
+                    delay = min(self.flush_delay * 2 ** failures, FLUSH_MAX_BACKOFF_SEC)
+                    self._retry[key] = (failures, time.monotonic() + delay)
+                    logger.warning(f"[FSM] Flush of {key.user_id}/{key.destiny} failed, retrying in {delay:.1f}s: {e}")
+        finally:
+            # Failed or interrupted keys go back in the queue, merged with newer changes
+            for key, parts in dirty.items():
+                self._dirty.setdefault(key, set()).update(parts)
+
+        # Forget clean entries nobody read recently
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if k not in self._dirty and now - e.loaded_at >= self.cache_ttl]:
+            del self._entries[key]
+
+    async def _flush_loop(self) -> None:
+        # Keys backing off are skipped without touching the backend, so the
+        # loop keeps its pace for fresh writes during an outage
+        while True:
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+            if not self._dirty:
+                return
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            # Let an interrupted flush put its keys back into _dirty first
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+        await self.flush(force=True)
+        await self.backend.close()
+
+
+def create_fsm_storage(coalesce: bool = True) -> BaseStorage:
+    """
+    FSM storage selected by FSM_STORAGE: Postgres (default) or any
+    Redis-protocol server at REDIS_URL, or plain process memory for local
+    development. With `coalesce` the shared backends sit behind
+    CoalescingStorage; without it every read and write goes straight to the
+    backend, for processes that don't own their users' updates.
+    """
+    if FSM_BACKEND == "memory":
+        return MemoryStorage()
+
+    if FSM_BACKEND == "redis":
+        # Optional dependency: pip install redis
+        from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
+
+        backend = RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=FSM_TTL,
+            data_ttl=FSM_TTL,
+        )
+    else:
+        backend = PostgresStorage()
+    return CoalescingStorage(backend) if coalesce else backend
+
+
+async def run_fsm_purger(storage: BaseStorage, interval: float = PURGE_INTERVAL_SEC) -> None:
+    """Delete expired Postgres FSM records; a no-op for other backends."""
+    backend = getattr(storage, "backend", storage)
+    if not isinstance(backend, PostgresStorage):
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await backend.purge_expired()
+            if purged:
+                logger.info(f"[FSM] Purged {purged} expired records")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[FSM] Purge failed: {e}")
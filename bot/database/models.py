@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, BigInteger, Text, ForeignKey, DateTime, Numeric, Enum, String, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, Text, ForeignKey, DateTime, Numeric, Enum, String, UniqueConstraint, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db import Base
@@ -11,8 +12,20 @@ class TradeType(enum.Enum):
     SELL = "SELL"
 
 
+class TradeStatus(enum.Enum):
+    PENDING = "PENDING"      # sent, not yet seen by the cluster
+    CONFIRMED = "CONFIRMED"  # reached confirmed/finalized commitment
+    FAILED = "FAILED"        # landed with an error
+    DROPPED = "DROPPED"      # never landed before its blockhash expired
+
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_referred_by", "referred_by"),
+        # Leaderboard order and rank counting
+        Index("ix_users_points", text("points DESC"), "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     telegram_id = Column(BigInteger, unique=True, nullable=False)
@@ -28,10 +41,15 @@ class User(Base):
     trades = relationship("Trade", back_populates="user")
     slippage_tolerance = Column(Integer, default=1)
     tx_fee = Column(Numeric(asdecimal=True), default=0.001)
+    fee_mode = Column(Text, default="fixed")  # "fixed" or "auto"
 
 
 class Wallet(Base):
     __tablename__ = "wallets"
+    __table_args__ = (
+        Index("ix_wallets_user_id", "user_id", "id"),
+        Index("ix_wallets_address", "address"),
+    )
 
     id = Column(Integer, primary_key=True)
     address = Column(Text, nullable=False)
@@ -43,21 +61,32 @@ class Wallet(Base):
 
 class Trade(Base):
     __tablename__ = "trades"
+    __table_args__ = (
+        Index("ix_trades_pending", "id", postgresql_where=text("status = 'PENDING'")),
+        Index("ix_trades_txid", "txid"),
+        Index("ix_trades_user_created", "user_id", "created_at", "id"),
+        Index("ix_trades_user_token", "user_id", "token"),
+        Index("ix_trades_wallet", "wallet_address"),
+        # Monthly partitions are created and archived by bot.services.partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id = Column(Integer, primary_key=True)
+    # The partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     token = Column(Text, nullable=False)
     wallet_address = Column(Text, nullable=False)
 
     type = Column(Enum(TradeType), nullable=False)  # BUY or SELL
-    token_amount = Column(Numeric(asdecimal=True), nullable=False)
-    amount_usdc = Column(Numeric(asdecimal=True), nullable=False)
-    price_per_token = Column(Numeric(asdecimal=True), nullable=True)
+    token_amount = Column(BigInteger, nullable=False)   # token atomic units
+    amount_usdc = Column(BigInteger, nullable=False)    # micro-USDC
+    price_per_token = Column(Numeric(asdecimal=True), nullable=True)  # USD per whole token, informational
 
-    realized_pnl = Column(Numeric(asdecimal=True), nullable=True)
+    realized_pnl = Column(BigInteger, nullable=True)    # micro-USDC
 
     txid = Column(String, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
+    status = Column(Enum(TradeStatus), nullable=False, default=TradeStatus.PENDING)
+    created_at = Column(DateTime, primary_key=True, nullable=False, server_default=func.now())
 
     user = relationship("User", back_populates="trades")
 
@@ -73,15 +102,45 @@ class Position(Base):
     user_id         = Column(Integer, ForeignKey("users.id"), nullable=False)
     wallet_address  = Column(Text, nullable=False)
     token           = Column(Text, nullable=False)
-    entry_amount_usdc = Column(Numeric(asdecimal=True), nullable=False, default=0)
-    token_amount      = Column(Numeric(asdecimal=True), nullable=False, default=0)
+    entry_amount_usdc = Column(BigInteger, nullable=False, default=0)  # cost basis, micro-USDC
+    token_amount      = Column(BigInteger, nullable=False, default=0)  # token atomic units
     created_at      = Column(DateTime, server_default=func.now())
 
     user = relationship("User")
 
 
+class Mint(Base):
+    __tablename__ = "mints"
+
+    address = Column(Text, primary_key=True)
+    decimals = Column(SmallInteger, nullable=False)
+
+
+class TelegramFile(Base):
+    __tablename__ = "telegram_files"
+
+    url = Column(Text, primary_key=True)  # where the picture was first sent from
+    file_id = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class FsmRecord(Base):
+    __tablename__ = "fsm_storage"
+    __table_args__ = (
+        Index("ix_fsm_storage_expires_at", "expires_at"),
+    )
+
+    key = Column(Text, primary_key=True)  # bot:chat:user:thread:destiny
+    state = Column(Text, nullable=True)
+    data = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
 class ReferralReward(Base):
     __tablename__ = "referral_rewards"
+    __table_args__ = (
+        Index("uix_referral_rewards_referee", "referee_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     referrer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
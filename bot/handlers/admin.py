@@ -0,0 +1,78 @@
+import os
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from dotenv import load_dotenv
+
+from bot.database.db import pool_stats, SLOW_QUERY_MS
+from bot.middlewares.lanes import user_lanes
+from bot.middlewares.outbox import outbox
+from bot.utils.metrics import stage_percentiles, WINDOW_SEC
+
+load_dotenv()
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+
+admin_router = Router(name="admin")
+admin_router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+
+def render_latency_table(stats: dict[str, dict[str, float]], window_min: float) -> str:
+    if not stats:
+        return f"⏱ <b>Latency</b> (last {window_min:g} min)\n<code>No samples yet.</code>"
+
+    name_len = max(len(stage) for stage in stats)
+    header = f"{'stage':<{name_len}}  {'n':>5}  {'p50':>7}  {'p95':>7}  {'p99':>7}"
+    rows = [
+        f"{stage:<{name_len}}  {s['count']:>5}  {s['p50']:>7.0f}  {s['p95']:>7.0f}  {s['p99']:>7.0f}"
+        for stage, s in sorted(stats.items())
+    ]
+    return (
+        f"⏱ <b>Latency, ms</b> (last {window_min:g} min)\n"
+        "<pre>" + "\n".join([header, *rows]) + "</pre>"
+    )
+
+
+@admin_router.message(Command("latency"))
+async def latency_handler(message: Message, command: CommandObject):
+    """/latency [minutes] — per-stage swap latency percentiles."""
+    try:
+        window_min = float(command.args) if command.args else WINDOW_SEC / 60
+        if window_min <= 0:
+            raise ValueError
+    except ValueError:
+        await message.answer("❌ Usage: /latency [minutes]")
+        return
+
+    stats = stage_percentiles(window_min * 60)
+    await message.answer(render_latency_table(stats, window_min), parse_mode="HTML")
+
+
+@admin_router.message(Command("dbpool"))
+async def dbpool_handler(message: Message):
+    """/dbpool — connection pool usage, checkout waits and query latency."""
+    pool = pool_stats()
+    stats = {k: v for k, v in stage_percentiles().items() if k in ("db.pool_wait", "db.query")}
+    text = (
+        "🗄 <b>DB pool</b>\n"
+        f"<code>checked out {pool['checked_out']} / {pool['size']} (+{pool['overflow']}"
+        f" of {pool['max_overflow']} overflow), idle {pool['idle']}, timeouts {pool['timeouts']}</code>\n"
+        f"<i>Slow query log threshold: {SLOW_QUERY_MS:g} ms</i>\n\n"
+    )
+    await message.answer(text + render_latency_table(stats, WINDOW_SEC / 60), parse_mode="HTML")
+
+
+@admin_router.message(Command("lanes"))
+async def lanes_handler(message: Message):
+    """/lanes — per-user update queues, the outbound message queue and how long both wait."""
+    lanes = user_lanes.stats()
+    sends = outbox.stats()
+    stats = {k: v for k, v in stage_percentiles().items() if k in ("lanes.wait", "outbox.wait")}
+    text = (
+        "🚦 <b>Update lanes</b>\n"
+        f"<code>running {lanes['running']} / {lanes['max_concurrent']}, waiting {lanes['waiting']}\n"
+        f"active users {lanes['lanes']}, deepest queue {lanes['max_depth']}, dropped {lanes['dropped']}</code>\n\n"
+        "📮 <b>Outbox</b>\n"
+        f"<code>queued {sends['queued']}, in flight {sends['in_flight']}, chats {sends['chats']}\n"
+        f"sent {sends['sent']}, merged edits {sends['merged']}, flood retries {sends['retried']}</code>\n\n"
+    )
+    await message.answer(text + render_latency_table(stats, WINDOW_SEC / 60), parse_mode="HTML")
@@ -2,14 +2,13 @@ import asyncio
 from datetime import datetime
 import inspect
 
+from dataclasses import replace
 from decimal import Decimal
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select
-from bot.database.models import User
 from bot.database.db import async_session
 
 from bot.states.buy_sell import BuySellStates
@@ -21,16 +20,28 @@ from bot.utils.value_data import (
     get_balances_for_wallets,
     get_token_balances_in_usdc,
     get_token_balance,
+    UserSnapshot,
 )
-from bot.utils.pnl import record_swap_and_update, get_real_time_pnl, get_position, reset_position_if_empty
+from bot.utils.pnl import Fill, get_positions_pnl
 from bot.services.rust_swap import buy_sell_token_from_wallets
 from bot.services.solana import get_wallet_balance
+from bot.services.inflight import inflight_key, run_deduplicated
+from bot.services.fees import resolve_fee_lamports
+from bot.services.mints import get_mint_decimals
+from bot.services.journal import journal_fills
+from bot.constants import LAMPORTS_PER_SOL, MICRO_USDC_PER_USDC
+from bot.utils.user_settings import get_user_settings
+from bot.utils.metrics import timed, timed_coro
 from bot.utils.common import go_back_to_main_menu
+from bot.utils.trade_flow import TradeFlow, MessageRef, get_trade_flow, save_trade_flow, FLOW_EXPIRED_TEXT
+from bot.utils.render import render
+from bot.middlewares.outbox import Priority, send_priority
 from bot.keyboards.buy_sell import get_buy_sell_keyboard_with_wallets
 
 router = Router(name="buy_sell")
 
 
+@timed_coro("buy_sell.total")
 async def run_buy_sell(
     source,
     ca: str,
@@ -38,80 +49,81 @@ async def run_buy_sell(
     wallets: list,
     get_amount_fn
 ):
-    info = await fetch_token_info(ca)
+    with timed("buy_sell.token_info"):
+        info = await fetch_token_info(ca)
     if not info or float(info.get("price", 0)) <= 0:
         await source.answer("❌ Failed to fetch token info.")
         return
 
-    async with async_session() as session:
-        user = (await session.execute(
-            select(User).where(User.id == wallets[0].user_id)
-        )).scalar_one_or_none()
+    with timed("buy_sell.settings"):
+        settings = await get_user_settings(source.from_user.id)
 
-    slippage_bps = (user.slippage_tolerance * 100) if user else 100
-    total_fee_lamports = int((float(user.tx_fee) if user else 0.001) * 1_000_000_000)
+    slippage_bps = settings.slippage * 100
+    max_fee_lamports = int(settings.tx_fee * 1_000_000_000)
+    total_fee_lamports = resolve_fee_lamports(settings.fee_mode, max_fee_lamports)
 
     SOL_MINT = "So11111111111111111111111111111111111111112"
-    sol_info = await fetch_token_info(SOL_MINT)
+    with timed("buy_sell.sol_price"):
+        sol_info = await fetch_token_info(SOL_MINT)
     sol_price = Decimal(sol_info.get("price", 0)) if sol_info else Decimal(0)
-    fee_sol = Decimal(user.tx_fee) if user else Decimal("0.001")
-    fee_usdc = fee_sol * sol_price
+    # All accounting below is in lamports, token atomic units and micro-USDC
+    sol_price_micro = int(sol_price * MICRO_USDC_PER_USDC)
+    fee_usdc = total_fee_lamports * sol_price_micro // LAMPORTS_PER_SOL
 
     token_price = Decimal(info["price"])
-    token_decimals = info.get("decimals", 6)
-    token_decimals_pow = Decimal(10) ** token_decimals
 
     success, failed = [], {}
+    fills: list[Fill] = []
 
-    for w in wallets:
-        amt = await (get_amount_fn(w) if inspect.iscoroutinefunction(get_amount_fn)
-                     else get_amount_fn(w))
-        if not isinstance(amt, int) or amt <= 0:
-            failed[w.address] = "❌ Invalid amount"
-            continue
-
-        if mode == "buy":
-            ok, err, sol_bal = await check_sol_swap_possibility(w.address)
-            if not ok or sol_bal * 1e9 < amt:
-                failed[w.address] = err or "❌ Not enough SOL"
-                continue
-        else:
-            ok, err, tok_bal = await check_token_balance_for_sell(w.address, ca)
-            if not ok or tok_bal < amt:
-                failed[w.address] = err or "❌ Not enough tokens"
+    try:
+        for w in wallets:
+            with timed("buy_sell.balance_check"):
+                amt = await (get_amount_fn(w) if inspect.iscoroutinefunction(get_amount_fn)
+                             else get_amount_fn(w))
+                if not isinstance(amt, int) or amt <= 0:
+                    failed[w.address] = "❌ Invalid amount"
+                    continue
+
+                if mode == "buy":
+                    ok, err, sol_bal = await check_sol_swap_possibility(w.address)
+                    if not ok or sol_bal * 1e9 < amt:
+                        failed[w.address] = err or "❌ Not enough SOL"
+                        continue
+                else:
+                    ok, err, tok_bal = await check_token_balance_for_sell(w.address, ca)
+                    if not ok or tok_bal < amt:
+                        failed[w.address] = err or "❌ Not enough tokens"
+                        continue
+
+            res = await buy_sell_token_from_wallets(
+                [w],
+                ca,
+                mode,
+                amt,
+                slippage_bps=slippage_bps,
+                total_fee_lamports=total_fee_lamports,
+            )
+            if not (res and res[0]):
+                failed[w.address] = list(res[1].values())[0] if res and res[1] else "❌ Swap failed"
                 continue
 
-        res = await buy_sell_token_from_wallets(
-            [w],
-            ca,
-            mode,
-            amt,
-            slippage_bps=slippage_bps,
-            total_fee_lamports=total_fee_lamports,
-        )
-        if not (res and res[0]):
-            failed[w.address] = list(res[1].values())[0] if res and res[1] else "❌ Swap failed"
-            continue
-
-        result_dict = next((x for x in res[0] if x["address"] == w.address), None)
-        if not result_dict:
-            failed[w.address] = "❌ Unexpected result format"
-            continue
+            result_dict = next((x for x in res[0] if x["address"] == w.address), None)
+            if not result_dict:
+                failed[w.address] = "❌ Unexpected result format"
+                continue
 
-        txid = result_dict["txid"]
-        in_amount = Decimal(result_dict["in_amount"])
-        out_amount = Decimal(result_dict["out_amount"])
+            txid = result_dict["txid"]
+            in_amount = int(result_dict["in_amount"])
+            out_amount = int(result_dict["out_amount"])
 
-        if mode == "buy":
-            delta_usdc = (in_amount / Decimal(1e9)) * sol_price
-            delta_tokens = out_amount / token_decimals_pow
-        else:
-            delta_usdc = (out_amount / Decimal(1e9)) * sol_price - fee_usdc
-            delta_tokens = -(in_amount / token_decimals_pow)
+            if mode == "buy":
+                delta_usdc = in_amount * sol_price_micro // LAMPORTS_PER_SOL
+                delta_tokens = out_amount
+            else:
+                delta_usdc = out_amount * sol_price_micro // LAMPORTS_PER_SOL - fee_usdc
+                delta_tokens = -in_amount
 
-        async with async_session() as session:
-            await record_swap_and_update(
-                session=session,
+            fills.append(Fill(
                 user_id=w.user_id,
                 wallet_address=w.address,
                 token=ca,
@@ -119,9 +131,12 @@ async def run_buy_sell(
                 delta_tokens=delta_tokens,
                 price_per_token=token_price,
                 txid=txid
-            )
-
-        success.append((w.address, txid))
+            ))
+            success.append((w.address, txid))
+    finally:
+        # Swaps that went through are on-chain already — journal them even if a later wallet fails.
+        # The journal flusher writes them to Postgres in the background.
+        await journal_fills(fills)
 
     await asyncio.sleep(0.25)
     await send_buy_sell_result(source, success, failed)
@@ -140,24 +155,24 @@ async def get_token_ui_components(
     pnl = None
     selected_wallets = [w for w in wallets if w.address in selected]
 
-    if selected_wallets:
+    decimals = await get_mint_decimals(ca) if selected_wallets else None
+    if decimals is not None:
         async with async_session() as session:
-            total_pnl = Decimal(0)
-            total_entry = Decimal(0)
-
-            for w in selected_wallets:
-                pnl_value, _ = await get_real_time_pnl(session, w.user_id, w.address, ca)
-                total_pnl += Decimal(str(pnl_value))
-
-                entry, _ = await get_position(session, w.user_id, w.address, ca)
-                total_entry += entry
+            total_pnl, total_entry = await get_positions_pnl(
+                session,
+                selected_wallets[0].user_id,
+                [w.address for w in selected_wallets],
+                ca,
+                Decimal(str(info.get("price") or 0)),
+                decimals,
+            )
 
-            if total_entry > 0:
-                percent = (total_pnl / total_entry) * 100
-            else:
-                percent = Decimal(0)
+        if total_entry > 0:
+            percent = (total_pnl / total_entry) * 100
+        else:
+            percent = Decimal(0)
 
-            pnl = (float(total_pnl), float(percent))
+        pnl = (float(total_pnl), float(percent))
 
     if mode == "sell":
         balances = await get_token_balances_in_usdc(wallets, ca)
@@ -194,37 +209,25 @@ async def get_sell_amount(wallet_address: str, token_mint: str, percent: int) ->
         return 0
 
 
-async def send_token_ui(msg_or_cb, caption: str, keyboard, icon_url: str):
-    is_callback = isinstance(msg_or_cb, CallbackQuery)
-    msg = msg_or_cb.message if is_callback else msg_or_cb
-
+async def send_token_ui(msg_or_cb, caption: str, keyboard, icon_url: str, resend: bool = False):
+    """
+    Show the token panel, editing the clicked panel in place. `resend` moves
+    it below the trade result messages instead.
+    """
     try:
-        if is_callback:
-            try:
-                await msg.delete()
-            except TelegramBadRequest:
-                pass
-
-        if icon_url:
-            await msg_or_cb.bot.send_photo(
-                chat_id=msg.chat.id,
-                photo=icon_url,
-                caption=caption,
-                parse_mode="HTML",
-                reply_markup=keyboard
-            )
-        else:
-            await msg_or_cb.bot.send_message(
-                chat_id=msg.chat.id,
-                text=caption,
-                parse_mode="HTML",
-                reply_markup=keyboard,
-                disable_web_page_preview=True
-            )
-
+        await render(msg_or_cb, caption, keyboard, photo=icon_url, resend=resend)
     except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            await msg.answer(f"❌ Edit error: {e}")
+        msg = msg_or_cb.message if isinstance(msg_or_cb, CallbackQuery) else msg_or_cb
+        await msg.answer(f"❌ Edit error: {e}")
+
+
+async def delete_prompt(message: Message, prompt: MessageRef | None) -> None:
+    if prompt is None:
+        return
+    try:
+        await message.bot.delete_message(prompt.chat_id, prompt.message_id)
+    except TelegramBadRequest:
+        pass
 
 
 @router.message(BuySellStates.entering_buy_amount)
@@ -237,33 +240,36 @@ async def handle_custom_buy_amount(message: Message, state: FSMContext):
         await message.answer("❌ Enter a valid SOL amount (e.g., 0.1)")
         return
 
-    data = await state.get_data()
-    callback_query: CallbackQuery | None = data.get("last_callback")
-
-    if callback_query:
-        try:
-            await callback_query.message.delete()
-        except:
-            pass
-        try:
-            await callback_query.answer("⏳ Processing buy...", show_alert=True)
-        except:
-            pass
-
-    await message.answer("⏳ Processing buy...")
+    flow = await get_trade_flow(state)
+    ca = flow.token_ca
+    if not ca:
+        await message.answer(FLOW_EXPIRED_TEXT)
+        return
 
-    ca = data.get("token_ca")
-    wallet_addrs = set(data.get("selected_wallets", []))
+    await delete_prompt(message, flow.prompt)
 
     async with async_session() as session:
         user = await get_user_with_wallets(message.from_user.id, session)
-    selected_wallets = [w for w in user.wallets if w.address in wallet_addrs]
-
-    async def get_amount(_): return int(value * 1_000_000_000)
-
-    await run_buy_sell(message, ca, "buy", selected_wallets, get_amount)
+    selected_wallets = flow.select(user.wallets)
+    wallet_addrs = {w.address for w in selected_wallets}
+    lamports = int(value * 1_000_000_000)
+
+    async def get_amount(_): return lamports
+
+    async def buy():
+        await message.answer("⏳ Processing buy...")
+        await run_buy_sell(message, ca, "buy", selected_wallets, get_amount)
+
+    started = await run_deduplicated(
+        inflight_key(message.from_user.id, "buy", ca, lamports, wallet_addrs),
+        buy,
+        on_duplicate=lambda: message.answer("⏳ This transaction is already being processed."),
+    )
+    if not started:
+        return
 
     await state.set_state(BuySellStates.choosing_mode)
+    await save_trade_flow(state, replace(flow.owned_by(user.wallets), mode="buy", prompt=None))
     components = await get_token_ui_components(user.wallets, ca, "buy", wallet_addrs)
     await send_token_ui(message, *components)
 
@@ -278,29 +284,36 @@ async def handle_custom_sell_percent(message: Message, state: FSMContext):
         await message.answer("❌ Enter a number between 1 and 100 — the percentage of tokens to sell.")
         return
 
-    await message.answer("⏳ Processing sell...")
-
-    data = await state.get_data()
-    ca = data.get("token_ca")
-    wallet_addrs = set(data.get("selected_wallets", []))
+    flow = await get_trade_flow(state)
+    ca = flow.token_ca
+    if not ca:
+        await message.answer(FLOW_EXPIRED_TEXT)
+        return
 
-    last_callback: CallbackQuery | None = data.get("last_callback")
-    if last_callback:
-        try:
-            await last_callback.message.delete()
-        except:
-            pass
+    await delete_prompt(message, flow.prompt)
 
     async with async_session() as session:
         user = await get_user_with_wallets(message.from_user.id, session)
-    selected_wallets = [w for w in user.wallets if w.address in wallet_addrs]
+    selected_wallets = flow.select(user.wallets)
+    wallet_addrs = {w.address for w in selected_wallets}
 
     async def get_amount(w):
         return await get_sell_amount(w.address, ca, percent)
 
-    await run_buy_sell(message, ca, "sell", selected_wallets, get_amount)
+    async def sell():
+        await message.answer("⏳ Processing sell...")
+        await run_buy_sell(message, ca, "sell", selected_wallets, get_amount)
+
+    started = await run_deduplicated(
+        inflight_key(message.from_user.id, "sell", ca, percent, wallet_addrs),
+        sell,
+        on_duplicate=lambda: message.answer("⏳ This transaction is already being processed."),
+    )
+    if not started:
+        return
 
     await state.set_state(BuySellStates.choosing_mode)
+    await save_trade_flow(state, replace(flow.owned_by(user.wallets), mode="sell", prompt=None))
     components = await get_token_ui_components(user.wallets, ca, "sell", wallet_addrs)
     await send_token_ui(message, *components)
 
@@ -311,52 +324,79 @@ async def handle_amount_selection(callback: CallbackQuery, state: FSMContext):
         action, value, ca = callback.data.split(":", 2)
         mode = "buy" if action == "buy" else "sell"
 
-        data = await state.get_data()
-        wallet_addrs = set(data.get("selected_wallets", []))
-        if not wallet_addrs:
+        flow = await get_trade_flow(state)
+        async with async_session() as session:
+            user = await get_user_with_wallets(callback.from_user.id, session)
+        selected_wallets = flow.select(user.wallets) if user else []
+        if not selected_wallets:
             await callback.answer("❗ Select at least one wallet.")
             return
 
-        try:
-            await callback.answer("⏳ Processing transaction...", show_alert=True)
-        except TelegramBadRequest:
-            try:
-                await callback.message.delete()
-            except Exception:
-                pass
-            await callback.message.answer("⏳ Processing transaction...")
+        wallet_addrs = {w.address for w in selected_wallets}
+        # Keyed by the amount actually traded, as the custom amount handlers do
+        amount = get_buy_amount_in_lamports(value) if mode == "buy" else int(value)
+        await run_deduplicated(
+            inflight_key(callback.from_user.id, mode, ca, amount, wallet_addrs),
+            lambda: process_amount_selection(callback, state, flow, user, ca, mode, value),
+            on_duplicate=lambda: callback.answer("⏳ This transaction is already being processed."),
+        )
 
-        async with async_session() as session:
-            user = await get_user_with_wallets(callback.from_user.id, session)
-        selected_wallets = [w for w in user.wallets if w.address in wallet_addrs]
+    except Exception as e:
+        await callback.message.answer(f"❌ An error occurred: {str(e)}")
 
-        if mode == "buy":
-            lamports = get_buy_amount_in_lamports(value)
 
-            async def get_amount(_): return lamports
-        else:
-            percent = int(value)
+async def process_amount_selection(
+    callback: CallbackQuery,
+    state: FSMContext,
+    flow: TradeFlow,
+    user: UserSnapshot,
+    ca: str,
+    mode: str,
+    value: str,
+):
+    try:
+        await callback.answer("⏳ Processing transaction...", show_alert=True)
+    except TelegramBadRequest:
+        try:
+            await callback.message.delete()
+        except Exception:
+            pass
+        await callback.message.answer("⏳ Processing transaction...")
 
-            async def get_amount(w): return await get_sell_amount(w.address, ca, percent)
+    selected_wallets = flow.select(user.wallets)
 
-        await run_buy_sell(callback, ca, mode, selected_wallets, get_amount)
+    if mode == "buy":
+        lamports = get_buy_amount_in_lamports(value)
 
-        await state.update_data(selected_wallets=list(wallet_addrs))
-        components = await get_token_ui_components(user.wallets, ca, mode, wallet_addrs)
-        await send_token_ui(callback, *components)
+        async def get_amount(_): return lamports
+    else:
+        percent = int(value)
 
-    except Exception as e:
-        await callback.message.answer(f"❌ An error occurred: {str(e)}")
+        async def get_amount(w): return await get_sell_amount(w.address, ca, percent)
+
+    await run_buy_sell(callback, ca, mode, selected_wallets, get_amount)
+
+    await save_trade_flow(state, replace(flow.owned_by(user.wallets), mode=mode, token_ca=ca))
+    components = await get_token_ui_components(user.wallets, ca, mode, {w.address for w in selected_wallets})
+    await send_token_ui(callback, *components, resend=True)
 
 
 @router.callback_query(F.data.startswith("buy:custom:") | F.data.startswith("sell:custom:"))
 async def handle_custom_amount_request(callback: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    if not data.get("selected_wallets"):
+    async with async_session() as session:
+        user = await get_user_with_wallets(callback.from_user.id, session)
+    flow = (await get_trade_flow(state)).owned_by(user.wallets if user else ())
+    if not flow.wallet_ids:
         await callback.answer("❗ Select at least one wallet.")
         return
 
-    await state.update_data(last_callback=callback)
+    mode, _, ca = callback.data.split(":", 2)
+    await save_trade_flow(state, replace(
+        flow,
+        mode=mode,
+        token_ca=ca,
+        prompt=MessageRef(callback.message.chat.id, callback.message.message_id),
+    ))
 
     if "buy:custom" in callback.data:
         await state.set_state(BuySellStates.entering_buy_amount)
@@ -384,19 +424,16 @@ async def send_buy_sell_result(message_or_cb, success: list, failed: dict):
 
     text = "\n".join(lines) if lines else "❌ Operation failed."
 
-    if isinstance(message_or_cb, Message):
-        await message_or_cb.answer(text, parse_mode="HTML", disable_web_page_preview=True)
-    else:
-        await message_or_cb.message.answer(text, parse_mode="HTML", disable_web_page_preview=True)
+    message = message_or_cb if isinstance(message_or_cb, Message) else message_or_cb.message
+    with send_priority(Priority.TRADE):
+        await message.answer(text, parse_mode="HTML", disable_web_page_preview=True)
 
 
 async def handle_confirm_buy_sell(callback: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    ca = data.get("token_ca")
-    mode = data.get("mode", "buy")
-    wallets = data.get("selected_wallets", [])
+    flow = await get_trade_flow(state)
+    ca, mode = flow.token_ca, flow.mode
 
-    if not wallets:
+    if not ca or not flow.wallet_ids:
         await callback.answer("❗ Select at least one wallet.")
         return
 
@@ -404,7 +441,7 @@ async def handle_confirm_buy_sell(callback: CallbackQuery, state: FSMContext):
 
     async with async_session() as session:
         user = await get_user_with_wallets(callback.from_user.id, session)
-    selected_wallets = [w for w in user.wallets if w.address in wallets]
+    selected_wallets = flow.select(user.wallets)
 
     async def get_amount(w):
         if mode == "buy":
@@ -416,8 +453,8 @@ async def handle_confirm_buy_sell(callback: CallbackQuery, state: FSMContext):
     await run_buy_sell(callback, ca, mode, selected_wallets, get_amount)
 
     await state.set_state(BuySellStates.choosing_mode)
-    components = await get_token_ui_components(user.wallets, ca, mode, set(wallets))
-    await send_token_ui(callback, *components)
+    components = await get_token_ui_components(user.wallets, ca, mode, {w.address for w in selected_wallets})
+    await send_token_ui(callback, *components, resend=True)
 
 
 @router.callback_query(lambda c: c.data == "back_to_main")
@@ -428,7 +465,10 @@ async def handle_back(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.in_({"buy_token", "sell_token"}))
 async def handle_trade_mode_selection(callback: CallbackQuery, state: FSMContext):
     mode = "buy" if callback.data == "buy_token" else "sell"
-    await state.update_data(mode=mode)
+    async with async_session() as session:
+        user = await get_user_with_wallets(callback.from_user.id, session)
+    flow = (await get_trade_flow(state)).owned_by(user.wallets if user else ())
+    await save_trade_flow(state, replace(flow, mode=mode))
     await callback.message.answer("📥 Enter the token address (CA):")
     await state.set_state(BuySellStates.waiting_for_ca)
     await callback.answer()
@@ -442,20 +482,18 @@ async def handle_token_address(message: Message, state: FSMContext):
         await message.answer("❌ Failed to find token by this address. Make sure the CA is correct.")
         return
 
-    data = await state.get_data()
-    mode = data.get("mode", "buy")
-
-    await state.update_data(token_ca=ca)
-
     async with async_session() as session:
         user = await get_user_with_wallets(message.from_user.id, session)
 
+    flow = replace((await get_trade_flow(state)).owned_by(user.wallets if user else ()), token_ca=ca)
+    await save_trade_flow(state, flow)
+
     if not user or not user.wallets:
         await message.answer("❗ You don't have any wallets. Please add at least one.")
         return
 
-    selected = set(data.get("selected_wallets", []))
-    components = await get_token_ui_components(user.wallets, ca, mode, selected)
+    selected = {w.address for w in flow.select(user.wallets)}
+    components = await get_token_ui_components(user.wallets, ca, flow.mode, selected)
     await send_token_ui(message, *components)
 
     await state.set_state(BuySellStates.choosing_mode)
@@ -464,17 +502,26 @@ async def handle_token_address(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("tw:"))
 async def handle_wallet_toggle(callback: CallbackQuery, state: FSMContext):
     _, address = callback.data.split(":", 1)
-    data = await state.get_data()
-    ca = data.get("token_ca")
-    mode = data.get("mode", "buy")
-    selected = set(data.get("selected_wallets", []))
-    selected.symmetric_difference_update([address])
-    await state.update_data(selected_wallets=list(selected))
+    flow = await get_trade_flow(state)
+    if not flow.token_ca:
+        await callback.answer(FLOW_EXPIRED_TEXT, show_alert=True)
+        return
 
     async with async_session() as session:
         user = await get_user_with_wallets(callback.from_user.id, session)
 
-    components = await get_token_ui_components(user.wallets, ca, mode, selected)
+    wallet = next((w for w in user.wallets if w.address == address), None) if user else None
+    if wallet is None:
+        await callback.answer("❗ Wallet not found.")
+        return
+
+    # Ids of wallets deleted since are dropped, so they don't count towards the limit
+    flow = flow.owned_by(user.wallets)
+    flow = replace(flow, wallet_ids=flow.wallet_ids ^ {wallet.id})
+    await save_trade_flow(state, flow)
+
+    selected = {w.address for w in flow.select(user.wallets)}
+    components = await get_token_ui_components(user.wallets, flow.token_ca, flow.mode, selected)
     await send_token_ui(callback, *components)
 
     await callback.answer()
@@ -491,13 +538,13 @@ async def handle_mode_switch(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Data format error.")
         return
 
-    await state.update_data(mode=mode, token_ca=ca)
-    data = await state.get_data()
-    selected = set(data.get("selected_wallets", []))
-
     async with async_session() as session:
         user = await get_user_with_wallets(callback.from_user.id, session)
 
+    flow = replace((await get_trade_flow(state)).owned_by(user.wallets), mode=mode, token_ca=ca)
+    await save_trade_flow(state, flow)
+    selected = {w.address for w in flow.select(user.wallets)}
+
     components = await get_token_ui_components(user.wallets, ca, mode, selected)
     await send_token_ui(callback, *components)
 
@@ -514,14 +561,14 @@ async def handle_refresh(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Data error.")
         return
 
-    data = await state.get_data()
-    mode = data.get("mode", "buy")
-    selected = set(data.get("selected_wallets", []))
+    flow = await get_trade_flow(state)
 
     async with async_session() as session:
         user = await get_user_with_wallets(callback.from_user.id, session)
+    selected = {w.address for w in flow.select(user.wallets)}
 
-    components = await get_token_ui_components(user.wallets, ca, mode, selected)
-    await send_token_ui(callback, *components)
+    components = await get_token_ui_components(user.wallets, ca, flow.mode, selected)
+    with send_priority(Priority.REFRESH):
+        await send_token_ui(callback, *components)
 
     await callback.answer("🔄 Refreshed.")
\ No newline at end of file
@@ -6,10 +6,12 @@ import secrets
 import string
 from bot.database.models import User
 from sqlalchemy import select
-from bot.utils.pnl import update_active_referrals
+from sqlalchemy import update, func
+from bot.utils.pnl import award_points_for_active_referral
+from bot.utils.earn_data import invalidate_leaderboard
 
 from bot.database.db import async_session
-from bot.utils.earn_data import get_user_by_telegram_id, get_top_users, get_user_rank
+from bot.utils.earn_data import get_user_by_telegram_id, get_leaderboard, get_user_rank
 
 earn_router = Router()
 
@@ -56,7 +58,7 @@ async def send_earn_menu(target):
 
     async with async_session() as session:
         user = await get_user_by_telegram_id(session, telegram_id)
-        top_users = await get_top_users(session)
+        top_users = await get_leaderboard(session)
         rank = await get_user_rank(session, user.id) if user else "N/A"
         leaderboard = render_leaderboard(top_users)
 
@@ -174,9 +176,30 @@ async def process_ref_code_entry(message: Message, state: FSMContext):
             await state.clear()
             return
 
-        user.referred_by = entered_code
-        await update_active_referrals(session, referrer)
+        accepted = await session.execute(
+            update(User)
+            .where(User.id == user.id, User.referred_by.is_(None))
+            .values(referred_by=entered_code)
+        )
+        if accepted.rowcount == 0:
+            await message.answer("⚠️ You can't enter a referral code again.")
+            await state.clear()
+            return
+
+        await session.execute(
+            update(User)
+            .where(User.id == referrer.id)
+            .values(referrals_total=func.coalesce(User.referrals_total, 0) + 1)
+        )
+
+        # Already active before entering the code — credit the referrer right away
+        referrer_points = None
+        if (user.pnl or 0) >= 100:
+            referrer_points = await award_points_for_active_referral(session, user.id, entered_code)
         await session.commit()
 
+        if referrer_points is not None:
+            invalidate_leaderboard(referrer_points)
+
         await message.answer("✅ Referral code accepted!")
         await state.clear()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import asyncio
+import os
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, FSInputFile
+
+from bot.database.db import async_session
+from bot.database.models import TradeType
+from bot.keyboards.history import get_history_keyboard
+from bot.utils.trade_history import (
+    HistoryCursor,
+    get_trades_page,
+    export_trades_csv,
+    whole_tokens,
+    usdc_amount,
+)
+from bot.utils.value_data import get_user_with_wallets
+from bot.utils.render import render
+
+history_router = Router(name="history")
+
+
+def shorten(address: str) -> str:
+    return f"{address[:4]}...{address[-4:]}"
+
+
+def render_trades(rows) -> str:
+    if not rows:
+        return "📜 <b>Trade History</b>\n\n<code>No trades yet.</code>"
+
+    lines = ["📜 <b>Trade History</b>\n"]
+    for r in rows:
+        side = "🟢 BUY" if r.type == TradeType.BUY else "🔴 SELL"
+        line = (
+            f"{side} <code>{whole_tokens(r.token_amount, r.decimals):.4f}</code> "
+            f"{shorten(r.token)} for <code>${usdc_amount(r.amount_usdc):.2f}</code>"
+        )
+        if r.type == TradeType.SELL and r.realized_pnl:
+            line += f" (PnL <code>${usdc_amount(r.realized_pnl):+.2f}</code>)"
+        stamp = f"{r.created_at:%Y-%m-%d %H:%M}" if r.created_at else ""
+        lines.append(f"{line}\n   ↳ {stamp} · {r.status.value.lower()} · {shorten(r.wallet_address)}")
+    return "\n".join(lines)
+
+
+@history_router.callback_query(F.data == "history")
+@history_router.callback_query(F.data.startswith("history:"))
+async def show_history(callback: CallbackQuery):
+    after = None
+    if callback.data.startswith("history:"):
+        try:
+            after = HistoryCursor.decode(callback.data.split("history:", 1)[1])
+        except ValueError:
+            await callback.answer("❌ Invalid page", show_alert=True)
+            return
+
+    async with async_session() as session:
+        user = await get_user_with_wallets(callback.from_user.id, session)
+        if not user:
+            await callback.answer("User not found", show_alert=True)
+            return
+        rows, next_cursor = await get_trades_page(session, user.id, after)
+
+    keyboard = get_history_keyboard(
+        next_cursor.encode() if next_cursor else None,
+        first_page=after is None,
+    )
+    await render(callback, render_trades(rows), keyboard)
+    await callback.answer()
+
+
+@history_router.callback_query(F.data == "history_export")
+async def export_history(callback: CallbackQuery):
+    await callback.answer("⏳ Preparing your CSV...")
+
+    async with async_session() as session:
+        user = await get_user_with_wallets(callback.from_user.id, session)
+        if not user:
+            return
+        path = await export_trades_csv(session, user.id)
+
+    try:
+        await callback.message.answer_document(
+            FSInputFile(path, filename="sensei_trades.csv"),
+            caption="📄 Your complete trade history",
+        )
+    finally:
+        await asyncio.to_thread(os.remove, path)
@@ -4,81 +4,63 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from bot.states.settings import SettingsStates
-from sqlalchemy import select, update
-
-from bot.database.db import async_session
-from bot.database.models import User
 from bot.keyboards.settings import get_settings_keyboard
+from bot.utils.user_settings import get_user_settings, update_user_settings
+from bot.utils.render import render, forget_id
 
 router = Router(name="settings")
 
+SETTINGS_TEXT = (
+    "⚙️ <b>Transaction Settings</b>\n\n"
+    "Here you can adjust slippage tolerance and transaction fee.\n"
+    "These settings apply to all your wallets, for both buys and sells."
+)
 
-async def render_settings(callback: CallbackQuery, state: FSMContext):
-    """Render the settings menu with current slippage and fee."""
-    async with async_session() as session:
-        user = (await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )).scalar_one_or_none()
 
-    slippage = user.slippage_tolerance if user else 1
-    fee      = float(user.tx_fee)         if user else 0.001
-    keyboard = get_settings_keyboard(slippage, fee)
+async def load_settings(telegram_id: int) -> tuple[int, float, str]:
+    """Return (slippage %, fee in SOL, fee mode), with defaults for unknown users."""
+    settings = await get_user_settings(telegram_id)
+    return settings.slippage, settings.tx_fee, settings.fee_mode
 
-    try:
-        await callback.message.edit_text(
-            "⚙️ <b>Transaction Settings</b>\n\n"
-            "Here you can adjust slippage tolerance and transaction fee.\n"
-            "These settings apply to all your wallets, for both buys and sells.",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-    except TelegramBadRequest as e:
-        err = str(e)
-        if "message is not modified" in err or "message to edit not found" in err:
-            return
-        raise
+
+async def render_settings(callback: CallbackQuery, state: FSMContext) -> Message:
+    """Render the settings menu with current slippage and fee; returns the message showing it."""
+    keyboard = get_settings_keyboard(*await load_settings(callback.from_user.id))
+    shown = await render(callback, SETTINGS_TEXT, keyboard)
 
     await state.set_state(None)
     await callback.answer()
+    return shown
 
 
 @router.callback_query(F.data == "settings")
 async def show_settings(callback: CallbackQuery, state: FSMContext):
-    await render_settings(callback, state)
-    await state.update_data(settings_msg_id=callback.message.message_id)
+    shown = await render_settings(callback, state)
+    await state.update_data(settings_msg_id=shown.message_id)
 
 
 @router.callback_query(F.data.in_(["settings_slippage", "settings_fee"]))
 async def refresh_settings(callback: CallbackQuery, state: FSMContext):
-    """Delete old settings message and send a fresh one."""
-    data    = await state.get_data()
-    menu_id = data.get("settings_msg_id")
-    chat_id = callback.message.chat.id
+    """Re-render the settings message in place with fresh values."""
+    kb = get_settings_keyboard(*await load_settings(callback.from_user.id))
 
-    try:
-        await callback.message.delete()
-    except TelegramBadRequest:
-        pass
-
-    async with async_session() as session:
-        user = (await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )).scalar_one_or_none()
-    slippage = user.slippage_tolerance if user else 1
-    fee      = float(user.tx_fee)         if user else 0.001
-    kb       = get_settings_keyboard(slippage, fee)
-
-    new_msg = await callback.message.answer(
-        "⚙️ <b>Transaction Settings</b>\n\n"
-        "Here you can adjust slippage tolerance and transaction fee.\n"
-        "These settings apply to all your wallets, for both buys and sells.",
-        reply_markup=kb,
-        parse_mode="HTML"
-    )
-    await state.update_data(settings_msg_id=new_msg.message_id)
+    shown = await render(callback, SETTINGS_TEXT, kb)
+    await state.update_data(settings_msg_id=shown.message_id)
     await callback.answer()
 
 
+@router.callback_query(F.data == "settings_toggle_fee_mode")
+async def toggle_fee_mode(callback: CallbackQuery, state: FSMContext):
+    """Switch between the fixed fee and the auto (network-estimated) fee."""
+    _, _, fee_mode = await load_settings(callback.from_user.id)
+    await update_user_settings(
+        callback.from_user.id,
+        fee_mode="fixed" if fee_mode == "auto" else "auto",
+    )
+
+    await render_settings(callback, state)
+
+
 @router.callback_query(F.data == "settings_enter_slippage")
 async def enter_slippage(callback: CallbackQuery, state: FSMContext):
     """Prompt user to input new slippage tolerance."""
@@ -89,7 +71,7 @@ async def enter_slippage(callback: CallbackQuery, state: FSMContext):
 
 @router.message(SettingsStates.entering_slippage)
 async def process_slippage(message: Message, state: FSMContext):
-    """Validate & save new slippage, delete old settings section, send updated one."""
+    """Validate & save new slippage, then update the settings menu in place."""
     try:
         val = int(message.text.strip())
         if not (1 <= val <= 100):
@@ -98,39 +80,9 @@ async def process_slippage(message: Message, state: FSMContext):
         await message.answer("❌ Please enter an integer between 1 and 100.")
         return
 
-    async with async_session() as session:
-        await session.execute(
-            update(User)
-            .where(User.telegram_id == message.from_user.id)
-            .values(slippage_tolerance=val)
-        )
-        await session.commit()
-
-    data    = await state.get_data()
-    menu_id = data.get("settings_msg_id")
-    chat_id = message.chat.id
-    if isinstance(menu_id, int):
-        try:
-            await message.bot.delete_message(chat_id=chat_id, message_id=menu_id)
-        except TelegramBadRequest:
-            pass
-
-    async with async_session() as session:
-        user = (await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )).scalar_one_or_none()
-    slippage = user.slippage_tolerance if user else 1
-    fee      = float(user.tx_fee)         if user else 0.001
-    kb       = get_settings_keyboard(slippage, fee)
-    text = (
-        "⚙️ <b>Transaction Settings</b>\n\n"
-        "Here you can adjust slippage tolerance and transaction fee.\n"
-        "These settings apply to all your wallets, for both buys and sells."
-    )
+    await update_user_settings(message.from_user.id, slippage_tolerance=val)
 
-    new_msg = await message.answer(text, reply_markup=kb, parse_mode="HTML")
-
-    await state.update_data(settings_msg_id=new_msg.message_id)
+    await show_settings_in_place(message, state)
     await state.set_state(None)
 
 
@@ -144,7 +96,7 @@ async def enter_fee(callback: CallbackQuery, state: FSMContext):
 
 @router.message(SettingsStates.entering_fee)
 async def process_fee(message: Message, state: FSMContext):
-    """Validate & save new tx fee, then delete old settings and send updated one."""
+    """Validate & save new tx fee, then update the settings menu in place."""
     try:
         val = float(message.text.strip().replace(",", "."))
         if val < 0:
@@ -153,62 +105,23 @@ async def process_fee(message: Message, state: FSMContext):
         await message.answer("❌ Please enter a non-negative number.")
         return
 
-    async with async_session() as session:
-        await session.execute(
-            update(User)
-            .where(User.telegram_id == message.from_user.id)
-            .values(tx_fee=val)
-        )
-        await session.commit()
-
-    data    = await state.get_data()
-    menu_id = data.get("settings_msg_id")
-    chat_id = message.chat.id
-    if isinstance(menu_id, int):
-        try:
-            await message.bot.delete_message(chat_id=chat_id, message_id=menu_id)
-        except TelegramBadRequest:
-            pass
-
-    async with async_session() as session:
-        user = (await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )).scalar_one_or_none()
-    slippage = user.slippage_tolerance if user else 1
-    fee      = float(user.tx_fee)         if user else 0.001
-    kb       = get_settings_keyboard(slippage, fee)
-    text = (
-        "⚙️ <b>Transaction Settings</b>\n\n"
-        "Here you can adjust slippage tolerance and transaction fee.\n"
-        "These settings apply to all your wallets, for both buys and sells."
-    )
+    await update_user_settings(message.from_user.id, tx_fee=val)
 
-    new_msg = await message.answer(text, reply_markup=kb, parse_mode="HTML")
-
-    await state.update_data(settings_msg_id=new_msg.message_id)
+    await show_settings_in_place(message, state)
     await state.set_state(None)
 
 
-async def edit_settings_by_id(bot, chat_id: int, msg_id: int):
-    """Fetch fresh values and edit the existing menu by chat_id/message_id."""
-    async with async_session() as session:
-        user = (await session.execute(
-            select(User).where(User.telegram_id == chat_id)
-        )).scalar_one_or_none()
-
-    slippage = user.slippage_tolerance if user else 1
-    fee      = float(user.tx_fee)         if user else 0.001
-    keyboard = get_settings_keyboard(slippage, fee)
-
-    text = (
-        "⚙️ <b>Transaction Settings</b>\n\n"
-        "Here you can adjust slippage tolerance and transaction fee.\n"
-        "These settings apply to all your wallets, for both buys and sells."
-    )
+async def edit_settings_by_id(bot, chat_id: int, msg_id: int) -> bool:
+    """
+    Fetch fresh values and edit the existing menu by chat_id/message_id.
+    Returns False if that message is gone or can no longer be edited.
+    """
+    keyboard = get_settings_keyboard(*await load_settings(chat_id))
+    forget_id(chat_id, msg_id)
 
     try:
         await bot.edit_message_text(
-            text=text,
+            text=SETTINGS_TEXT,
             chat_id=chat_id,
             message_id=msg_id,
             reply_markup=keyboard,
@@ -216,37 +129,26 @@ async def edit_settings_by_id(bot, chat_id: int, msg_id: int):
         )
     except TelegramBadRequest as e:
         err = str(e)
-        if "message is not modified" in err or "message to edit not found" in err:
-            return
+        if "message is not modified" in err:
+            return True
+        if "message to edit not found" in err or "message can't be edited" in err:
+            return False
         raise
+    return True
 
 
-@router.message(Command("settings"))
-async def cmd_settings(message: Message, state: FSMContext):
-
-    async with async_session() as session:
-        user = (await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )).scalar_one_or_none()
-
-    slippage = user.slippage_tolerance if user else 1
-    fee      = float(user.tx_fee)         if user else 0.001
-    keyboard = get_settings_keyboard(slippage, fee)
+async def show_settings_in_place(message: Message, state: FSMContext) -> None:
+    """Edit the stored settings menu with fresh values; send a new one only if it is gone."""
+    menu_id = (await state.get_data()).get("settings_msg_id")
+    if isinstance(menu_id, int) and await edit_settings_by_id(message.bot, message.chat.id, menu_id):
+        return
 
-    text = (
-        "⚙️ <b>Transaction Settings</b>\n\n"
-        "Here you can adjust slippage tolerance and transaction fee.\n"
-        "These settings apply to all your wallets, for both buys and sells."
-    )
+    keyboard = get_settings_keyboard(*await load_settings(message.from_user.id))
+    sent = await render(message, SETTINGS_TEXT, keyboard)
+    await state.update_data(settings_msg_id=sent.message_id)
 
-    data = await state.get_data()
-    old_msg_id = data.get("settings_msg_id")
-    if old_msg_id:
-        try:
-            await message.bot.delete_message(chat_id=message.chat.id, message_id=old_msg_id)
-        except TelegramBadRequest:
-            pass
 
-    sent = await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
-    await state.update_data(settings_msg_id=sent.message_id)
-    await state.clear()
+@router.message(Command("settings"))
+async def cmd_settings(message: Message, state: FSMContext):
+    await state.set_state(None)
+    await show_settings_in_place(message, state)
@@ -6,6 +6,7 @@ from aiogram.fsm.context import FSMContext
 from bot.keyboards.main_menu import get_main_menu
 from bot.utils.value_data import fetch_sol_price
 from bot.utils.main_menu_data import get_first_wallet_and_balance
+from bot.utils.render import render
 
 start_router = Router()
 
@@ -38,23 +39,12 @@ async def render_main_menu(
     elif return_text:
         return text
 
-    if isinstance(target, Message):
-        await target.answer(text, reply_markup=markup, parse_mode="HTML")
+    if isinstance(target, (Message, CallbackQuery)):
+        shown = await render(target, text, markup)
         if state:
             await state.update_data(
-                current_chat_id=target.chat.id,
-                current_message_id=target.message_id
-            )
-    elif isinstance(target, CallbackQuery):
-        try:
-            await target.message.delete()
-        except:
-            pass
-        await target.message.answer(text, reply_markup=markup, parse_mode="HTML")
-        if state:
-            await state.update_data(
-                current_chat_id=target.message.chat.id,
-                current_message_id=target.message.message_id
+                current_chat_id=shown.chat.id,
+                current_message_id=shown.message_id
             )
 
 
@@ -1,5 +1,6 @@
 from aiogram import Router
 from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
 from datetime import datetime, timezone
 
 from bot.keyboards.wallets import get_wallets_keyboard
@@ -10,14 +11,14 @@ from bot.utils.value_data import (
     get_wallets_text,
     get_user_with_wallets,
 )
+from bot.utils.wallet_selection import get_selected_wallets
 from bot.database.db import async_session
 
 start_wallets_router = Router()
-user_selected_wallets = {}
 
 
 @start_wallets_router.message(lambda msg: msg.text == "/wallets")
-async def wallets_command_handler(message: Message):
+async def wallets_command_handler(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
 
     async with async_session() as session:
@@ -33,7 +34,7 @@ async def wallets_command_handler(message: Message):
 
         sol_price = await fetch_sol_price()
         balances_sol, balances_usdc = await get_balances_for_wallets(user.wallets)
-        selected = user_selected_wallets.get(telegram_id, set())
+        selected = await get_selected_wallets(state)
 
         total_usdc_equivalent = calculate_total_usdc_equivalent(
             user.wallets, balances_sol, balances_usdc, sol_price
@@ -12,8 +12,10 @@ from bot.utils.value_data import (
     check_sol_swap_possibility,
     check_usdc_swap_possibility,
 )
-from bot.handlers.wallets import user_selected_wallets
 from bot.utils.common import go_back_to_wallets
+from bot.utils.wallet_selection import get_selected_wallets
+from bot.utils.render import render
+from bot.middlewares.outbox import Priority, send_priority
 from bot.keyboards.swap import get_swap_keyboard
 from bot.services.encryption import decrypt_seed
 from bot.services.rust_swap import (
@@ -22,6 +24,8 @@ from bot.services.rust_swap import (
     swap_fixed_sol_to_usdc,
     swap_fixed_usdc_to_sol,
 )
+from bot.services.confirmation import track_signature
+from bot.services.inflight import inflight_key, run_deduplicated
 from bot.states.swap_states import SwapState
 import logging
 
@@ -29,9 +33,9 @@ logger = logging.getLogger(__name__)
 swap_router = Router()
 
 
-async def render_swap_menu(callback: CallbackQuery):
+async def render_swap_menu(callback: CallbackQuery, state: FSMContext):
     telegram_id = callback.from_user.id
-    selected_addresses = user_selected_wallets.get(telegram_id)
+    selected_addresses = await get_selected_wallets(state)
 
     if not selected_addresses:
         await callback.answer("❗ Please select at least one wallet in Wallets section.", show_alert=True)
@@ -61,34 +65,34 @@ async def render_swap_menu(callback: CallbackQuery):
         current_time = datetime.now(timezone.utc).strftime("%H:%M:%S")
         lines.append(f"⏱ <i>Last updated: {current_time} UTC</i>")
 
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass
-
-        await callback.message.answer(
-            "\n".join(lines),
-            reply_markup=get_swap_keyboard(),
-            parse_mode="HTML"
-        )
+        await render(callback, "\n".join(lines), get_swap_keyboard())
 
 
 @swap_router.callback_query(F.data == "swap")
 async def show_swap_menu(callback: CallbackQuery, state: FSMContext):
-    await render_swap_menu(callback)
+    await render_swap_menu(callback, state)
 
 
 @swap_router.callback_query(F.data == "refresh_swap_menu")
 async def refresh_swap_menu(callback: CallbackQuery, state: FSMContext):
-    await render_swap_menu(callback)
+    with send_priority(Priority.REFRESH):
+        await render_swap_menu(callback, state)
 
 
 @swap_router.callback_query(F.data == "swap_all_sol_usdc")
-async def handle_swap_all_sol_usdc(callback: CallbackQuery):
-    await callback.answer("⏳ Swapping SOL → USDC...", show_alert=False)
-
+async def handle_swap_all_sol_usdc(callback: CallbackQuery, state: FSMContext):
     telegram_id = callback.from_user.id
-    selected_addresses = user_selected_wallets.get(telegram_id, set())
+    selected_addresses = await get_selected_wallets(state)
+
+    await run_deduplicated(
+        inflight_key(telegram_id, "swap_all_sol_usdc", wallets=selected_addresses),
+        lambda: swap_all_sol_usdc_for_wallets(callback, telegram_id, selected_addresses),
+        on_duplicate=lambda: callback.answer("⏳ This swap is already being processed."),
+    )
+
+
+async def swap_all_sol_usdc_for_wallets(callback: CallbackQuery, telegram_id: int, selected_addresses: set):
+    await callback.answer("⏳ Swapping SOL → USDC...", show_alert=False)
 
     logger.info(f"[SOL→USDC] User {telegram_id} initiated swap for wallets: {selected_addresses}")
 
@@ -123,6 +127,7 @@ async def handle_swap_all_sol_usdc(callback: CallbackQuery):
                 txid = await swap_all_sol_to_usdc(keypair, lamports)
                 if txid and txid != "null":
                     logger.info(f"[SOL→USDC] Swap success for {wallet.address} → {txid}")
+                    track_signature(telegram_id, txid, "SOL → USDC swap")
                     success.append((wallet.address, txid))
                 else:
                     logger.error(f"[SOL→USDC] Swap failed: No route for {wallet.address}")
@@ -135,11 +140,19 @@ async def handle_swap_all_sol_usdc(callback: CallbackQuery):
 
 
 @swap_router.callback_query(F.data == "swap_all_usdc_sol")
-async def handle_swap_all_usdc_sol(callback: CallbackQuery):
-    await callback.answer("⏳ Swapping USDC → SOL...", show_alert=False)
-
+async def handle_swap_all_usdc_sol(callback: CallbackQuery, state: FSMContext):
     telegram_id = callback.from_user.id
-    selected_addresses = user_selected_wallets.get(telegram_id, set())
+    selected_addresses = await get_selected_wallets(state)
+
+    await run_deduplicated(
+        inflight_key(telegram_id, "swap_all_usdc_sol", wallets=selected_addresses),
+        lambda: swap_all_usdc_sol_for_wallets(callback, telegram_id, selected_addresses),
+        on_duplicate=lambda: callback.answer("⏳ This swap is already being processed."),
+    )
+
+
+async def swap_all_usdc_sol_for_wallets(callback: CallbackQuery, telegram_id: int, selected_addresses: set):
+    await callback.answer("⏳ Swapping USDC → SOL...", show_alert=False)
 
     logger.info(f"[USDC→SOL] User {telegram_id} initiated swap for wallets: {selected_addresses}")
 
@@ -173,6 +186,7 @@ async def handle_swap_all_usdc_sol(callback: CallbackQuery):
                 txid = await swap_all_usdc_to_sol(keypair)
                 if txid and txid != "null":
                     logger.info(f"[USDC→SOL] Swap success for {wallet.address} → {txid}")
+                    track_signature(telegram_id, txid, "USDC → SOL swap")
                     success.append((wallet.address, txid))
                 else:
                     logger.error(f"[USDC→SOL] Swap failed: No route for {wallet.address}")
@@ -199,7 +213,7 @@ async def handle_swap_fixed_usdc_sol(callback: CallbackQuery, state: FSMContext)
 @swap_router.message(SwapState.fixed_sol_to_usdc_amount)
 async def process_fixed_sol_to_usdc(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
-    selected_addresses = user_selected_wallets.get(telegram_id, set())
+    selected_addresses = await get_selected_wallets(state)
 
     logger.info(f"[FIXED SOL→USDC] (1) User {telegram_id} entered amount: {message.text}")
     logger.info(f"[FIXED SOL→USDC] (2) Selected wallets: {selected_addresses}")
@@ -213,6 +227,19 @@ async def process_fixed_sol_to_usdc(message: Message, state: FSMContext):
         await message.answer("❌ Enter a valid number greater than zero.")
         return
 
+    await run_deduplicated(
+        inflight_key(telegram_id, "swap_fixed_sol_usdc", amount=amount, wallets=selected_addresses),
+        lambda: swap_fixed_sol_usdc_for_wallets(message, state, telegram_id, selected_addresses, amount),
+    )
+
+
+async def swap_fixed_sol_usdc_for_wallets(
+    message: Message,
+    state: FSMContext,
+    telegram_id: int,
+    selected_addresses: set,
+    amount: float,
+):
     await message.answer("⏳ Swapping SOL → USDC. Please wait...")
 
     async with async_session() as session:
@@ -256,6 +283,7 @@ async def process_fixed_sol_to_usdc(message: Message, state: FSMContext):
                 logger.info(f"[FIXED SOL→USDC] (12) TXID returned: {txid}")
                 if txid and txid != "null":
                     logger.info(f"[FIXED SOL→USDC] (13) SUCCESS: {wallet.address} → {txid}")
+                    track_signature(telegram_id, txid, "SOL → USDC swap")
                     success.append((wallet.address, txid))
                 else:
                     logger.error(f"[FIXED SOL→USDC] (14) FAIL: No route for {wallet.address}")
@@ -273,7 +301,7 @@ async def process_fixed_sol_to_usdc(message: Message, state: FSMContext):
 @swap_router.message(SwapState.fixed_usdc_to_sol_amount)
 async def process_fixed_usdc_to_sol(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
-    selected_addresses = user_selected_wallets.get(telegram_id, set())
+    selected_addresses = await get_selected_wallets(state)
 
     logger.info(f"[FIXED USDC→SOL] User {telegram_id} entered amount: {message.text}")
 
@@ -285,6 +313,19 @@ async def process_fixed_usdc_to_sol(message: Message, state: FSMContext):
         await message.answer("❌ Minimum amount for swap is 1.0 USDC")
         return
 
+    await run_deduplicated(
+        inflight_key(telegram_id, "swap_fixed_usdc_sol", amount=amount, wallets=selected_addresses),
+        lambda: swap_fixed_usdc_sol_for_wallets(message, state, telegram_id, selected_addresses, amount),
+    )
+
+
+async def swap_fixed_usdc_sol_for_wallets(
+    message: Message,
+    state: FSMContext,
+    telegram_id: int,
+    selected_addresses: set,
+    amount: float,
+):
     await message.answer("⏳ Swapping USDC → SOL. Please wait...")
 
     async with async_session() as session:
@@ -317,6 +358,7 @@ async def process_fixed_usdc_to_sol(message: Message, state: FSMContext):
                 txid = await swap_fixed_usdc_to_sol(keypair, usdc_amount)
                 if txid and txid != "null":
                     logger.info(f"[FIXED USDC→SOL] Success for {wallet.address} → {txid}")
+                    track_signature(telegram_id, txid, "USDC → SOL swap")
                     success.append((wallet.address, txid))
                 else:
                     logger.error(f"[FIXED USDC→SOL] No route for {wallet.address}")
@@ -343,10 +385,9 @@ async def send_swap_result(message_or_cb, success: list, failed: list):
         for addr, err in failed:
             text += f"• <code>{addr[:6]}...{addr[-4:]}</code> → {err}\n"
 
-    if isinstance(message_or_cb, Message):
-        await message_or_cb.answer(text or "❌ Swap failed.", disable_web_page_preview=True)
-    else:
-        await message_or_cb.message.answer(text or "❌ Swap failed.", disable_web_page_preview=True)
+    message = message_or_cb if isinstance(message_or_cb, Message) else message_or_cb.message
+    with send_priority(Priority.TRADE):
+        await message.answer(text or "❌ Swap failed.", disable_web_page_preview=True)
 
 
 @swap_router.callback_query(F.data == "back_to_wallets")
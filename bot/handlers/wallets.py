@@ -2,7 +2,6 @@ from datetime import datetime, timezone
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import TelegramBadRequest
 from sqlalchemy import select, delete
 from solders.keypair import Keypair
 from sqlalchemy import func
@@ -21,36 +20,33 @@ from bot.utils.value_data import (
     get_balances_for_wallets,
     get_wallets_text,
     get_user_with_wallets,
+    invalidate_user_wallets,
 )
+from bot.utils.wallet_selection import get_selected_wallets, set_selected_wallets
+from bot.utils.render import render
 
 wallets_router = Router()
-user_selected_wallets = {}  # Telegram user ID → set(addresses)
 
 
 @wallets_router.callback_query(F.data == "wallets")
-async def show_wallets(callback: CallbackQuery):
+async def show_wallets(callback: CallbackQuery, state: FSMContext):
     telegram_id = callback.from_user.id
 
     async with async_session() as session:
         user = await get_user_with_wallets(telegram_id, session)
 
         if not user or not user.wallets:
-            try:
-                await callback.message.delete()
-            except TelegramBadRequest:
-                pass
-
-            await callback.message.answer(
+            await render(
+                callback,
                 "💼 <b>Your Wallets</b>\n\n"
                 "You don't have any wallets yet. Click ➕ to create one.",
-                reply_markup=get_wallets_keyboard([], {}, {}, set()),
-                parse_mode="HTML"
+                get_wallets_keyboard([], {}, {}, set()),
             )
             return
 
         sol_price = await fetch_sol_price()
         balances_sol, balances_usdc = await get_balances_for_wallets(user.wallets)
-        selected = user_selected_wallets.get(telegram_id, set())
+        selected = await get_selected_wallets(state)
 
         total_usdc_equivalent = calculate_total_usdc_equivalent(
             user.wallets, balances_sol, balances_usdc, sol_price
@@ -64,22 +60,13 @@ async def show_wallets(callback: CallbackQuery):
             f"⏱ <i>Last updated at {datetime.now(timezone.utc):%H:%M:%S} UTC</i>"
         )
 
-        try:
-            await callback.message.delete()
-        except TelegramBadRequest:
-            pass
-
-        await callback.message.answer(
-            text,
-            reply_markup=get_wallets_keyboard(user.wallets, balances_sol, balances_usdc, selected),
-            parse_mode="HTML"
-        )
+        await render(callback, text, get_wallets_keyboard(user.wallets, balances_sol, balances_usdc, selected))
 
 
 @wallets_router.callback_query(F.data.startswith("copy_wallet_balance:"))
-async def refresh_wallets_on_balance_click(callback: CallbackQuery):
+async def refresh_wallets_on_balance_click(callback: CallbackQuery, state: FSMContext):
     try:
-        await show_wallets(callback)
+        await show_wallets(callback, state)
     except Exception:
         pass
     await callback.answer()
@@ -112,6 +99,7 @@ async def create_new_wallet(callback: CallbackQuery, state: FSMContext):
         wallet = Wallet(address=pubkey, encrypted_seed=encrypted, user_id=user.id)
         session.add(wallet)
         await session.commit()
+    invalidate_user_wallets(telegram_id)
 
     text_private = (
         "🆕 <b>New Wallet Info:</b>\n\n"
@@ -132,21 +120,21 @@ async def create_new_wallet(callback: CallbackQuery, state: FSMContext):
 
 
 @wallets_router.callback_query(F.data.startswith("select_wallet:"))
-async def select_wallet(callback: CallbackQuery):
-    telegram_id = callback.from_user.id
+async def select_wallet(callback: CallbackQuery, state: FSMContext):
     address = callback.data.split("select_wallet:")[1]
-    selected = user_selected_wallets.setdefault(telegram_id, set())
+    selected = await get_selected_wallets(state)
     if address in selected:
         selected.remove(address)
     else:
         selected.add(address)
-    await show_wallets(callback)
+    await set_selected_wallets(state, selected)
+    await show_wallets(callback, state)
 
 
 @wallets_router.callback_query(F.data == "delete_wallet")
-async def delete_selected_wallet(callback: CallbackQuery):
+async def delete_selected_wallet(callback: CallbackQuery, state: FSMContext):
     telegram_id = callback.from_user.id
-    selected = user_selected_wallets.get(telegram_id, set())
+    selected = await get_selected_wallets(state)
 
     if not selected:
         await callback.answer("❗ Please select at least one wallet", show_alert=True)
@@ -156,10 +144,11 @@ async def delete_selected_wallet(callback: CallbackQuery):
         for address in selected:
             await session.execute(delete(Wallet).where(Wallet.address == address))
         await session.commit()
+    invalidate_user_wallets(telegram_id)
 
-    user_selected_wallets[telegram_id] = set()
+    await set_selected_wallets(state, set())
     await callback.answer("🗑️ Selected wallets deleted")
-    await show_wallets(callback)
+    await show_wallets(callback, state)
 
 
 @wallets_router.callback_query(F.data == "add_wallet")
@@ -213,6 +202,7 @@ async def add_wallet_by_private_key(message: Message, state: FSMContext):
         wallet = Wallet(address=pubkey, encrypted_seed=encrypted, user_id=user.id)
         session.add(wallet)
         await session.commit()
+    invalidate_user_wallets(telegram_id)
 
     await state.clear()
     await message.answer(f"✅ Wallet <code>{pubkey}</code> has been added.")
@@ -1,37 +1,38 @@
 from aiogram import Router, F
-from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from datetime import datetime, timezone
-from sqlalchemy import select
 from solders.pubkey import Pubkey
 
-from bot.handlers.wallets import user_selected_wallets
 from bot.database.db import async_session
-from bot.database.models import Wallet
 from bot.keyboards.withdraw import get_withdraw_keyboard
 from bot.services.rust_swap import withdraw_sol_txid, withdraw_usdc_txid
+from bot.services.inflight import inflight_key, run_deduplicated
 from bot.states.wallets import WalletStates
 from bot.utils.value_data import (
     check_sol_withdraw_possibility,
     check_usdc_withdraw_possibility,
     get_balances_for_wallets,
+    get_user_with_wallets,
 )
+from bot.utils.wallet_selection import get_selected_wallets
+from bot.utils.render import render
+from bot.middlewares.outbox import Priority, send_priority
 
 withdraw_router = Router()
 
 
-async def show_withdraw_options(callback: CallbackQuery):
+async def show_withdraw_options(callback: CallbackQuery, state: FSMContext):
     telegram_id = callback.from_user.id
-    selected = user_selected_wallets.get(telegram_id, set())
+    selected = await get_selected_wallets(state)
 
     if not selected:
         await callback.answer("❗ Please select at least one wallet", show_alert=True)
         return
 
     async with async_session() as session:
-        result = await session.execute(select(Wallet).where(Wallet.address.in_(selected)))
-        wallets = result.scalars().all()
+        user = await get_user_with_wallets(telegram_id, session)
+    wallets = [w for w in user.wallets if w.address in selected] if user else []
 
     balances_sol, balances_usdc = await get_balances_for_wallets(wallets)
 
@@ -46,16 +47,7 @@ async def show_withdraw_options(callback: CallbackQuery):
     lines.append(f"\n⏱️ <i>Last updated: {datetime.now(timezone.utc):%H:%M:%S} UTC</i>")
     text = "\n".join(lines)
 
-    try:
-        await callback.message.delete()
-    except TelegramBadRequest:
-        pass
-
-    await callback.message.answer(
-        text,
-        reply_markup=get_withdraw_keyboard(),
-        parse_mode="HTML"
-    )
+    await render(callback, text, get_withdraw_keyboard())
 
 
 @withdraw_router.callback_query(F.data == "withdraw_sol")
@@ -93,15 +85,28 @@ async def handle_withdraw_amount(message: Message, state: FSMContext):
     data = await state.get_data()
     to_address = data.get("withdraw_to_address")
     telegram_id = message.from_user.id
-    selected = user_selected_wallets.get(telegram_id, set())
+    selected = await get_selected_wallets(state)
 
     if not selected:
         await message.answer("❗ No wallets selected for withdrawal.")
         return
 
+    await run_deduplicated(
+        inflight_key(telegram_id, "withdraw_sol", to_address, amount, selected),
+        lambda: withdraw_sol_from_selected(message, state, to_address, amount, selected),
+    )
+
+
+async def withdraw_sol_from_selected(
+    message: Message,
+    state: FSMContext,
+    to_address: str,
+    amount: float,
+    selected: set,
+):
     async with async_session() as session:
-        result = await session.execute(select(Wallet).where(Wallet.address.in_(selected)))
-        wallets = result.scalars().all()
+        user = await get_user_with_wallets(message.from_user.id, session)
+    wallets = [w for w in user.wallets if w.address in selected] if user else []
 
     await message.answer("⏳ Processing withdrawal...")
 
@@ -126,7 +131,8 @@ async def handle_withdraw_amount(message: Message, state: FSMContext):
     for addr, reason in failed.items():
         text += f"❌ <code>{addr}</code> — {reason}\n"
 
-    await message.answer(text, disable_web_page_preview=True)
+    with send_priority(Priority.TRADE):
+        await message.answer(text, disable_web_page_preview=True)
     await state.clear()
 
 
@@ -166,15 +172,28 @@ async def handle_withdraw_usdc_amount(message: Message, state: FSMContext):
     data = await state.get_data()
     to_address = data.get("withdraw_to_address")
     telegram_id = message.from_user.id
-    selected = user_selected_wallets.get(telegram_id, set())
+    selected = await get_selected_wallets(state)
 
     if not selected:
         await message.answer("❗ No wallets selected for withdrawal.")
         return
 
+    await run_deduplicated(
+        inflight_key(telegram_id, "withdraw_usdc", to_address, amount, selected),
+        lambda: withdraw_usdc_from_selected(message, state, to_address, amount, selected),
+    )
+
+
+async def withdraw_usdc_from_selected(
+    message: Message,
+    state: FSMContext,
+    to_address: str,
+    amount: float,
+    selected: set,
+):
     async with async_session() as session:
-        result = await session.execute(select(Wallet).where(Wallet.address.in_(selected)))
-        wallets = result.scalars().all()
+        user = await get_user_with_wallets(message.from_user.id, session)
+    wallets = [w for w in user.wallets if w.address in selected] if user else []
 
     await message.answer("⏳ Processing USDC withdrawal...")
 
@@ -205,10 +224,11 @@ async def handle_withdraw_usdc_amount(message: Message, state: FSMContext):
     for addr, reason in failed.items():
         text += f"❌ <code>{addr}</code> — {reason}\n"
 
-    await message.answer(text, disable_web_page_preview=True)
+    with send_priority(Priority.TRADE):
+        await message.answer(text, disable_web_page_preview=True)
     await state.clear()
 
 
 @withdraw_router.callback_query(F.data == "withdraw_all")
-async def handle_withdraw_all(callback: CallbackQuery):
-    await show_withdraw_options(callback)
\ No newline at end of file
+async def handle_withdraw_all(callback: CallbackQuery, state: FSMContext):
+    await show_withdraw_options(callback, state)
\ No newline at end of file
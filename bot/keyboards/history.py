@@ -0,0 +1,14 @@
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+
+def get_history_keyboard(next_cursor: str | None, first_page: bool) -> InlineKeyboardMarkup:
+    nav = []
+    if not first_page:
+        nav.append(InlineKeyboardButton(text="⏮ Newest", callback_data="history"))
+    if next_cursor:
+        nav.append(InlineKeyboardButton(text="Older ➡️", callback_data=f"history:{next_cursor}"))
+
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton(text="📄 Export CSV", callback_data="history_export")])
+    rows.append([InlineKeyboardButton(text="🔙 Back to Menu", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
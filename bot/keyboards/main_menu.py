@@ -11,6 +11,9 @@ def get_main_menu() -> InlineKeyboardMarkup:
             [
                 InlineKeyboardButton(text="⚙️ Settings", callback_data="settings"),
                 InlineKeyboardButton(text="📈 Earn with Sensei", callback_data="earn_menu")
+            ],
+            [
+                InlineKeyboardButton(text="📜 Trade History", callback_data="history")
             ]
         ]
     )
\ No newline at end of file
@@ -1,11 +1,13 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 
-def get_settings_keyboard(slippage: int, fee: float) -> InlineKeyboardMarkup:
+def get_settings_keyboard(slippage: int, fee: float, fee_mode: str = "fixed") -> InlineKeyboardMarkup:
     """
     Build an inline keyboard showing current slippage and fee,
     with buttons to change each and a back-to-main option.
+    In auto fee mode the configured fee is shown as the upper limit.
     """
+    fee_text = f"Fee: auto (max {fee} SOL)" if fee_mode == "auto" else f"Fee: {fee} SOL"
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
@@ -20,7 +22,7 @@ def get_settings_keyboard(slippage: int, fee: float) -> InlineKeyboardMarkup:
             ],
             [
                 InlineKeyboardButton(
-                    text=f"Fee: {fee} SOL",
+                    text=fee_text,
                     callback_data="settings_fee"
                 ),
                 InlineKeyboardButton(
@@ -28,6 +30,12 @@ def get_settings_keyboard(slippage: int, fee: float) -> InlineKeyboardMarkup:
                     callback_data="settings_enter_fee"
                 ),
             ],
+            [
+                InlineKeyboardButton(
+                    text="⚡ Fee mode: Auto" if fee_mode == "auto" else "⚡ Fee mode: Fixed",
+                    callback_data="settings_toggle_fee_mode"
+                ),
+            ],
             [
                 InlineKeyboardButton(
                     text="🔙 Back to Main",
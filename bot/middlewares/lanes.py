@@ -0,0 +1,112 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject
+from dotenv import load_dotenv
+
+from bot.utils.metrics import observe
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Updates handled at once across all users
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+# Updates one user may have queued or running before new ones are dropped
+LANE_MAX_PENDING = int(os.getenv("LANE_MAX_PENDING", "20"))
+
+
+_NO_LOCK = contextlib.nullcontext()
+
+
+class _Lane:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class UserLanesMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: updates from one user are handled one at a time
+    in arrival order, updates from different users run concurrently, at most
+    `max_concurrent` at once.
+
+    Must run before the FSM middleware so state is read inside the lane.
+    asyncio.Lock wakes waiters in FIFO order, and nothing awaits between the
+    dispatcher creating an update's task and this middleware, so arrival
+    order is kept. A lane is dropped as soon as nothing is queued on it.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_UPDATES, max_pending: int = LANE_MAX_PENDING):
+        self.max_pending = max_pending
+        self.max_concurrent = max_concurrent
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._lanes: dict[int, _Lane] = {}
+        self.waiting = 0
+        self.running = 0
+        self.dropped = 0
+
+    async def _run(self, handler, event, data, lock: asyncio.Lock | None) -> Any:
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        waiting = True
+        try:
+            # Take the user's lane first so queued updates don't hold global slots
+            async with lock or _NO_LOCK, self._slots:
+                self.waiting -= 1
+                waiting = False
+                observe("lanes.wait", (time.perf_counter() - queued_at) * 1000)
+                self.running += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.running -= 1
+        finally:
+            if waiting:
+                self.waiting -= 1
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await self._run(handler, event, data, None)
+
+        lane = self._lanes.get(user.id)
+        if lane is None:
+            lane = self._lanes[user.id] = _Lane()
+        if lane.pending >= self.max_pending:
+            self.dropped += 1
+            logger.warning(f"[LANES] Dropped update {event.update_id} from {user.id}: {lane.pending} pending")
+            return UNHANDLED
+
+        lane.pending += 1
+        try:
+            return await self._run(handler, event, data, lane.lock)
+        finally:
+            lane.pending -= 1
+            if lane.pending == 0:
+                del self._lanes[user.id]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "lanes": len(self._lanes),
+            "max_depth": max((lane.pending for lane in self._lanes.values()), default=0),
+            "waiting": self.waiting,
+            "running": self.running,
+            "max_concurrent": self.max_concurrent,
+            "dropped": self.dropped,
+        }
+
+
+user_lanes = UserLanesMiddleware()
@@ -0,0 +1,283 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendChatAction, TelegramMethod
+from dotenv import load_dotenv
+
+from bot.utils.metrics import observe
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Messages per second for the whole bot token
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+# Messages per second to one private chat, and how many may go out back to back
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+# Messages per minute to one group or channel
+OUTBOX_GROUP_PER_MIN = float(os.getenv("OUTBOX_GROUP_PER_MIN", "20"))
+# Flood waits a single message sits out before the error reaches its sender
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+
+# The global limit is per bot token, so sharded workers split it
+if os.getenv("BOT_MODE") == "worker":
+    OUTBOX_GLOBAL_RATE /= int(os.getenv("BOT_WORKERS", "1"))
+
+MAX_IDLE_CHATS = 10_000
+
+# API methods that post or change a message in a chat
+_LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+
+class Priority(IntEnum):
+    TRADE = 0    # trade results and trade alerts
+    NORMAL = 1
+    REFRESH = 2  # cosmetic re-renders the user can simply repeat
+
+
+_priority: ContextVar[Priority] = ContextVar("outbox_priority", default=Priority.NORMAL)
+
+
+@contextlib.contextmanager
+def send_priority(priority: Priority):
+    """Messages sent inside the block (and tasks started from it) are queued with `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Bucket:
+    """Token bucket, plus a flood wait Telegram asked for."""
+    __slots__ = ("rate", "burst", "tokens", "stamp", "blocked_until")
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = now
+        self.blocked_until = 0.0
+
+    def ready_at(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        ready = now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+        return max(ready, self.blocked_until)
+
+    def idle(self, now: float) -> bool:
+        return self.ready_at(now) == now and self.tokens >= self.burst
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "edit_key", "bot", "method", "make_request",
+                 "future", "followers", "superseded", "queued_at", "retries")
+
+    def __init__(self, priority, seq, chat_id, edit_key, bot, method, make_request, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.edit_key = edit_key
+        self.bot = bot
+        self.method = method
+        self.make_request = make_request
+        self.future = future
+        # Callers of superseded edits, answered with this job's result
+        self.followers: list[asyncio.Future] = []
+        self.superseded = False
+        self.queued_at = time.perf_counter()
+        self.retries = 0
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def abandoned(self) -> bool:
+        return self.superseded or (self.future.done() and all(f.done() for f in self.followers))
+
+    def resolve(self, result=None, error: BaseException | None = None) -> None:
+        for future in (self.future, *self.followers):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class OutboxMiddleware(BaseRequestMiddleware):
+    """
+    Session middleware queueing every message send and edit, so the bot stays
+    within Telegram's global and per-chat limits instead of hitting flood
+    errors. Other API calls pass straight through.
+
+    Queued messages go out by priority (see `send_priority`), then in order.
+    An edit of a message that still has an unsent edit of the same kind
+    replaces it; both callers get the result of the newer one. A
+    TelegramRetryAfter pauses that chat for `retry_after` and requeues the
+    message, up to `max_retries` times before the error reaches the caller.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOX_GLOBAL_RATE,
+        chat_rate: float = OUTBOX_CHAT_RATE,
+        chat_burst: int = OUTBOX_CHAT_BURST,
+        group_per_min: float = OUTBOX_GROUP_PER_MIN,
+        max_retries: int = OUTBOX_MAX_RETRIES,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_per_min / 60
+        self.max_retries = max_retries
+        self._global = _Bucket(global_rate, max(1, int(global_rate)), time.monotonic())
+        self._chats: dict[int | str, _Bucket] = {}
+        self._queue: list[_Job] = []
+        self._edits: dict[tuple, _Job] = {}
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._scheduler: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+        self.sent = 0
+        self.merged = 0
+        self.retried = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot,
+        method: TelegramMethod,
+    ):
+        if isinstance(method, SendChatAction) or not type(method).__name__.startswith(_LIMITED_PREFIXES):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # Inline messages aren't tied to a chat we can pace
+            return await make_request(bot, method)
+
+        message_id = getattr(method, "message_id", None)
+        edit_key = (type(method).__name__, chat_id, message_id) if message_id is not None else None
+        job = _Job(_priority.get(), next(self._seq), chat_id, edit_key, bot, method, make_request,
+                   asyncio.get_running_loop().create_future())
+        self._push(job)
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.create_task(self._schedule())
+        return await job.future
+
+    def _push(self, job: _Job) -> None:
+        if job.edit_key is not None:
+            older = self._edits.get(job.edit_key)
+            if older is not None and older is not job:
+                # The unsent edit is superseded: only the newer one goes out, for both callers
+                job.followers += [older.future, *older.followers]
+                older.superseded = True
+                self.merged += 1
+            self._edits[job.edit_key] = job
+        heapq.heappush(self._queue, job)
+        self._wake.set()
+
+    def _chat(self, chat_id: int | str, now: float) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = self._chats[chat_id] = _Bucket(
+                self.chat_rate if private else self.group_rate,
+                self.chat_burst if private else 1,
+                now,
+            )
+        return bucket
+
+    def _take(self, job: _Job) -> None:
+        if job.edit_key is not None and self._edits.get(job.edit_key) is job:
+            del self._edits[job.edit_key]
+
+    async def _schedule(self) -> None:
+        while True:
+            now = time.monotonic()
+            next_at = None
+            deferred = []
+            while self._queue:
+                ready = self._global.ready_at(now)
+                if ready > now:
+                    next_at = ready if next_at is None else min(next_at, ready)
+                    break
+                job = heapq.heappop(self._queue)
+                if job.abandoned():
+                    self._take(job)
+                    continue
+                chat = self._chat(job.chat_id, now)
+                ready = chat.ready_at(now)
+                if ready > now:
+                    deferred.append(job)
+                    next_at = ready if next_at is None else min(next_at, ready)
+                    continue
+                chat.tokens -= 1
+                self._global.tokens -= 1
+                self._take(job)
+                task = asyncio.create_task(self._execute(job, chat))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+            for job in deferred:
+                heapq.heappush(self._queue, job)
+
+            if len(self._chats) > MAX_IDLE_CHATS:
+                for chat_id in [c for c, bucket in self._chats.items() if bucket.idle(now)]:
+                    del self._chats[chat_id]
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if next_at is None else next_at - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: _Job, chat: _Bucket) -> None:
+        observe("outbox.wait", (time.perf_counter() - job.queued_at) * 1000)
+        try:
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            if job.retries >= self.max_retries:
+                job.resolve(error=e)
+                return
+            job.retries += 1
+            self.retried += 1
+            chat.blocked_until = max(chat.blocked_until, time.monotonic() + e.retry_after)
+            logger.warning(f"[OUTBOX] Flood wait {e.retry_after}s in chat {job.chat_id}, "
+                           f"requeued {type(job.method).__name__} (try {job.retries})")
+            newer = self._edits.get(job.edit_key) if job.edit_key is not None else None
+            if newer is not None:
+                # A newer edit of the message was queued meanwhile; it answers this one's callers
+                newer.followers += [job.future, *job.followers]
+                self.merged += 1
+            else:
+                self._push(job)
+        except asyncio.CancelledError:
+            for future in (job.future, *job.followers):
+                future.cancel()
+            raise
+        except Exception as e:
+            job.resolve(error=e)
+        else:
+            self.sent += 1
+            job.resolve(result)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": sum(not job.abandoned() for job in self._queue),
+            "in_flight": len(self._in_flight),
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "merged": self.merged,
+            "retried": self.retried,
+        }
+
+
+outbox = OutboxMiddleware()
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+from aiogram import Bot
+from sqlalchemy import select, update, func
+
+from bot.constants import RPC_URL
+from bot.database.db import async_session
+from bot.database.models import Trade, TradeStatus, User
+from bot.middlewares.outbox import Priority, send_priority
+from bot.utils.pnl import confirm_trades
+
+logger = logging.getLogger(__name__)
+
+MAX_SIGNATURES_PER_REQUEST = 256  # getSignatureStatuses hard limit
+POLL_INTERVAL_SEC = 5
+# A blockhash is valid for ~150 slots (~60-90s); past this a missing signature is gone for good.
+DROP_AFTER = timedelta(seconds=120)
+# Trades still pending after this are not polled; bounding created_at lets
+# Postgres prune the lookup down to the current trades partition(s).
+PENDING_LOOKBACK = timedelta(days=1)
+# Older pending trades (left by an RPC or tracker outage) are swept this often,
+# and at startup, against the full transaction history
+STALE_SWEEP_INTERVAL_SEC = 10 * 60
+LANDED = {"confirmed", "finalized"}
+
+
+@dataclass
+class PendingSignature:
+    txid: str
+    telegram_id: int
+    label: str
+    expired: bool
+    trade_id: int | None = None
+    created_at: datetime | None = None
+
+
+# Signatures without a Trade row (plain SOL ↔ USDC swaps): txid → (telegram_id, label, sent_at)
+_untracked: dict[str, tuple[int, str, datetime]] = {}
+
+
+def track_signature(telegram_id: int, txid: str, label: str) -> None:
+    """
+    Register a signature that is not backed by a Trade row so the tracker
+    polls it together with pending trades.
+    """
+    if txid:
+        _untracked[txid] = (telegram_id, label, datetime.now(timezone.utc))
+
+
+async def fetch_signature_statuses(
+    http: aiohttp.ClientSession,
+    signatures: list[str],
+    search_history: bool = False,
+) -> list[dict | None]:
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getSignatureStatuses",
+        "params": [signatures, {"searchTransactionHistory": search_history}],
+    }
+    async with http.post(RPC_URL, json=payload) as resp:
+        if resp.status != 200:
+            raise Exception(f"RPC returned status {resp.status}")
+        data = await resp.json()
+
+    if "error" in data:
+        raise Exception(data["error"].get("message", "RPC error"))
+    return data.get("result", {}).get("value", [])
+
+
+async def collect_pending(shard: int = 0, workers: int = 1, stale: bool = False) -> list[PendingSignature]:
+    """
+    Pending trades of the users owned by `shard` (telegram id modulo
+    `workers`, as the sharded launcher routes them), plus this process's
+    untracked signatures. With `stale` only trades older than
+    PENDING_LOOKBACK are collected instead.
+    """
+    age = (
+        Trade.created_at <= func.now() - PENDING_LOOKBACK
+        if stale else
+        Trade.created_at > func.now() - PENDING_LOOKBACK
+    )
+    query = (
+        select(
+            Trade.id,
+            Trade.created_at,
+            Trade.txid,
+            Trade.type,
+            Trade.token,
+            User.telegram_id,
+            (Trade.created_at < func.now() - DROP_AFTER).label("expired"),
+        )
+        .join(User, User.id == Trade.user_id)
+        .where(
+            Trade.status == TradeStatus.PENDING,
+            Trade.txid.isnot(None),
+            age,
+        )
+        .order_by(Trade.id)
+    )
+    if workers > 1:
+        query = query.where(User.telegram_id % workers == shard)
+    async with async_session() as session:
+        rows = (await session.execute(query)).all()
+
+    pending = [
+        PendingSignature(
+            txid=row.txid,
+            telegram_id=row.telegram_id,
+            label=f"{row.type.value.lower()} of <code>{row.token}</code>",
+            expired=bool(row.expired),
+            trade_id=row.id,
+            created_at=row.created_at,
+        )
+        for row in rows
+    ]
+    if stale:
+        return pending
+
+    now = datetime.now(timezone.utc)
+    for txid, (telegram_id, label, sent_at) in list(_untracked.items()):
+        pending.append(PendingSignature(txid, telegram_id, label, now - sent_at > DROP_AFTER))
+
+    return pending
+
+
+def classify(status: dict | None, expired: bool) -> TradeStatus:
+    if status is None:
+        return TradeStatus.DROPPED if expired else TradeStatus.PENDING
+    if status.get("err") is not None:
+        return TradeStatus.FAILED
+    if status.get("confirmationStatus") in LANDED:
+        return TradeStatus.CONFIRMED
+    return TradeStatus.PENDING
+
+
+async def poll_pending_signatures(bot: Bot, shard: int = 0, workers: int = 1, stale: bool = False) -> None:
+    """
+    Resolve every pending signature of this shard with one
+    getSignatureStatuses call per 256 signatures. With `stale`, resolve the
+    trades older than PENDING_LOOKBACK, looked up in the transaction history.
+    """
+    pending = await collect_pending(shard, workers, stale)
+    if not pending:
+        return
+
+    resolved: dict[TradeStatus, list[PendingSignature]] = {}
+
+    async with aiohttp.ClientSession() as http:
+        for i in range(0, len(pending), MAX_SIGNATURES_PER_REQUEST):
+            chunk = pending[i:i + MAX_SIGNATURES_PER_REQUEST]
+            # Stale signatures are long out of the recent status cache
+            statuses = await fetch_signature_statuses(http, [p.txid for p in chunk], search_history=stale)
+
+            # The recent status cache only covers ~150 slots — before declaring a drop,
+            # make sure the signature hasn't simply aged out of it.
+            missing = [] if stale else [j for j, p in enumerate(chunk) if p.expired and statuses[j] is None]
+            if missing:
+                history = await fetch_signature_statuses(
+                    http, [chunk[j].txid for j in missing], search_history=True
+                )
+                for j, status in zip(missing, history):
+                    statuses[j] = status
+
+            for p, status in zip(chunk, statuses):
+                result = classify(status, p.expired)
+                if result != TradeStatus.PENDING:
+                    resolved.setdefault(result, []).append(p)
+
+    if not resolved:
+        return
+
+    # Trades this call actually moved out of PENDING; another process may have resolved the rest
+    changed: set[int] = set()
+    async with async_session() as session:
+        for status, items in resolved.items():
+            trades = [p for p in items if p.trade_id is not None]
+            if not trades:
+                continue
+            ids = [p.trade_id for p in trades]
+            # Partition key bound, so only the partitions holding these rows are touched
+            since = min(p.created_at for p in trades)
+            if status == TradeStatus.CONFIRMED:
+                # Positions, PnL and points are credited only now that the swap has landed
+                await confirm_trades(session, ids, since)
+                continue
+            changed.update((await session.scalars(
+                update(Trade)
+                .where(Trade.id.in_(ids), Trade.created_at >= since, Trade.status == TradeStatus.PENDING)
+                .values(status=status)
+                .returning(Trade.id)
+            )).all())
+            await session.commit()
+
+    for status, items in resolved.items():
+        for p in items:
+            _untracked.pop(p.txid, None)
+            if status == TradeStatus.CONFIRMED:
+                continue
+            if p.trade_id is not None and p.trade_id not in changed:
+                continue
+            reason = "failed on-chain" if status == TradeStatus.FAILED else "was dropped by the network"
+            try:
+                with send_priority(Priority.TRADE):
+                    await bot.send_message(
+                        chat_id=p.telegram_id,
+                        text=(
+                            f"⚠️ Your {p.label} {reason}.\n"
+                            f"↳ <a href='https://solscan.io/tx/{p.txid}'>tx</a>\n\n"
+                            "Please check your balances and try again."
+                        ),
+                        disable_web_page_preview=True,
+                    )
+            except Exception as e:
+                logger.warning(f"[CONFIRM] Failed to notify {p.telegram_id} about {p.txid}: {e}")
+
+
+async def run_confirmation_tracker(
+    bot: Bot,
+    interval: float = POLL_INTERVAL_SEC,
+    shard: int = 0,
+    workers: int = 1,
+) -> None:
+    swept_at = None
+    while True:
+        if swept_at is None or time.monotonic() - swept_at >= STALE_SWEEP_INTERVAL_SEC:
+            swept_at = time.monotonic()
+            try:
+                await poll_pending_signatures(bot, shard, workers, stale=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"[CONFIRM] Stale sweep failed: {e}")
+        try:
+            await poll_pending_signatures(bot, shard, workers)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"[CONFIRM] Poll failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import aiohttp
+from dotenv import load_dotenv
+
+from bot.constants import RPC_URL
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL_SEC = 10
+MAX_ESTIMATE_AGE_SEC = 60
+PERCENTILES = (25, 50, 75, 90)
+AUTO_FEE_PERCENTILE = 75
+# The bridge falls back to this limit when Jupiter doesn't return one.
+DEFAULT_COMPUTE_UNITS = 200_000
+MIN_AUTO_FEE_LAMPORTS = 5_000
+
+# Optional comma-separated accounts (e.g. hot AMM pools) to scope the sample to.
+FEE_ACCOUNTS = [a.strip() for a in os.getenv("PRIORITY_FEE_ACCOUNTS", "").split(",") if a.strip()]
+
+
+@dataclass(frozen=True)
+class FeeEstimate:
+    percentiles: dict[int, int]  # percentile → micro-lamports per compute unit
+    sampled_at: float
+
+
+_estimate: FeeEstimate | None = None
+
+
+def percentile(sorted_values: list[int], p: int) -> int:
+    if not sorted_values:
+        return 0
+    idx = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+async def sample_priority_fees(accounts: list[str] | None = None) -> FeeEstimate | None:
+    params = [accounts[:128]] if accounts else []
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getRecentPrioritizationFees",
+        "params": params,
+    }
+    async with aiohttp.ClientSession() as session:
+        async with session.post(RPC_URL, json=payload) as resp:
+            if resp.status != 200:
+                return None
+            data = await resp.json()
+
+    fees = sorted(int(item.get("prioritizationFee", 0)) for item in data.get("result") or [])
+    if not fees:
+        return None
+
+    return FeeEstimate(
+        percentiles={p: percentile(fees, p) for p in PERCENTILES},
+        sampled_at=time.monotonic(),
+    )
+
+
+def get_fee_estimate() -> FeeEstimate | None:
+    """Latest cached estimate, or None if it's missing or too old to trust."""
+    if _estimate is None or time.monotonic() - _estimate.sampled_at > MAX_ESTIMATE_AGE_SEC:
+        return None
+    return _estimate
+
+
+def resolve_fee_lamports(fee_mode: str, max_fee_lamports: int) -> int:
+    """
+    Total priority fee for one swap. In "auto" mode it follows the cached
+    network estimate, capped by the user's configured fee; without a fresh
+    estimate (or in "fixed" mode) the configured fee is used as is.
+    No RPC call happens here — the sampler keeps the cache warm.
+    """
+    if fee_mode != "auto":
+        return max_fee_lamports
+
+    estimate = get_fee_estimate()
+    if estimate is None:
+        return max_fee_lamports
+
+    micro_per_cu = estimate.percentiles[AUTO_FEE_PERCENTILE]
+    lamports = micro_per_cu * DEFAULT_COMPUTE_UNITS // 1_000_000
+    return min(max(lamports, MIN_AUTO_FEE_LAMPORTS), max_fee_lamports)
+
+
+async def run_fee_sampler(interval: float = SAMPLE_INTERVAL_SEC) -> None:
+    global _estimate
+    while True:
+        try:
+            estimate = await sample_priority_fees(FEE_ACCOUNTS)
+            if estimate is not None:
+                _estimate = estimate
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[FEES] Sampling failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,50 @@
+import logging
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from bot.database.db import async_session
+from bot.database.models import TelegramFile
+
+logger = logging.getLogger(__name__)
+
+# Icon URL → Telegram file_id. A file_id stays valid for the bot that
+# received it, so entries are kept for the process lifetime.
+_file_ids: dict[str, str] = {}
+
+
+async def get_file_id(url: str) -> str | None:
+    """file_id Telegram gave for the picture at `url`: from memory, then the telegram_files table."""
+    file_id = _file_ids.get(url)
+    if file_id is not None:
+        return file_id
+
+    async with async_session() as session:
+        file_id = await session.scalar(select(TelegramFile.file_id).where(TelegramFile.url == url))
+    if file_id is not None:
+        _file_ids[url] = file_id
+    return file_id
+
+
+async def save_file_id(url: str, file_id: str) -> None:
+    if _file_ids.get(url) == file_id:
+        return
+    _file_ids[url] = file_id
+    try:
+        async with async_session() as session:
+            stmt = pg_insert(TelegramFile).values(url=url, file_id=file_id)
+            await session.execute(
+                stmt.on_conflict_do_update(index_elements=[TelegramFile.url], set_={"file_id": stmt.excluded.file_id})
+            )
+            await session.commit()
+    except Exception as e:
+        # Still cached in memory; another process will upload it once more
+        logger.warning(f"[ICONS] Failed to store file_id for {url}: {e}")
+
+
+async def forget_file_id(url: str) -> None:
+    """Drop a file_id Telegram no longer accepts, so the next send uploads from `url` again."""
+    _file_ids.pop(url, None)
+    async with async_session() as session:
+        await session.execute(delete(TelegramFile).where(TelegramFile.url == url))
+        await session.commit()
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Repeats that arrive this soon after a job finished are still double-clicks.
+DEDUP_WINDOW_SEC = 3.0
+
+
+class _Job:
+    __slots__ = ("task", "finished_at")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.finished_at: float | None = None
+
+    def is_live(self, now: float) -> bool:
+        return self.finished_at is None or now - self.finished_at < DEDUP_WINDOW_SEC
+
+
+_jobs: dict[tuple, _Job] = {}
+
+
+def inflight_key(
+    telegram_id: int,
+    action: str,
+    ca: str | None = None,
+    amount=None,
+    wallets: Iterable[str] = (),
+) -> tuple:
+    """
+    Identity of a user-initiated operation: the same user asking for the same
+    action on the same token, amount and wallet set is considered a repeat.
+    """
+    return telegram_id, action, ca, None if amount is None else str(amount), frozenset(wallets)
+
+
+def _purge(now: float) -> None:
+    for key in [k for k, job in _jobs.items() if not job.is_live(now)]:
+        del _jobs[key]
+
+
+async def run_deduplicated(
+    key: tuple,
+    job: Callable[[], Awaitable],
+    on_duplicate: Callable[[], Awaitable] | None = None,
+) -> bool:
+    """
+    Run `job` unless an identical operation is already in flight.
+
+    A repeat attaches to the running job: `on_duplicate` is awaited (e.g. to
+    answer the callback) and then the caller waits for the original job to
+    finish without starting any work of its own. Errors are reported to the
+    caller that started the job only.
+
+    Returns True if this call started the job.
+    """
+    now = time.monotonic()
+    _purge(now)
+
+    existing = _jobs.get(key)
+    if existing is not None:
+        logger.info(f"[INFLIGHT] Repeated request attached to running job: {key[:2]}")
+        if on_duplicate is not None:
+            await on_duplicate()
+        try:
+            await asyncio.shield(existing.task)
+        except Exception:
+            pass
+        return False
+
+    task = asyncio.create_task(job())
+    entry = _Job(task)
+    _jobs[key] = entry
+
+    def _finish(_: asyncio.Task) -> None:
+        entry.finished_at = time.monotonic()
+
+    task.add_done_callback(_finish)
+    await asyncio.shield(task)
+    return True
@@ -0,0 +1,180 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from datetime import timedelta
+from decimal import Decimal
+
+from dotenv import load_dotenv
+from sqlalchemy import select, func
+from sqlalchemy.exc import DataError, IntegrityError
+
+from bot.database.db import async_session
+from bot.database.models import Trade
+from bot.utils.pnl import Fill, record_fills
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = os.getenv("TRADE_JOURNAL_PATH", "data/trade_journal.jsonl")
+# Fills Postgres refuses for good end up here for manual inspection
+DEAD_LETTER_PATH = f"{JOURNAL_PATH}.failed"
+FLUSH_INTERVAL_SEC = 1.0
+# Slack for clock differences between the bot host and Postgres
+REPLAY_MARGIN = timedelta(minutes=10)
+
+# Serializes appends with segment rotation, so no fill lands in a segment
+# that is already being flushed.
+_lock = asyncio.Lock()
+
+
+def _encode(fill: Fill) -> str:
+    data = asdict(fill)
+    data["price_per_token"] = str(fill.price_per_token)
+    return json.dumps(data, separators=(",", ":"))
+
+
+def _decode(line: str) -> Fill:
+    data = json.loads(line)
+    data["price_per_token"] = Decimal(data["price_per_token"])
+    return Fill(**data)
+
+
+def _append(lines: list[str]) -> None:
+    os.makedirs(os.path.dirname(JOURNAL_PATH) or ".", exist_ok=True)
+    with open(JOURNAL_PATH, "a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def journal_fills(fills: list[Fill]) -> None:
+    """
+    Durably append fills to the local journal. Returns once they are on disk;
+    the flusher moves them to Postgres in the background.
+    """
+    if not fills:
+        return
+    lines = [_encode(f) for f in fills]
+    async with _lock:
+        await asyncio.to_thread(_append, lines)
+
+
+def _read_segment(path: str) -> list[Fill]:
+    fills = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                fills.append(_decode(line))
+            except (ValueError, TypeError, KeyError) as e:
+                # A torn last line from a crash mid-write; the rest is intact
+                logger.error(f"[JOURNAL] Skipping unreadable entry in {path}: {e}")
+    return fills
+
+
+def _segment_age_sec(path: str) -> float:
+    # Segments are named <journal>.<rotation time_ns>.flushing
+    rotated_ns = int(path.rsplit(".", 2)[-2])
+    return max(0.0, time.time() - rotated_ns / 1e9)
+
+
+def _dead_letter(fills: list[Fill]) -> None:
+    with open(DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+        f.write("".join(_encode(fill) + "\n" for fill in fills))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def _record_one_by_one(path: str, fills: list[Fill]) -> None:
+    """Record fills separately so one that Postgres rejects doesn't hold back the rest."""
+    rejected = []
+    for fill in fills:
+        try:
+            async with async_session() as session:
+                await record_fills(session, [fill])
+        except (IntegrityError, DataError) as e:
+            logger.error(f"[JOURNAL] Fill {fill.txid} from {path} rejected, moved to {DEAD_LETTER_PATH}: {e}")
+            rejected.append(fill)
+    if rejected:
+        await asyncio.to_thread(_dead_letter, rejected)
+
+
+async def _flush_segment(path: str) -> int:
+    fills = await asyncio.to_thread(_read_segment, path)
+    if fills:
+        async with async_session() as session:
+            # A crash between commit and unlink replays the segment — skip what already landed.
+            # Its rows can't be older than the segment, which limits the lookup to recent partitions.
+            txids = [f.txid for f in fills if f.txid]
+            lookback = timedelta(seconds=_segment_age_sec(path)) + REPLAY_MARGIN
+            recorded = set((await session.scalars(
+                select(Trade.txid).where(
+                    Trade.txid.in_(txids),
+                    Trade.created_at > func.now() - lookback,
+                )
+            )).all()) if txids else set()
+            fresh = [f for f in fills if f.txid not in recorded]
+            try:
+                await record_fills(session, fresh)
+                fresh = []
+            except (IntegrityError, DataError) as e:
+                # Permanent for this batch, not an outage: find the bad fills below
+                logger.warning(f"[JOURNAL] Segment {path} rejected, recording its fills one by one: {e}")
+        if fresh:
+            await _record_one_by_one(path, fresh)
+    os.remove(path)
+    return len(fills)
+
+
+async def flush_journal() -> int:
+    """
+    Move everything journaled so far to Postgres. The live journal is rotated
+    to a `.flushing` segment first, so appends continue while it's written.
+    Leftover segments from a previous run are flushed too, oldest first.
+    """
+    async with _lock:
+        if os.path.exists(JOURNAL_PATH) and os.path.getsize(JOURNAL_PATH) > 0:
+            os.replace(JOURNAL_PATH, f"{JOURNAL_PATH}.{time.time_ns()}.flushing")
+
+    flushed = 0
+    for path in sorted(glob.glob(f"{glob.escape(JOURNAL_PATH)}.*.flushing")):
+        try:
+            flushed += await _flush_segment(path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Stays on disk for the next pass; later segments don't wait for it
+            logger.warning(f"[JOURNAL] Flush of {path} failed, will retry: {e}")
+    return flushed
+
+
+async def replay_journal() -> None:
+    """
+    Flush whatever a previous run left on disk. Call before serving updates.
+    Never raises: whatever can't be written now is left to the flusher.
+    """
+    try:
+        flushed = await flush_journal()
+    except Exception as e:
+        logger.exception(f"[JOURNAL] Replay failed, leaving it to the flusher: {e}")
+        return
+    if flushed:
+        logger.warning(f"[JOURNAL] Replayed {flushed} journaled fills")
+
+
+async def run_journal_flusher(interval: float = FLUSH_INTERVAL_SEC) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_journal()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Segments stay on disk and are retried on the next pass
+            logger.exception(f"[JOURNAL] Flush failed: {e}")
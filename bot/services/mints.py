@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+import aiohttp
+from sqlalchemy import select, union
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from bot.constants import RPC_URL
+from bot.database.db import async_session
+from bot.database.models import Mint, Position, Trade
+
+logger = logging.getLogger(__name__)
+
+# Decimals of a mint never change, so entries are kept for the process lifetime.
+_decimals: dict[str, int] = {}
+
+
+async def fetch_mint_decimals(mint: str) -> int | None:
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getTokenSupply",
+        "params": [mint],
+    }
+    async with aiohttp.ClientSession() as session:
+        async with session.post(RPC_URL, json=payload) as resp:
+            if resp.status != 200:
+                return None
+            data = await resp.json()
+
+    value = (data.get("result") or {}).get("value")
+    return int(value["decimals"]) if value else None
+
+
+async def get_mint_decimals(mint: str) -> int | None:
+    """
+    Decimals of `mint`: from memory, then the mints table, then the RPC
+    (the answer is stored in the table). None if the mint can't be resolved.
+    """
+    decimals = _decimals.get(mint)
+    if decimals is not None:
+        return decimals
+
+    async with async_session() as session:
+        decimals = await session.scalar(select(Mint.decimals).where(Mint.address == mint))
+        if decimals is None:
+            decimals = await fetch_mint_decimals(mint)
+            if decimals is None:
+                return None
+            await session.execute(
+                pg_insert(Mint).values(address=mint, decimals=decimals).on_conflict_do_nothing()
+            )
+            await session.commit()
+
+    _decimals[mint] = decimals
+    return decimals
+
+
+async def backfill_mints() -> list[str]:
+    """Resolve every traded token missing from the mints table; returns the ones that failed."""
+    async with async_session() as session:
+        traded = union(select(Position.token), select(Trade.token)).subquery()
+        missing = (await session.scalars(
+            select(traded.c.token).where(traded.c.token.not_in(select(Mint.address)))
+        )).all()
+
+    failed = []
+    for mint in missing:
+        try:
+            if await get_mint_decimals(mint) is None:
+                failed.append(mint)
+        except Exception as e:
+            logger.warning(f"[MINTS] Failed to resolve {mint}: {e}")
+            failed.append(mint)
+    return failed
+
+
+if __name__ == "__main__":
+    # python -m bot.services.mints — resolve every already traded token up front
+    failed = asyncio.run(backfill_mints())
+    if failed:
+        print("Unresolved mints:\n" + "\n".join(failed))
+    else:
+        print("All traded mints resolved")
@@ -0,0 +1,146 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from bot.database.db import engine
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+MONTHS_AHEAD = 2
+RETENTION_MONTHS = int(os.getenv("TRADE_RETENTION_MONTHS", "12"))
+ARCHIVE_DIR = os.getenv("TRADE_ARCHIVE_DIR", "data/archive")
+MAINTENANCE_INTERVAL_SEC = 24 * 60 * 60
+
+PARTITION_RE = re.compile(r"^trades_(\d{4})_(\d{2})$")
+
+
+def shift_month(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"trades_{month:%Y_%m}"
+
+
+async def create_partition(month: date) -> None:
+    """
+    Create the partition for `month` if missing. Postgres refuses to while
+    trades_default holds rows in its range (after a lapse in maintenance),
+    so those are moved into it: default detached, partition created, rows
+    moved, default re-attached, all in one transaction.
+    """
+    name = partition_name(month)
+    bounds = f"FROM ('{month}') TO ('{shift_month(month, 1)}')"
+    in_range = f"created_at >= '{month}' AND created_at < '{shift_month(month, 1)}'"
+
+    async with engine.begin() as conn:
+        if await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name}) is not None:
+            return
+        has_default = await conn.scalar(text("SELECT to_regclass('trades_default')")) is not None
+        stranded = has_default and await conn.scalar(
+            text(f"SELECT EXISTS (SELECT 1 FROM trades_default WHERE {in_range})")
+        )
+        if not stranded:
+            await conn.execute(text(f"CREATE TABLE {name} PARTITION OF trades FOR VALUES {bounds}"))
+            return
+
+        await conn.execute(text("ALTER TABLE trades DETACH PARTITION trades_default"))
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF trades FOR VALUES {bounds}"))
+        moved = (await conn.execute(text(
+            f"WITH moved AS (DELETE FROM trades_default WHERE {in_range} RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ))).rowcount
+        await conn.execute(text("ALTER TABLE trades ATTACH PARTITION trades_default DEFAULT"))
+    logger.warning(f"[PARTITIONS] Created {name}, moving {moved} rows out of trades_default")
+
+
+async def ensure_partitions(months_ahead: int = MONTHS_AHEAD) -> None:
+    """Create this month's partition and the next `months_ahead` ones if missing."""
+    this_month = date.today().replace(day=1)
+    for i in range(months_ahead + 1):
+        month = shift_month(this_month, i)
+        try:
+            await create_partition(month)
+        except Exception as e:
+            # Later months still get their partitions
+            logger.error(f"[PARTITIONS] Failed to create {partition_name(month)}: {e}")
+
+
+async def expired_partitions(retention_months: int = RETENTION_MONTHS) -> list[tuple[str, bool]]:
+    """
+    Monthly partitions entirely older than the retention window, oldest first,
+    with whether each is still attached. Detached ones are left over from an
+    interrupted archive run and are picked up again.
+    """
+    cutoff = shift_month(date.today().replace(day=1), -retention_months)
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT c.relname, i.inhparent IS NOT NULL AS attached "
+            "FROM pg_class c "
+            "LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'trades'::regclass "
+            "WHERE c.relkind = 'r' AND c.relname LIKE 'trades\\_%'"
+        ))).all()
+
+    expired = []
+    for name, attached in rows:
+        match = PARTITION_RE.match(name)
+        if match and date(int(match[1]), int(match[2]), 1) < cutoff:
+            expired.append((name, attached))
+    return sorted(expired)
+
+
+async def archive_partition(name: str, attached: bool) -> str:
+    """
+    Detach a partition, dump it to ARCHIVE_DIR/<name>.csv.gz with COPY and
+    drop it. The table is dropped only once the archive is completely written.
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f"{name}.csv.gz")
+    tmp_path = path + ".tmp"
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if attached:
+            await conn.execute(text(f"ALTER TABLE trades DETACH PARTITION {name}"))
+
+        driver = (await conn.get_raw_connection()).driver_connection
+        with gzip.open(tmp_path, "wb") as gz:
+            async def sink(chunk: bytes) -> None:
+                gz.write(chunk)
+
+            await driver.copy_from_table(name, output=sink, format="csv", header=True)
+        os.replace(tmp_path, path)
+
+        await conn.execute(text(f"DROP TABLE {name}"))
+    return path
+
+
+async def run_partition_maintenance_once() -> None:
+    await ensure_partitions()
+    for name, attached in await expired_partitions():
+        path = await archive_partition(name, attached)
+        logger.info(f"[PARTITIONS] Archived {name} to {path}")
+
+
+async def run_partition_maintenance(interval: float = MAINTENANCE_INTERVAL_SEC) -> None:
+    while True:
+        try:
+            await run_partition_maintenance_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"[PARTITIONS] Maintenance failed: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    # python -m bot.services.partitions — create upcoming partitions and archive expired ones now
+    asyncio.run(run_partition_maintenance_once())
@@ -0,0 +1,34 @@
+import asyncio
+import logging
+
+from bot.database.db import async_session
+from bot.utils.pnl import reconcile_referral_counters
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL_SEC = 24 * 60 * 60
+
+
+async def reconcile_once() -> int:
+    async with async_session() as session:
+        fixed = await reconcile_referral_counters(session)
+    if fixed:
+        logger.warning(f"[REFERRALS] Reconciled counters of {fixed} users")
+    return fixed
+
+
+async def run_referral_reconciler(interval: float = RECONCILE_INTERVAL_SEC) -> None:
+    """Safety net for the incremental counters: rebuild them periodically."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"[REFERRALS] Reconciliation failed: {e}")
+
+
+if __name__ == "__main__":
+    # python -m bot.services.referrals — rebuild all referral counters now
+    print(f"Fixed {asyncio.run(reconcile_once())} users")
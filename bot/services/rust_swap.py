@@ -3,6 +3,7 @@ import base58
 import httpx
 from solders.keypair import Keypair
 from bot.services.encryption import decrypt_seed
+from bot.utils.metrics import observe, timed
 
 RUST_API_URL = "http://localhost:3030/swap"
 
@@ -34,14 +35,19 @@ async def call_rust_swapper(
         if total_fee_lamports is not None:
             payload["total_fee_lamports"] = total_fee_lamports
 
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(RUST_API_URL, json=payload)
+        with timed("bridge.roundtrip"):
+            async with httpx.AsyncClient(timeout=30) as client:
+                response = await client.post(RUST_API_URL, json=payload)
 
         if response.status_code != 200:
             raise Exception(f"Rust API returned status {response.status_code}")
 
         result = response.json()
 
+        # Bridge-side breakdown: prepare / quote / build / send
+        for stage, ms in (result.get("timings_ms") or {}).items():
+            observe(f"bridge.{stage}", ms)
+
         if not result.get("success"):
             raise Exception(result.get("error", "Unknown Rust error"))
 
@@ -62,39 +68,39 @@ async def call_rust_swapper(
         }
 
 
-async def swap_all_sol_to_usdc(keypair: Keypair, lamports: int) -> dict:
+async def swap_all_sol_to_usdc(keypair: Keypair, lamports: int) -> str:
     result = await call_rust_swapper("sol_to_usdc", keypair, amount=lamports)
     if result["success"]:
-        return result
+        return result["txid"]
     raise Exception(result["error"])
 
 
-async def swap_all_usdc_to_sol(keypair: Keypair) -> dict:
+async def swap_all_usdc_to_sol(keypair: Keypair) -> str:
     result = await call_rust_swapper("usdc_to_sol", keypair)
     if result["success"]:
-        return result
+        return result["txid"]
     raise Exception(result["error"])
 
 
-async def swap_fixed_sol_to_usdc(keypair: Keypair, lamports: int) -> dict:
+async def swap_fixed_sol_to_usdc(keypair: Keypair, lamports: int) -> str:
     result = await call_rust_swapper(
         "swap_sol_to_usdc_fixed",
         keypair,
         amount=lamports,
     )
     if result["success"]:
-        return result
+        return result["txid"]
     raise Exception(result["error"])
 
 
-async def swap_fixed_usdc_to_sol(keypair: Keypair, usdc_amount: int) -> dict:
+async def swap_fixed_usdc_to_sol(keypair: Keypair, usdc_amount: int) -> str:
     result = await call_rust_swapper(
         "swap_usdc_to_sol_fixed",
         keypair,
         amount=usdc_amount,
     )
     if result["success"]:
-        return result
+        return result["txid"]
     raise Exception(result["error"])
 
 
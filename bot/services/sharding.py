@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
+from dotenv import load_dotenv
+
+from bot.services.journal import JOURNAL_PATH
+from bot.services.webhook import (
+    WebhookHandler,
+    healthcheck,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+)
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "4"))
+# Set by the launcher for each worker process
+BOT_SHARD = int(os.getenv("BOT_SHARD", "0"))
+WORKER_SECRET = os.getenv("WORKER_SECRET", "")
+# Worker N listens on 127.0.0.1:WORKER_BASE_PORT + N
+WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", "8100"))
+# How the launcher itself receives updates: polling | webhook
+FRONT_MODE = os.getenv("FRONT_MODE", "polling")
+
+TELEGRAM_API = "https://api.telegram.org"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+WORKER_PATH = "/internal/updates"
+POLL_TIMEOUT_SEC = 30
+MAX_BATCH = 100
+SUPERVISE_INTERVAL_SEC = 1
+SHUTDOWN_GRACE_SEC = 20
+
+
+def update_user_id(update: dict) -> int:
+    """Telegram user an update comes from (the chat for channel posts), read from the raw JSON."""
+    for kind, event in update.items():
+        if kind == "update_id" or not isinstance(event, dict):
+            continue
+        source = event.get("from") or event.get("user") or event.get("chat") or {}
+        return int(source.get("id", 0))
+    return 0
+
+
+def shard_for(user_id: int, workers: int) -> int:
+    return user_id % workers
+
+
+def shard_journal_path(shard: int) -> str:
+    # Shard 0 keeps the unsharded path, so it replays what a single-process run left behind
+    if shard == 0:
+        return JOURNAL_PATH
+    root, ext = os.path.splitext(JOURNAL_PATH)
+    return f"{root}.{shard}{ext}"
+
+
+# ---------- Worker side ----------
+
+class ShardHandler(WebhookHandler):
+    """Webhook handler that also accepts ordered batches of raw updates from the launcher."""
+
+    async def handle_batch(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get(SECRET_HEADER, ""), self.bot):
+            return web.Response(body="Unauthorized", status=401)
+        # Tasks start in list order, so the lanes middleware sees each user's updates in order
+        for update in await request.json(loads=self.bot.session.json_loads):
+            task = asyncio.create_task(self._background_feed_update(bot=self.bot, update=update))
+            self._background_feed_update_tasks.add(task)
+            task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({})
+
+
+def build_worker_app(dp: Dispatcher, bot: Bot, secret: str = WORKER_SECRET) -> web.Application:
+    if not secret:
+        raise RuntimeError("WORKER_SECRET is missing; workers are started by the sharded launcher")
+
+    app = web.Application()
+    handler = ShardHandler(dp, bot, secret)
+    handler.register(app, path=WEBHOOK_PATH)
+    app.router.add_post(WORKER_PATH, handler.handle_batch)
+    app.router.add_get("/healthz", healthcheck)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_worker(dp: Dispatcher, bot: Bot, shard: int = BOT_SHARD) -> None:
+    runner = web.AppRunner(build_worker_app(dp, bot))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", WORKER_BASE_PORT + shard).start()
+    logger.info(f"[SHARD] Worker {shard} listening on 127.0.0.1:{WORKER_BASE_PORT + shard}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+# ---------- Launcher side ----------
+
+class Shard:
+    """Launcher's handle on one worker: its process and an ordered queue of updates for it."""
+
+    def __init__(self, index: int, secret: str, base_port: int = WORKER_BASE_PORT):
+        self.index = index
+        self.secret = secret
+        self.url = f"http://127.0.0.1:{base_port + index}{WORKER_PATH}"
+        self.queue: asyncio.Queue[dict] = asyncio.Queue()
+        self.proc: subprocess.Popen | None = None
+        self.forwarded = 0
+
+    def spawn(self, workers: int) -> None:
+        env = {
+            **os.environ,
+            "BOT_MODE": "worker",
+            "BOT_SHARD": str(self.index),
+            "BOT_WORKERS": str(workers),
+            "WORKER_SECRET": self.secret,
+            "TRADE_JOURNAL_PATH": shard_journal_path(self.index),
+        }
+        # Own session: Ctrl+C reaches the launcher only, which then stops workers in order
+        self.proc = subprocess.Popen([sys.executable, sys.argv[0]], env=env, start_new_session=True)
+        logger.info(f"[SHARD] Started worker {self.index} (pid {self.proc.pid})")
+
+    async def stop(self) -> None:
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        # SIGINT lets the worker run its shutdown: drain updates, flush journal and FSM
+        self.proc.send_signal(signal.SIGINT if os.name != "nt" else signal.SIGTERM)
+        try:
+            await asyncio.to_thread(self.proc.wait, SHUTDOWN_GRACE_SEC)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"[SHARD] Worker {self.index} didn't stop in {SHUTDOWN_GRACE_SEC}s, killing")
+            self.proc.kill()
+
+    async def run_sender(self, http: aiohttp.ClientSession) -> None:
+        """
+        Forward queued updates in order, one batch in flight at a time. A batch
+        is retried until the worker accepts it, so updates survive a worker
+        restart.
+        """
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            delay = 0.1
+            while True:
+                try:
+                    async with http.post(self.url, json=batch, headers={SECRET_HEADER: self.secret}) as resp:
+                        if resp.status == 200:
+                            break
+                        logger.warning(f"[SHARD] Worker {self.index} answered {resp.status}, retrying")
+                except aiohttp.ClientError as e:
+                    if delay >= 1:
+                        logger.warning(f"[SHARD] Worker {self.index} unreachable, retrying: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5)
+
+            self.forwarded += len(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+
+def route(shards: list[Shard], updates: list[dict]) -> None:
+    for update in updates:
+        shards[shard_for(update_user_id(update), len(shards))].queue.put_nowait(update)
+
+
+async def _supervise(shards: list[Shard]) -> None:
+    while True:
+        await asyncio.sleep(SUPERVISE_INTERVAL_SEC)
+        for shard in shards:
+            code = shard.proc.poll()
+            if code is not None:
+                logger.error(f"[SHARD] Worker {shard.index} exited with {code}, restarting")
+                shard.spawn(len(shards))
+
+
+async def _poll(token: str, shards: list[Shard], http: aiohttp.ClientSession) -> None:
+    url = f"{TELEGRAM_API}/bot{token}/getUpdates"
+    timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT_SEC + 10)
+    offset = None
+    while True:
+        params = {"timeout": POLL_TIMEOUT_SEC}
+        if offset is not None:
+            params["offset"] = offset
+        try:
+            async with http.get(url, params=params, timeout=timeout) as resp:
+                data = await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"[SHARD] getUpdates failed: {e}")
+            await asyncio.sleep(1)
+            continue
+        if not data.get("ok"):
+            logger.warning(f"[SHARD] getUpdates error: {data.get('description')}")
+            await asyncio.sleep(1)
+            continue
+
+        updates = data["result"]
+        if updates:
+            route(shards, updates)
+            offset = updates[-1]["update_id"] + 1
+            # Only confirm the offset to Telegram once the workers have the updates
+            await asyncio.gather(*(shard.queue.join() for shard in shards))
+
+
+async def _serve_webhook(token: str, shards: list[Shard], http: aiohttp.ClientSession) -> None:
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET must be set to run in webhook mode")
+
+    async def receive(request: web.Request) -> web.Response:
+        if not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), WEBHOOK_SECRET):
+            return web.Response(body="Unauthorized", status=401)
+        route(shards, [await request.json()])
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    app.router.add_get("/healthz", healthcheck)
+
+    if WEBHOOK_URL:
+        payload = {
+            "url": WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            "secret_token": WEBHOOK_SECRET,
+            "max_connections": WEBHOOK_MAX_CONNECTIONS,
+        }
+        async with http.post(f"{TELEGRAM_API}/bot{token}/setWebhook", json=payload) as resp:
+            data = await resp.json()
+        if not data.get("ok"):
+            raise RuntimeError(f"setWebhook failed: {data.get('description')}")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info(f"[SHARD] Receiving updates on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_sharded(token: str, workers: int = BOT_WORKERS) -> None:
+    """
+    Run `workers` bot processes and feed each Telegram update to the one owning
+    its user (user id modulo workers). A user's updates always land on the
+    same worker, in order, so per-user caches, FSM write coalescing and the
+    per-user lanes keep working unchanged inside each worker.
+    """
+    secret = secrets.token_urlsafe(32)
+    shards = [Shard(i, secret) for i in range(workers)]
+    for shard in shards:
+        shard.spawn(workers)
+
+    # Workers run in their own sessions, so a stop (SIGTERM from docker/systemd)
+    # reaches only the launcher: turn it into a clean shutdown that stops them
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    if os.name != "nt":
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+
+    async with aiohttp.ClientSession() as http:
+        senders = [asyncio.create_task(shard.run_sender(http)) for shard in shards]
+        supervisor = asyncio.create_task(_supervise(shards))
+        front = asyncio.create_task(
+            _serve_webhook(token, shards, http) if FRONT_MODE == "webhook" else _poll(token, shards, http)
+        )
+        stop = asyncio.create_task(stopping.wait())
+        try:
+            await asyncio.wait({front, stop}, return_when=asyncio.FIRST_COMPLETED)
+            if front.done():
+                front.result()
+            logger.info("[SHARD] SIGTERM received, stopping workers")
+        finally:
+            if os.name != "nt":
+                loop.remove_signal_handler(signal.SIGTERM)
+            front.cancel()
+            stop.cancel()
+            await asyncio.gather(front, stop, return_exceptions=True)
+            supervisor.cancel()
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(shard.queue.join() for shard in shards)), timeout=5
+                )
+            except asyncio.TimeoutError:
+                logger.warning("[SHARD] Stopping with updates still queued for workers")
+            for task in senders:
+                task.cancel()
+            await asyncio.gather(*(shard.stop() for shard in shards))
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Public base URL Telegram should call, e.g. https://bot.example.com. Leave
+# empty on replicas that shouldn't (re-)register the webhook themselves.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# 1-256 chars of A-Z, a-z, 0-9, _ and -; Telegram echoes it in every request
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Concurrent HTTPS connections Telegram opens to the load balancer (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+SHUTDOWN_GRACE_SEC = 10
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """
+    Answers Telegram with 200 as soon as the secret checks out and feeds the
+    update to the dispatcher in a background task, so a slow handler never
+    holds up delivery. On shutdown, waits for updates still being handled.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, **data):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+
+    async def close(self) -> None:
+        pending = set(self._background_feed_update_tasks)
+        if pending:
+            logger.info(f"[WEBHOOK] Waiting for {len(pending)} updates in progress")
+            await asyncio.wait(pending, timeout=SHUTDOWN_GRACE_SEC)
+        await super().close()
+
+
+async def healthcheck(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, secret: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH) -> web.Application:
+    if not secret:
+        raise RuntimeError("WEBHOOK_SECRET must be set to run in webhook mode")
+
+    app = web.Application()
+    WebhookHandler(dp, bot, secret).register(app, path=path)
+    # For load balancer health checks
+    app.router.add_get("/healthz", healthcheck)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """
+    Serve updates over HTTP until cancelled, the webhook counterpart of
+    dp.start_polling. Behind a load balancer, two updates of one user may be
+    handled by different replicas at the same time; use the sharded launcher
+    (FRONT_MODE=webhook) where a user's updates must run strictly in order.
+    """
+    app = build_webhook_app(dp, bot)
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"[WEBHOOK] Registered {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info(f"[WEBHOOK] Listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Runs the app's shutdown hooks: drain in-flight updates, dispatcher shutdown, FSM flush
+        await runner.cleanup()
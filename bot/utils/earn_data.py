@@ -1,7 +1,23 @@
-from sqlalchemy import select
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import select, func, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from bot.database.models import User
+from sqlalchemy.orm import selectinload, aliased
+from bot.database.models import User, Wallet
+
+LEADERBOARD_SIZE = 10
+LEADERBOARD_TTL_SEC = 60
+
+load_dotenv()
+# invalidate_leaderboard only reaches its own process, so webhook replicas,
+# which share users, read the leaderboard from the database every time
+CACHE_LEADERBOARD = os.getenv("BOT_MODE") != "webhook"
+
+_leaderboard: list[tuple[str, int, int]] | None = None
+_leaderboard_at = 0.0
+_leaderboard_lock = asyncio.Lock()
 
 
 async def get_user_by_telegram_id(session: AsyncSession, telegram_id: int) -> User | None:
@@ -20,34 +36,70 @@ async def get_user_by_telegram_id(session: AsyncSession, telegram_id: int) -> Us
 async def get_top_users(session: AsyncSession, limit: int = 10) -> list[tuple[str, int, int]]:
     """
     Fetch top users sorted by points (desc), then by registration time (asc).
+    Only the first wallet address of each user is loaded.
     """
+    first_wallet = (
+        select(Wallet.address)
+        .where(Wallet.user_id == User.id)
+        .order_by(Wallet.id)
+        .limit(1)
+        .scalar_subquery()
+    )
     result = await session.execute(
-        select(User)
-        .options(selectinload(User.wallets))
+        select(first_wallet, User.pnl, User.points)
         .order_by(User.points.desc(), User.id.asc())
         .limit(limit)
     )
-    users = result.scalars().all()
+    return [(address or "N/A", pnl or 0, points or 0) for address, pnl, points in result.all()]
 
-    data = []
-    for user in users:
-        address = user.wallets[0].address if user.wallets else "N/A"
-        data.append((address, user.pnl or 0, user.points or 0))
 
-    return data
+async def get_leaderboard(session: AsyncSession) -> list[tuple[str, int, int]]:
+    """
+    Top users served from an in-memory snapshot, refreshed every
+    LEADERBOARD_TTL_SEC or after a point change that could affect it.
+    """
+    global _leaderboard, _leaderboard_at
 
+    if not CACHE_LEADERBOARD:
+        return await get_top_users(session, LEADERBOARD_SIZE)
 
-async def get_user_rank(session: AsyncSession, user_id: int) -> int:
+    if _leaderboard is not None and time.monotonic() - _leaderboard_at < LEADERBOARD_TTL_SEC:
+        return _leaderboard
+
+    async with _leaderboard_lock:
+        if _leaderboard is None or time.monotonic() - _leaderboard_at >= LEADERBOARD_TTL_SEC:
+            _leaderboard = await get_top_users(session, LEADERBOARD_SIZE)
+            _leaderboard_at = time.monotonic()
+    return _leaderboard
+
+
+def invalidate_leaderboard(points: int | None = None) -> None:
     """
-    Get the rank of the user by points and registration order.
+    Drop the snapshot so the next read rebuilds it. With `points` given, only
+    invalidate if a user with that many points could enter the leaderboard.
     """
-    result = await session.execute(
-        select(User).order_by(User.points.desc(), User.id.asc())
-    )
-    users = result.scalars().all()
+    global _leaderboard
+    if _leaderboard is None:
+        return
+    if points is not None and len(_leaderboard) >= LEADERBOARD_SIZE and points < _leaderboard[-1][2]:
+        return
+    _leaderboard = None
 
-    for i, user in enumerate(users, start=1):
-        if user.id == user_id:
-            return i
 
-    return -1
+async def get_user_rank(session: AsyncSession, user_id: int) -> int:
+    """
+    Get the rank of the user by points and registration order:
+    1 + the number of users ahead of them, counted in SQL.
+    """
+    me = aliased(User)
+    rank = await session.scalar(
+        select(func.count(User.id) + 1)
+        .select_from(me)
+        .outerjoin(User, or_(
+            User.points > me.points,
+            and_(User.points == me.points, User.id < me.id),
+        ))
+        .where(me.id == user_id)
+        .group_by(me.id)
+    )
+    return rank if rank is not None else -1
@@ -0,0 +1,63 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+WINDOW_SEC = 15 * 60
+MAX_SAMPLES_PER_STAGE = 5_000
+
+# stage → deque[(monotonic timestamp, duration in ms)]
+_samples: dict[str, deque] = {}
+
+
+def observe(stage: str, duration_ms: float) -> None:
+    samples = _samples.get(stage)
+    if samples is None:
+        samples = _samples[stage] = deque(maxlen=MAX_SAMPLES_PER_STAGE)
+    samples.append((time.monotonic(), duration_ms))
+
+
+@contextmanager
+def timed(stage: str):
+    """Record how long the wrapped block took under `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, (time.perf_counter() - started) * 1000)
+
+
+def timed_coro(stage: str):
+    """Decorator version of `timed` for coroutine functions."""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with timed(stage):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    idx = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def stage_percentiles(window_sec: float = WINDOW_SEC) -> dict[str, dict[str, float]]:
+    """
+    p50/p95/p99 (ms) and sample count per stage over the last `window_sec`.
+    Stages without samples in the window are omitted.
+    """
+    cutoff = time.monotonic() - window_sec
+    result = {}
+    for stage, samples in list(_samples.items()):
+        values = sorted(ms for ts, ms in list(samples) if ts >= cutoff)
+        if not values:
+            continue
+        result[stage] = {
+            "count": len(values),
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+        }
+    return result
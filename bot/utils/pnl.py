@@ -1,313 +1,410 @@
-from decimal import Decimal, ROUND_DOWN
-from sqlalchemy import select, delete, update, func
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import select, update, insert, func, exists, literal, values, column, and_, or_, cast
+from sqlalchemy import Integer, BigInteger, Numeric, Text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from bot.database.models import Position, Trade, TradeType, User
-from bot.utils.token_info import fetch_token_info
+from sqlalchemy.orm import aliased
+from bot.constants import MICRO_USDC_PER_USDC
+from bot.database.models import Position, Trade, TradeStatus, TradeType, User
 from bot.database.models import ReferralReward
+from bot.utils.metrics import timed_coro
+from bot.utils.earn_data import invalidate_leaderboard
 
-MINIMUM_REMAINING_THRESHOLD = Decimal("0.0001")
 
-
-async def award_points_for_active_referral(session: AsyncSession, user: User) -> None:
+async def award_points_for_active_referral(session: AsyncSession, user_id: int, referred_by: str) -> int | None:
     """
-    Awards 10 points to the referrer when a user becomes active (PnL >= 10)
-    and no reward has been granted yet.
+    Awards 10 points to the referrer when a user becomes active (PnL >= 100)
+    and no reward has been granted yet. Runs as a single statement: the reward
+    row is inserted only if none exists, and the referrer is credited from it
+    (points and the active-referral counter), so each referee counts once.
+    Returns the referrer's new points if a reward was granted.
     """
-    if not user.referred_by:
-        return
+    reward = (
+        insert(ReferralReward)
+        .from_select(
+            ["referrer_id", "referee_id"],
+            select(User.id, literal(user_id)).where(
+                User.referral_code == referred_by,
+                ~exists().where(ReferralReward.referee_id == user_id),
+            ),
+        )
+        .returning(ReferralReward.referrer_id)
+        .cte("reward")
+    )
+    return await session.scalar(
+        update(User)
+        .where(User.id == reward.c.referrer_id)
+        .values(
+            points=func.coalesce(User.points, 0) + 10,
+            referrals_active=func.coalesce(User.referrals_active, 0) + 1,
+        )
+        .returning(User.points)
+    )
 
-    if (user.pnl or Decimal(0)) < Decimal("100"):
-        return
 
-    # Check if reward already granted
-    existing = await session.execute(
-        select(ReferralReward).where(ReferralReward.referee_id == user.id)
+@dataclass
+class Fill:
+    """One executed swap, ready to be persisted. Amounts are exact integers."""
+    user_id: int
+    wallet_address: str
+    token: str
+    delta_usdc: int        # micro-USDC spent on a buy, received on a sell
+    delta_tokens: int      # token atomic units, positive for buys, negative for sells
+    price_per_token: Decimal  # USD per whole token, informational
+    txid: str
+
+    @property
+    def key(self) -> tuple[int, str, str]:
+        return self.user_id, self.wallet_address, self.token
+
+
+def split_into_rounds(fills: list[Fill]) -> list[list[Fill]]:
+    """
+    Group fills so that no position appears twice in a round — a single
+    ON CONFLICT / UPDATE ... FROM statement can touch each row only once.
+    Fills for the same position keep their original order across rounds.
+    """
+    rounds: list[list[Fill]] = []
+    seen: list[set] = []
+    for fill in fills:
+        for i, keys in enumerate(seen):
+            if fill.key not in keys and all(fill.key not in k for k in seen[i + 1:]):
+                rounds[i].append(fill)
+                keys.add(fill.key)
+                break
+        else:
+            rounds.append([fill])
+            seen.append({fill.key})
+    return rounds
+
+
+async def apply_buys(session: AsyncSession, buys: list[Fill]) -> None:
+    """Upsert all bought positions with one INSERT ... ON CONFLICT DO UPDATE."""
+    stmt = pg_insert(Position).values([
+        {
+            "user_id": f.user_id,
+            "wallet_address": f.wallet_address,
+            "token": f.token,
+            "token_amount": f.delta_tokens,
+            "entry_amount_usdc": f.delta_usdc,
+        }
+        for f in buys
+    ])
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Position.user_id, Position.wallet_address, Position.token],
+            set_={
+                "token_amount": Position.token_amount + stmt.excluded.token_amount,
+                "entry_amount_usdc": Position.entry_amount_usdc + stmt.excluded.entry_amount_usdc,
+            },
+        ).returning(Position.token_amount, Position.entry_amount_usdc)
     )
-    if existing.scalar_one_or_none():
-        return
 
-    # Find referrer by their referral code
-    referrer_result = await session.execute(
-        select(User).where(User.referral_code == user.referred_by)
+
+async def apply_sells(session: AsyncSession, sells: list[Fill]) -> dict[tuple, int]:
+    """
+    Reduce all sold positions with one UPDATE ... FROM over the locked rows,
+    returning the cost basis before and after so realized PnL (micro-USDC)
+    needs no SELECT. The remaining cost basis is scaled down with integer
+    division, so selling the whole position leaves exactly zero.
+    A sale larger than the position is capped at the held amount; selling
+    without a position realizes nothing.
+    """
+    sold_v = values(
+        column("user_id", Integer),
+        column("wallet_address", Text),
+        column("token", Text),
+        column("sell_amount", BigInteger),
+        name="sold",
+    ).data([(f.user_id, f.wallet_address, f.token, abs(f.delta_tokens)) for f in sells])
+
+    old = (
+        select(
+            Position.id,
+            Position.user_id,
+            Position.wallet_address,
+            Position.token,
+            Position.token_amount,
+            Position.entry_amount_usdc,
+            sold_v.c.sell_amount,
+        )
+        .join(sold_v, and_(
+            Position.user_id == sold_v.c.user_id,
+            Position.wallet_address == sold_v.c.wallet_address,
+            Position.token == sold_v.c.token,
+        ))
+        .with_for_update(of=Position)
+        .subquery("old")
+    )
+    remaining = old.c.token_amount - func.least(old.c.sell_amount, old.c.token_amount)
+    # entry * remaining can exceed BIGINT for large supplies — multiply in NUMERIC
+    remaining_entry = cast(
+        func.div(cast(old.c.entry_amount_usdc, Numeric) * remaining, old.c.token_amount),
+        BigInteger,
     )
-    referrer = referrer_result.scalar_one_or_none()
-    if not referrer:
-        return
 
-    # Grant 10 points
-    referrer.points = (referrer.points or 0) + 10
-    reward = ReferralReward(referrer_id=referrer.id, referee_id=user.id)
-    session.add(reward)
+    rows = (await session.execute(
+        update(Position)
+        .where(Position.id == old.c.id, old.c.token_amount > 0)
+        .values(
+            token_amount=remaining,
+            entry_amount_usdc=remaining_entry,
+        )
+        .returning(
+            old.c.user_id,
+            old.c.wallet_address,
+            old.c.token,
+            old.c.entry_amount_usdc.label("entry_before"),
+            Position.entry_amount_usdc,
+        )
+    )).all()
 
+    entry_sold = {
+        (r.user_id, r.wallet_address, r.token): r.entry_before - r.entry_amount_usdc
+        for r in rows
+    }
+    return {
+        f.key: abs(f.delta_usdc) - entry_sold[f.key] if f.key in entry_sold else 0
+        for f in sells
+    }
 
-async def calculate_realized_pnl(
-    session: AsyncSession,
-    user_id: int,
-    wallet_address: str,
-    token: str,
-    sell_amount_tokens: Decimal,
-    sell_amount_usdc: Decimal
-) -> Decimal:
+
+async def update_realized_pnl(session: AsyncSession, user_id: int, delta: int) -> list[int]:
     """
-    Calculate realized PnL for a partial or full token sale based on position.
-    If there's no position — return 0.
-    If sale results in profit — return positive Decimal. Losses and zero are ignored later.
+    Increment user's realized PnL (whole dollars) by `delta` micro-USDC only if it's positive.
+    Also awards points: +1 for every $10 of total PnL.
+    Triggers referral bonus if user becomes active (>= $100 realized PnL).
+    Returns the new point totals of every user touched.
     """
-
-    result = await session.execute(
-        select(Position).where(
-            Position.user_id == user_id,
-            Position.wallet_address == wallet_address,
-            Position.token == token
+    if delta <= 0:
+        return []
+
+    new_pnl = func.coalesce(User.pnl, 0) + literal(Decimal(delta) / MICRO_USDC_PER_USDC, Numeric)
+    row = (await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            pnl=new_pnl,
+            points=func.greatest(func.coalesce(User.points, 0), func.floor(new_pnl / 10)),
         )
-    )
-    position = result.scalar_one_or_none()
+        .returning(User.pnl, User.points, User.referred_by)
+    )).one_or_none()
+    if row is None:
+        return []
 
-    if not position or position.token_amount <= 0:
-        return Decimal("0")
+    points = [row.points]
+    if row.referred_by and (row.pnl or 0) >= 100:
+        referrer_points = await award_points_for_active_referral(session, user_id, row.referred_by)
+        if referrer_points is not None:
+            points.append(referrer_points)
+    return points
 
-    entry_total = position.entry_amount_usdc
-    held_tokens = position.token_amount
 
-    if sell_amount_tokens > held_tokens:
-        sell_amount_tokens = held_tokens
+async def apply_fills(session: AsyncSession, fills: list[Fill]) -> tuple[list[int], list[int]]:
+    """
+    Credit fills to positions with bulk upserts and updates, then update each
+    user's PnL once. Realized PnL is the same as applying the fills one by
+    one. Doesn't commit. Returns each fill's realized PnL (micro-USDC, 0 for
+    buys) in input order, and the changed point totals.
+    """
+    pnl_of: dict[int, int] = {}
+    realized: dict[int, int] = {}
 
-    entry_proportional = entry_total * (sell_amount_tokens / held_tokens)
+    for round_ in split_into_rounds(fills):
+        buys = [f for f in round_ if f.delta_tokens > 0]
+        sells = [f for f in round_ if f.delta_tokens < 0]
 
-    realized = sell_amount_usdc - entry_proportional
+        if buys:
+            await apply_buys(session, buys)
+        sell_pnl = await apply_sells(session, sells) if sells else {}
 
+        for f in round_:
+            pnl = sell_pnl.get(f.key, 0) if f.delta_tokens < 0 else 0
+            pnl_of[id(f)] = pnl
+            # Only profitable trades count towards the user's PnL
+            if pnl > 0:
+                realized[f.user_id] = realized.get(f.user_id, 0) + pnl
 
-    return realized
+    changed_points = []
+    for user_id, delta in realized.items():
+        changed_points += await update_realized_pnl(session, user_id, delta)
 
+    return [pnl_of[id(f)] for f in fills], changed_points
 
-async def update_realized_pnl(session: AsyncSession, user_id: int, delta: Decimal) -> None:
+
+@timed_coro("db.record_trades")
+async def record_fills(session: AsyncSession, fills: list[Fill]) -> None:
     """
-    Increment user's realized PnL by `delta` only if it's positive.
-    Also awards points: +1 for every $10 of total PnL.
-    Triggers referral bonus if user becomes active (>= $10 realized PnL).
+    Persist a batch of fills as PENDING trades with one bulk insert and a
+    single commit. Positions, PnL and points are only credited once the
+    confirmation tracker sees the transaction land (`confirm_trades`).
     """
-    if delta <= 0:
+    fills = [f for f in fills if f.delta_tokens != 0]
+    if not fills:
         return
 
-    result = await session.execute(
-        select(User).where(User.id == user_id)
-    )
-    user = result.scalar_one_or_none()
-
-    if user:
-        # Update total PnL
-        user.pnl = (user.pnl or Decimal(0)) + delta
-
-        # Recalculate total points
-        total_points = int(user.pnl // Decimal("10"))
-        current_points = user.points or 0
+    await session.execute(insert(Trade), [
+        {
+            "user_id": f.user_id,
+            "token": f.token,
+            "wallet_address": f.wallet_address,
+            "token_amount": abs(f.delta_tokens),
+            "amount_usdc": abs(f.delta_usdc),
+            "type": TradeType.BUY if f.delta_tokens > 0 else TradeType.SELL,
+            "price_per_token": f.price_per_token,
+            "txid": f.txid,
+            "realized_pnl": 0,
+        }
+        for f in fills
+    ])
+    await session.commit()
 
-        if total_points > current_points:
-            earned = total_points - current_points
-            user.points = total_points
 
-        # Award referral bonus if applicable
-        await award_points_for_active_referral(session, user)
+@timed_coro("db.confirm_trades")
+async def confirm_trades(session: AsyncSession, trade_ids: list[int], since: datetime) -> int:
+    """
+    Mark pending trades CONFIRMED and credit them in the same transaction:
+    positions, realized PnL of the sells, users' PnL and points. Trades no
+    longer pending (resolved by another process) are skipped, so each is
+    credited once. `since` bounds created_at for partition pruning.
+    Returns how many trades were credited.
+    """
+    rows = (await session.execute(
+        update(Trade)
+        .where(
+            Trade.id.in_(trade_ids),
+            Trade.created_at >= since,
+            Trade.status == TradeStatus.PENDING,
+        )
+        .values(status=TradeStatus.CONFIRMED)
+        .returning(
+            Trade.id, Trade.created_at, Trade.user_id, Trade.wallet_address, Trade.token,
+            Trade.type, Trade.token_amount, Trade.amount_usdc, Trade.price_per_token, Trade.txid,
+        )
+    )).all()
+    if not rows:
+        await session.commit()
+        return 0
+
+    # Apply in the order the trades were made
+    rows.sort(key=lambda r: r.id)
+    fills = [
+        Fill(
+            user_id=r.user_id,
+            wallet_address=r.wallet_address,
+            token=r.token,
+            delta_usdc=r.amount_usdc,
+            delta_tokens=r.token_amount if r.type == TradeType.BUY else -r.token_amount,
+            price_per_token=r.price_per_token,
+            txid=r.txid,
+        )
+        for r in rows
+    ]
+    pnls, changed_points = await apply_fills(session, fills)
+
+    sells = [
+        {"id": r.id, "created_at": r.created_at, "realized_pnl": pnl}
+        for r, pnl in zip(rows, pnls)
+        if r.type == TradeType.SELL and pnl
+    ]
+    if sells:
+        # ORM bulk UPDATE by primary key
+        await session.execute(update(Trade), sells)
 
     await session.commit()
 
+    for points in changed_points:
+        invalidate_leaderboard(points)
+    return len(rows)
+
 
 async def record_swap_and_update(
     session,
     user_id: int,
     wallet_address: str,
     token: str,
-    delta_usdc: float,
-    delta_tokens: float,
-    price_per_token: float,
+    delta_usdc: int,
+    delta_tokens: int,
+    price_per_token: Decimal,
     txid: str,
 ) -> None:
-
-    if abs(delta_tokens) < 0.000001:
-        return
-
-    if delta_tokens < 0:
-        realized = await calculate_realized_pnl(
-            session=session,
-            user_id=user_id,
-            wallet_address=wallet_address,
-            token=token,
-            sell_amount_tokens=Decimal(str(abs(delta_tokens))),
-            sell_amount_usdc=Decimal(str(abs(delta_usdc))),
-        )
-    else:
-        realized = Decimal("0")
-
-    trade = Trade(
-        user_id=user_id,
-        token=token,
-        wallet_address=wallet_address,
-        token_amount=Decimal(str(abs(delta_tokens))),
-        amount_usdc=Decimal(str(abs(delta_usdc))),
-        type=TradeType.BUY if delta_tokens > 0 else TradeType.SELL,
-        price_per_token=Decimal(str(price_per_token)),
-        txid=txid,
-        realized_pnl=realized,
-    )
-    session.add(trade)
-
-    await update_or_create_position(
-        session=session,
+    await record_fills(session, [Fill(
         user_id=user_id,
         wallet_address=wallet_address,
         token=token,
-        delta_tokens=Decimal(str(delta_tokens)),
-        delta_usdc=Decimal(str(delta_usdc)),
-    )
-
-    await update_realized_pnl(session, user_id, realized)
-    await session.commit()
+        delta_usdc=delta_usdc,
+        delta_tokens=delta_tokens,
+        price_per_token=price_per_token,
+        txid=txid,
+    )])
 
 
-async def update_or_create_position(
+async def get_positions_pnl(
     session: AsyncSession,
     user_id: int,
-    wallet_address: str,
+    wallet_addresses: list[str],
     token: str,
-    delta_tokens: Decimal,
-    delta_usdc: Decimal,
-):
-    result = await session.execute(
-        select(Position).where(
-            Position.user_id == user_id,
-            Position.wallet_address == wallet_address,
-            Position.token == token
-        )
-    )
-    position = result.scalar_one_or_none()
-
-    if delta_tokens > 0:
-        if position:
-            new_token_amount = position.token_amount + delta_tokens
-            new_entry_amount_usdc = position.entry_amount_usdc + delta_usdc
-            await session.execute(update(Position)
-                .where(Position.id == position.id)
-                .values(token_amount=new_token_amount, entry_amount_usdc=new_entry_amount_usdc)
-            )
-        else:
-            session.add(Position(
-                user_id=user_id,
-                wallet_address=wallet_address,
-                token=token,
-                token_amount=delta_tokens,
-                entry_amount_usdc=delta_usdc
-            ))
-
-    elif delta_tokens < 0 and position:
-        if position.token_amount < abs(delta_tokens):
-            delta_tokens = position.token_amount
-
-        remaining_tokens = position.token_amount + delta_tokens
-        remaining_usdc = position.entry_amount_usdc * (remaining_tokens / position.token_amount) if position.token_amount else Decimal("0")
-
-        await session.execute(update(Position)
-            .where(Position.id == position.id)
-            .values(token_amount=remaining_tokens, entry_amount_usdc=remaining_usdc)
-        )
-
-    await session.commit()
-
-
-async def get_real_time_pnl(
-    session: AsyncSession,
-    user_id: int,
-    wallet_address: str,
-    token: str
-) -> tuple[float, float]:
+    price: Decimal,
+    decimals: int
+) -> tuple[Decimal, Decimal]:
+    """
+    Combined unrealized PnL and entry cost (USD) of `token` across the given
+    wallets, valued at `price` per whole token (the caller's already-fetched
+    quote). One query, no HTTP. Empty positions contribute nothing.
+    """
     result = await session.execute(
-        select(Position).where(
+        select(Position.entry_amount_usdc, Position.token_amount).where(
             Position.user_id == user_id,
-            Position.wallet_address == wallet_address,
+            Position.wallet_address.in_(wallet_addresses),
             Position.token == token
         )
     )
-    position = result.scalar_one_or_none()
-    if not position:
-        return 0.0, 0.0
-
-    entry_total = position.entry_amount_usdc
-    token_amount = position.token_amount.quantize(Decimal("0.00000001"), rounding=ROUND_DOWN)
-
-    if token_amount <= 0 and entry_total > 0:
-        return 0.0, 0.0
-
-    info = await fetch_token_info(token)
-    if not info or float(info.get("price", 0)) <= 0:
-        return 0.0, float(token_amount)
 
-    current_price = Decimal(str(info["price"]))
-    current_total = token_amount * current_price
-    pnl = current_total - entry_total
+    total_pnl = 0
+    total_entry = 0
+    micro_per_unit = price * MICRO_USDC_PER_USDC / (Decimal(10) ** decimals)
+    for entry, token_amount in result.all():
+        total_entry += entry
+        if price <= 0 or token_amount <= 0:
+            continue
+        total_pnl += int(token_amount * micro_per_unit) - entry
 
-    return float(pnl), float(token_amount)
+    return Decimal(total_pnl) / MICRO_USDC_PER_USDC, Decimal(total_entry) / MICRO_USDC_PER_USDC
 
 
-async def reset_position_if_empty(
-    session: AsyncSession,
-    user_id: int,
-    wallet_address: str,
-    token: str
-) -> None:
-    result = await session.execute(
-        select(Position).where(
-            Position.user_id == user_id,
-            Position.wallet_address == wallet_address,
-            Position.token == token
+async def reconcile_referral_counters(session: AsyncSession) -> int:
+    """
+    Rebuild referrals_total / referrals_active for every referrer from scratch.
+    A referral is active once its reward has been granted. Only rows whose
+    counters drifted are written; returns how many were fixed.
+    """
+    referee = aliased(User)
+    counts = (
+        select(
+            User.id.label("user_id"),
+            func.count(referee.id).label("total"),
+            func.count(ReferralReward.id).label("active"),
         )
+        .outerjoin(referee, referee.referred_by == User.referral_code)
+        .outerjoin(ReferralReward, and_(
+            ReferralReward.referee_id == referee.id,
+            ReferralReward.referrer_id == User.id,
+        ))
+        .group_by(User.id)
+        .subquery("counts")
     )
-    position = result.scalar_one_or_none()
-
-    if position:
-        remaining = position.token_amount.quantize(Decimal("0.00000001"), rounding=ROUND_DOWN)
-        if remaining < MINIMUM_REMAINING_THRESHOLD:
-            await session.execute(
-                delete(Position).where(
-                    Position.user_id == user_id,
-                    Position.wallet_address == wallet_address,
-                    Position.token == token
-                )
-            )
-            await session.commit()
-
-
-async def get_position(
-    session: AsyncSession,
-    user_id: int,
-    wallet_address: str,
-    token: str
-) -> tuple[Decimal, Decimal]:
     result = await session.execute(
-        select(Position).where(
-            Position.user_id == user_id,
-            Position.wallet_address == wallet_address,
-            Position.token == token
+        update(User)
+        .where(
+            User.id == counts.c.user_id,
+            or_(
+                func.coalesce(User.referrals_total, 0) != counts.c.total,
+                func.coalesce(User.referrals_active, 0) != counts.c.active,
+            ),
         )
+        .values(referrals_total=counts.c.total, referrals_active=counts.c.active)
     )
-    position = result.scalar_one_or_none()
-
-    if position:
-        entry = position.entry_amount_usdc
-        remaining = position.token_amount.quantize(Decimal("0.00000001"), rounding=ROUND_DOWN)
-        return entry, remaining
-
-    return Decimal(0), Decimal(0)
-
-
-async def update_active_referrals(session: AsyncSession, user: User) -> None:
-    if not user.referral_code:
-        user.referrals_total = 0
-        user.referrals_active = 0
-        return
-
-    res = await session.execute(
-        select(User).where(User.referred_by == user.referral_code)
-    )
-    referred = res.scalars().all()
-    user.referrals_total = len(referred)
-    user.referrals_active = sum(1 for u in referred if (u.pnl or 0) >= 100)
     await session.commit()
+    return result.rowcount
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InputMediaPhoto, Message
+
+from bot.services.icons import forget_file_id, get_file_id, save_file_id
+
+logger = logging.getLogger(__name__)
+
+# Messages whose last rendered content we remember, most recent last
+MAX_TRACKED_MESSAGES = 10_000
+
+# (chat_id, message_id) → (content hash, photo)
+_rendered: OrderedDict[tuple[int, int], tuple[str, str | None]] = OrderedDict()
+
+
+def _content_hash(text: str, markup: InlineKeyboardMarkup | None, photo: str | None) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in (text, markup.model_dump_json() if markup else "", photo or ""):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _remember(msg: Message, content_hash: str, photo: str | None) -> None:
+    key = (msg.chat.id, msg.message_id)
+    _rendered[key] = (content_hash, photo)
+    _rendered.move_to_end(key)
+    while len(_rendered) > MAX_TRACKED_MESSAGES:
+        _rendered.popitem(last=False)
+
+
+def forget(msg: Message) -> None:
+    forget_id(msg.chat.id, msg.message_id)
+
+
+def forget_id(chat_id: int, message_id: int) -> None:
+    """Drop what we remember of a message edited without `render`, so its next render isn't skipped."""
+    _rendered.pop((chat_id, message_id), None)
+
+
+async def _with_photo(photo: str, call: Callable[[str], Awaitable]):
+    """
+    Run `call(media)` for `photo`. A URL is replaced by the file_id Telegram
+    returned the first time it was sent, so the picture isn't downloaded
+    again; without one (or if Telegram rejects it) the URL is used and the
+    resulting file_id stored.
+    """
+    if not photo.startswith(("http://", "https://")):
+        return await call(photo)
+
+    file_id = await get_file_id(photo)
+    if file_id is not None:
+        try:
+            return await call(file_id)
+        except TelegramBadRequest as e:
+            if "file identifier" not in str(e):
+                raise
+            logger.info(f"[RENDER] Cached file_id for {photo} rejected, sending the URL: {e}")
+            await forget_file_id(photo)
+
+    result = await call(photo)
+    if isinstance(result, Message) and result.photo:
+        await save_file_id(photo, result.photo[-1].file_id)
+    return result
+
+
+async def _send(target: Message | CallbackQuery, text: str, markup, photo: str | None) -> Message:
+    chat_id = target.chat.id if isinstance(target, Message) else (
+        target.message.chat.id if target.message else target.from_user.id
+    )
+    if photo:
+        return await _with_photo(photo, lambda media: target.bot.send_photo(
+            chat_id=chat_id, photo=media, caption=text, parse_mode="HTML", reply_markup=markup
+        ))
+    return await target.bot.send_message(
+        chat_id=chat_id, text=text, parse_mode="HTML", reply_markup=markup, disable_web_page_preview=True
+    )
+
+
+async def _edit(msg: Message, text: str, markup, photo: str | None, previous_photo: str | None) -> None:
+    if not photo:
+        await msg.edit_text(text, parse_mode="HTML", reply_markup=markup, disable_web_page_preview=True)
+    elif previous_photo == photo:
+        await msg.edit_caption(caption=text, parse_mode="HTML", reply_markup=markup)
+    else:
+        # Unknown or different picture: swap the media together with the caption
+        await _with_photo(photo, lambda media: msg.edit_media(
+            InputMediaPhoto(media=media, caption=text, parse_mode="HTML"), reply_markup=markup
+        ))
+
+
+async def render(
+    target: Message | CallbackQuery,
+    text: str,
+    markup: InlineKeyboardMarkup | None = None,
+    photo: str | None = None,
+    resend: bool = False,
+) -> Message:
+    """
+    Show `text` (as a caption under `photo` if given) with `markup`.
+
+    For a callback, the message carrying the button is edited in place. The
+    call is skipped altogether if that message already shows exactly this
+    content. It is deleted and sent again only when switching between a text
+    and a photo message, when it can no longer be edited, or when `resend`
+    asks to move it below newer messages. For a user's message a new one
+    is sent.
+
+    Returns the message now showing the content.
+    """
+    content_hash = _content_hash(text, markup, photo)
+    msg = target.message if isinstance(target, CallbackQuery) else None
+
+    if isinstance(msg, Message) and not resend:
+        key = (msg.chat.id, msg.message_id)
+        rendered = _rendered.get(key)
+        if rendered is not None and rendered[0] == content_hash:
+            return msg
+
+        if bool(msg.photo) == bool(photo):
+            try:
+                await _edit(msg, text, markup, photo, rendered[1] if rendered else None)
+                _remember(msg, content_hash, photo)
+                return msg
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    _remember(msg, content_hash, photo)
+                    return msg
+                logger.info(f"[RENDER] Can't edit {key}, sending a new message: {e}")
+
+    if isinstance(msg, Message):
+        forget(msg)
+        try:
+            await msg.delete()
+        except TelegramBadRequest:
+            pass
+
+    sent = await _send(target, text, markup, photo)
+    _remember(sent, content_hash, photo)
+    return sent
@@ -19,6 +19,7 @@ use spl_token::id as token_program_id;
 use spl_associated_token_account::{
     get_associated_token_address, instruction::create_associated_token_account,
 };
+use std::time::Instant;
 
 use crate::utils::{decode_keypair, JsonInput, sol_to_lamports};
 
@@ -69,6 +70,7 @@ async fn swap_directional(
     let client = Client::new();
     let rpc = RpcClient::new("https://api.mainnet-beta.solana.com".to_string());
 
+    let started = Instant::now();
     if input_mint == SOL_MINT {
         let wsol_ata = get_associated_token_address(&pubkey, &spl_token::native_mint::id());
         if rpc.get_account(&wsol_ata).await.is_err() {
@@ -85,6 +87,9 @@ async fn swap_directional(
         }
     }
 
+    let prepare_ms = started.elapsed().as_millis() as u64;
+
+    let started = Instant::now();
     let quote_url = format!(
         "https://lite-api.jup.ag/swap/v1/quote?inputMint={}&outputMint={}&amount={}&slippageBps={}",
         input_mint, output_mint, amount, slippage_bps
@@ -96,6 +101,9 @@ async fn swap_directional(
     let route_plan = quote_json["routePlan"].clone();
     quote_json["routePlan"] = route_plan;
 
+    let quote_ms = started.elapsed().as_millis() as u64;
+
+    let started = Instant::now();
     let cup_price_micro = total_fee_lamports.saturating_mul(1_000_000) / compute_unit_limit;
 
     let payload = json!({
@@ -145,14 +153,24 @@ async fn swap_directional(
         .and_then(|s| s.parse::<u64>().ok())
         .unwrap_or(0);
 
+    let build_ms = started.elapsed().as_millis() as u64;
+
+    let started = Instant::now();
     let sig = rpc
         .send_transaction_with_config(&signed_tx, config)
         .await?;
+    let send_ms = started.elapsed().as_millis() as u64;
 
     Ok(json!({
         "success":    true,
         "txid":       sig.to_string(),
         "in_amount":  in_amount,
-        "out_amount": out_amount
+        "out_amount": out_amount,
+        "timings_ms": {
+            "prepare": prepare_ms,
+            "quote":   quote_ms,
+            "build":   build_ms,
+            "send":    send_ms
+        }
     }))
 }
@@ -0,0 +1,103 @@
+import json
+import time
+from dataclasses import dataclass, field, replace
+from typing import Iterable
+
+from aiogram.fsm.context import FSMContext
+
+# A buy/sell flow untouched for this long is treated as abandoned and dropped
+FLOW_TTL_SEC = 30 * 60
+# Reading a flow older than this re-saves it, so any use of the panel keeps it alive
+FLOW_TOUCH_SEC = 60
+MAX_FLOW_WALLETS = 5  # the per-user wallet limit
+MAX_CA_LEN = 44       # base58 of a 32-byte key
+# Upper bound of the stored record; the fields above keep it well under
+MAX_FLOW_BYTES = 256
+
+FLOW_KEY = "trade"
+MODES = ("buy", "sell")
+
+FLOW_EXPIRED_TEXT = "⌛ This trade screen has expired. Send the token address (CA) again."
+
+
+@dataclass(frozen=True)
+class MessageRef:
+    chat_id: int
+    message_id: int
+
+
+@dataclass(frozen=True)
+class TradeFlow:
+    """
+    Buy/sell flow state of a user. Stored in FSM data as a short JSON list:
+    [mode, token CA, wallet ids, [chat id, message id] of the custom amount
+    prompt, last update as epoch seconds].
+    """
+    mode: str = "buy"
+    token_ca: str | None = None
+    wallet_ids: frozenset[int] = field(default_factory=frozenset)
+    # Message to remove once the custom amount arrives
+    prompt: MessageRef | None = None
+
+    def select(self, wallets: Iterable) -> list:
+        return [w for w in wallets if w.id in self.wallet_ids]
+
+    def owned_by(self, wallets: Iterable) -> "TradeFlow":
+        """The flow without selected wallets missing from `wallets`, i.e. deleted since."""
+        return replace(self, wallet_ids=self.wallet_ids & {w.id for w in wallets})
+
+    def encode(self) -> list:
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown trade mode: {self.mode!r}")
+        if self.token_ca is not None and len(self.token_ca) > MAX_CA_LEN:
+            raise ValueError("Token address too long")
+        if len(self.wallet_ids) > MAX_FLOW_WALLETS:
+            raise ValueError(f"More than {MAX_FLOW_WALLETS} wallets selected")
+
+        record = [
+            MODES.index(self.mode),
+            self.token_ca,
+            sorted(self.wallet_ids),
+            [self.prompt.chat_id, self.prompt.message_id] if self.prompt else None,
+            int(time.time()),
+        ]
+        if len(json.dumps(record, separators=(",", ":"))) > MAX_FLOW_BYTES:
+            raise ValueError("Trade flow record exceeds MAX_FLOW_BYTES")
+        return record
+
+    @classmethod
+    def decode(cls, record: list) -> "TradeFlow":
+        mode, token_ca, wallet_ids, prompt, _ = record
+        return cls(
+            mode=MODES[mode],
+            token_ca=token_ca,
+            wallet_ids=frozenset(wallet_ids),
+            prompt=MessageRef(*prompt) if prompt else None,
+        )
+
+
+async def get_trade_flow(state: FSMContext) -> TradeFlow:
+    """
+    The user's current flow. Reading it counts as activity: the TTL restarts,
+    so read-only interactions like Refresh keep the flow alive. An expired or
+    unreadable record clears the FSM state and data, so a stale "enter
+    amount" prompt stops catching input.
+    """
+    record = (await state.get_data()).get(FLOW_KEY)
+    if record is None:
+        return TradeFlow()
+    try:
+        age = time.time() - record[-1]
+        if age <= FLOW_TTL_SEC:
+            flow = TradeFlow.decode(record)
+            if age > FLOW_TOUCH_SEC:
+                await save_trade_flow(state, flow)
+            return flow
+    except (TypeError, ValueError, IndexError):
+        pass
+    await state.clear()
+    return TradeFlow()
+
+
+async def save_trade_flow(state: FSMContext, flow: TradeFlow) -> None:
+    await state.update_data({FLOW_KEY: flow.encode()})
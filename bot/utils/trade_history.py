@@ -0,0 +1,128 @@
+import csv
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.constants import MICRO_USDC_PER_USDC
+from bot.database.models import Mint, Trade
+
+PAGE_SIZE = 10
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+EXPORT_BATCH = 500
+
+CSV_HEADER = [
+    "created_at", "type", "status", "token", "wallet",
+    "token_amount", "amount_usdc", "price_per_token", "realized_pnl_usdc", "txid",
+]
+
+
+@dataclass(frozen=True)
+class HistoryCursor:
+    """Position of the last row shown: the next page starts strictly after it."""
+    created_at: datetime
+    id: int
+
+    def encode(self) -> str:
+        return f"{(self.created_at - _EPOCH) // _MICROSECOND}:{self.id}"
+
+    @classmethod
+    def decode(cls, raw: str) -> "HistoryCursor":
+        micros, trade_id = raw.split(":")
+        return cls(_EPOCH + int(micros) * _MICROSECOND, int(trade_id))
+
+
+def _history_query(user_id: int):
+    return (
+        select(
+            Trade.id,
+            Trade.created_at,
+            Trade.type,
+            Trade.status,
+            Trade.token,
+            Trade.wallet_address,
+            Trade.token_amount,
+            Trade.amount_usdc,
+            Trade.price_per_token,
+            Trade.realized_pnl,
+            Trade.txid,
+            Mint.decimals,
+        )
+        .outerjoin(Mint, Mint.address == Trade.token)
+        .where(Trade.user_id == user_id)
+        .order_by(Trade.created_at.desc(), Trade.id.desc())
+    )
+
+
+def whole_tokens(units: int, decimals: int | None) -> Decimal:
+    """Whole tokens; raw units if the mint's decimals are unknown."""
+    return Decimal(units).scaleb(-decimals) if decimals is not None else Decimal(units)
+
+
+def usdc_amount(micro: int | None) -> Decimal:
+    return Decimal(micro or 0) / MICRO_USDC_PER_USDC
+
+
+async def get_trades_page(
+    session: AsyncSession,
+    user_id: int,
+    after: HistoryCursor | None = None,
+    limit: int = PAGE_SIZE,
+) -> tuple[list, HistoryCursor | None]:
+    """
+    One page of the user's trades, newest first, using keyset pagination on
+    (created_at, id) so every page costs the same index range scan.
+    Returns the rows and the cursor of the next page (None on the last one).
+    """
+    query = _history_query(user_id).limit(limit + 1)
+    if after is not None:
+        query = query.where(tuple_(Trade.created_at, Trade.id) < tuple_(after.created_at, after.id))
+
+    rows = (await session.execute(query)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, HistoryCursor(rows[-1].created_at, rows[-1].id)
+
+
+async def export_trades_csv(session: AsyncSession, user_id: int) -> str:
+    """
+    Write all of the user's trades to a temporary CSV file and return its path
+    (the caller deletes it; on failure it is removed here). Rows come from a server-side cursor in batches of
+    EXPORT_BATCH and go straight to disk, so memory use doesn't grow with history.
+    """
+    f = tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", encoding="utf-8", delete=False)
+    try:
+        result = await session.stream(
+            _history_query(user_id).execution_options(yield_per=EXPORT_BATCH)
+        )
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        async for partition in result.partitions():
+            writer.writerows(
+                [
+                    r.created_at.isoformat() if r.created_at else "",
+                    r.type.value,
+                    r.status.value,
+                    r.token,
+                    r.wallet_address,
+                    whole_tokens(r.token_amount, r.decimals),
+                    usdc_amount(r.amount_usdc),
+                    r.price_per_token if r.price_per_token is not None else "",
+                    usdc_amount(r.realized_pnl),
+                    r.txid or "",
+                ]
+                for r in partition
+            )
+        f.close()
+    except BaseException:
+        # Nothing returns the path on failure, so nobody else would remove the file
+        f.close()
+        os.remove(f.name)
+        raise
+    return f.name
@@ -0,0 +1,84 @@
+import os
+import time
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+
+from bot.database.db import async_session
+from bot.database.models import User
+
+load_dotenv()
+
+# Safety net for rows changed outside the settings handlers.
+SETTINGS_TTL_SEC = 10 * 60
+# Webhook replicas serve the same users; a change made on one would stay
+# stale on the others, so there settings are always read from the database
+CACHE_SETTINGS = os.getenv("BOT_MODE") != "webhook"
+
+
+@dataclass(frozen=True)
+class UserSettings:
+    slippage: int      # percent
+    tx_fee: float      # SOL
+    fee_mode: str      # "fixed" | "auto"
+
+
+DEFAULT_SETTINGS = UserSettings(slippage=1, tx_fee=0.001, fee_mode="fixed")
+
+# telegram_id → (settings, cached at)
+_cache: dict[int, tuple[UserSettings, float]] = {}
+
+
+def _from_row(slippage, tx_fee, fee_mode) -> UserSettings:
+    return UserSettings(slippage=slippage, tx_fee=float(tx_fee), fee_mode=fee_mode or "fixed")
+
+
+async def get_user_settings(telegram_id: int) -> UserSettings:
+    """
+    Trade settings of a user, served from memory after the first read.
+    Unknown users get DEFAULT_SETTINGS, which are not cached. Nothing is
+    cached in webhook mode.
+    """
+    cached = _cache.get(telegram_id)
+    if cached is not None and time.monotonic() - cached[1] < SETTINGS_TTL_SEC:
+        return cached[0]
+
+    async with async_session() as session:
+        row = (await session.execute(
+            select(User.slippage_tolerance, User.tx_fee, User.fee_mode)
+            .where(User.telegram_id == telegram_id)
+        )).one_or_none()
+
+    if row is None:
+        return DEFAULT_SETTINGS
+
+    settings = _from_row(*row)
+    if CACHE_SETTINGS:
+        _cache[telegram_id] = (settings, time.monotonic())
+    return settings
+
+
+async def update_user_settings(telegram_id: int, **values) -> UserSettings:
+    """Write-through: persist `values` and refresh the cached entry from the updated row."""
+    async with async_session() as session:
+        row = (await session.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(**values)
+            .returning(User.slippage_tolerance, User.tx_fee, User.fee_mode)
+        )).one_or_none()
+        await session.commit()
+
+    if row is None:
+        _cache.pop(telegram_id, None)
+        return DEFAULT_SETTINGS
+
+    settings = _from_row(*row)
+    if CACHE_SETTINGS:
+        _cache[telegram_id] = (settings, time.monotonic())
+    return settings
+
+
+def invalidate_user_settings(telegram_id: int) -> None:
+    _cache.pop(telegram_id, None)
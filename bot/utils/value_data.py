@@ -1,4 +1,9 @@
+import os
+import time
+from collections import OrderedDict
+
 import aiohttp
+from dotenv import load_dotenv
 from typing import List, Dict, Tuple, Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -16,6 +21,8 @@ USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
 MIN_SOL_RESERVE = 0.0045
 MIN_USDC_AMOUNT = 1.0
 
+load_dotenv()
+
 
 async def get_token_balance(address: str, mint: str) -> int:
     owner = Pubkey.from_string(address)
@@ -128,11 +135,95 @@ def get_wallets_text(wallets: List[Wallet]) -> str:
     )
 
 
-async def get_user_with_wallets(telegram_id: int, session: AsyncSession) -> Optional[User]:
+class _Record:
+    """Read-only record with fixed fields, cheap to cache and share between coroutines."""
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class WalletRecord(_Record):
+    __slots__ = ("id", "address", "encrypted_seed", "user_id")
+
+
+class UserSnapshot(_Record):
+    __slots__ = ("id", "telegram_id", "wallets")  # wallets: tuple[WalletRecord, ...]
+
+
+# Wallet sets only change in the wallets handlers, which call
+# invalidate_user_wallets; the TTL keeps idle users' seeds out of memory.
+USER_SNAPSHOT_TTL_SEC = 5 * 60
+MAX_USER_SNAPSHOTS = 10_000
+# Webhook replicas serve the same users, and an invalidation only reaches the
+# replica that made it, so there every read goes to the database
+CACHE_USER_SNAPSHOTS = os.getenv("BOT_MODE") != "webhook"
+
+# telegram_id → (snapshot, cached at), oldest first
+_user_snapshots: OrderedDict[int, Tuple[UserSnapshot, float]] = OrderedDict()
+# telegram_id → when its wallets last changed, oldest first, so a load that
+# raced with a wallet change isn't cached. Dropped with the user's snapshot
+# or after the TTL, whichever comes first.
+_user_generations: OrderedDict[int, float] = OrderedDict()
+
+
+def _evict_user_snapshots(now: float) -> None:
+    while _user_snapshots:
+        telegram_id, (_, cached_at) = next(iter(_user_snapshots.items()))
+        if len(_user_snapshots) <= MAX_USER_SNAPSHOTS and now - cached_at < USER_SNAPSHOT_TTL_SEC:
+            break
+        del _user_snapshots[telegram_id]
+        _user_generations.pop(telegram_id, None)
+    while _user_generations:
+        telegram_id, changed_at = next(iter(_user_generations.items()))
+        if now - changed_at < USER_SNAPSHOT_TTL_SEC:
+            break
+        del _user_generations[telegram_id]
+
+
+async def get_user_with_wallets(telegram_id: int, session: AsyncSession) -> Optional[UserSnapshot]:
+    now = time.monotonic()
+    _evict_user_snapshots(now)
+    cached = _user_snapshots.get(telegram_id)
+    if cached is not None:
+        return cached[0]
+
+    started = now
     result = await session.execute(
         select(User).options(selectinload(User.wallets)).where(User.telegram_id == telegram_id)
     )
-    return result.scalar_one_or_none()
+    user = result.scalar_one_or_none()
+    if user is None:
+        return None
+
+    snapshot = UserSnapshot(
+        id=user.id,
+        telegram_id=user.telegram_id,
+        wallets=tuple(
+            WalletRecord(id=w.id, address=w.address, encrypted_seed=w.encrypted_seed, user_id=w.user_id)
+            for w in sorted(user.wallets, key=lambda w: w.id)
+        ),
+    )
+    changed_at = _user_generations.get(telegram_id)
+    if CACHE_USER_SNAPSHOTS and (changed_at is None or changed_at < started):
+        _user_snapshots.pop(telegram_id, None)
+        _user_snapshots[telegram_id] = (snapshot, time.monotonic())
+    return snapshot
+
+
+def invalidate_user_wallets(telegram_id: int) -> None:
+    """Call after any change to the user's wallet set."""
+    _user_generations.pop(telegram_id, None)
+    _user_generations[telegram_id] = time.monotonic()
+    _user_snapshots.pop(telegram_id, None)
 
 
 def get_first_wallet(wallets: List[Wallet]) -> Optional[str]:
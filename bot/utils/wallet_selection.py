@@ -0,0 +1,21 @@
+from dataclasses import replace
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+# Kept under its own destiny so state.clear() at the end of a flow
+# doesn't drop the user's wallet selection.
+WALLET_SELECTION_DESTINY = "wallets"
+
+
+def _key(state: FSMContext) -> StorageKey:
+    return replace(state.key, destiny=WALLET_SELECTION_DESTINY)
+
+
+async def get_selected_wallets(state: FSMContext) -> set[str]:
+    data = await state.storage.get_data(_key(state))
+    return set(data.get("selected", ()))
+
+
+async def set_selected_wallets(state: FSMContext, selected: set[str]) -> None:
+    await state.storage.set_data(_key(state), {"selected": sorted(selected)})
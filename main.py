@@ -5,7 +5,6 @@ from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from bot.handlers.settings import router as settings_router
 from bot.handlers.withdraw import withdraw_router
@@ -17,28 +16,67 @@ from bot.handlers.start import start_router
 from bot.handlers.wallets import wallets_router
 from bot.handlers.swap import swap_router
 from bot.handlers.earn import earn_router
+from bot.handlers.admin import admin_router
+from bot.handlers.history import history_router
+from bot.services.confirmation import run_confirmation_tracker
+from bot.services.fees import run_fee_sampler
+from bot.services.referrals import run_referral_reconciler
+from bot.services.journal import replay_journal, flush_journal, run_journal_flusher
+from bot.services.partitions import run_partition_maintenance
+from bot.database.fsm_storage import create_fsm_storage, run_fsm_purger
+from bot.services.webhook import run_webhook
+from bot.services.sharding import run_sharded, run_worker, BOT_SHARD, BOT_WORKERS
+from bot.middlewares.lanes import user_lanes
+from bot.middlewares.outbox import outbox
 
 from manage_rust import build_rust, OUTPUT_BIN
 
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# polling: one long-polling stream; webhook: aiohttp server, can run several replicas;
+# sharded: launcher fanning updates out to BOT_WORKERS worker processes by user;
+# worker: one of those processes, started by the launcher
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Database-wide maintenance must run in exactly one process. Sharded workers
+# leave it to shard 0; webhook replicas can't tell each other apart, so there
+# it is off unless RUN_MAINTENANCE=1 is set on exactly one replica. Trade
+# confirmation is not maintenance: every replica tracks trades (see below).
+RUN_MAINTENANCE = os.getenv("RUN_MAINTENANCE", "0" if BOT_MODE == "webhook" else "1") == "1" and BOT_SHARD == 0
 
 
 async def main():
-    # 👷 Build Rust
-    build_rust()
+    rust_proc = None
+    if BOT_MODE != "worker":
+        # 👷 Build Rust
+        build_rust()
 
-    # 🌐 Run Rust server (non-blocking)
-    print("🌐 Starting Rust Axum server on localhost:3030...")
-    rust_proc = subprocess.Popen([OUTPUT_BIN], cwd="bin")
+        # 🌐 Run Rust server (non-blocking); in sharded mode all workers share it
+        print("🌐 Starting Rust Axum server on localhost:3030...")
+        rust_proc = subprocess.Popen([OUTPUT_BIN], cwd="bin")
+
+    if BOT_MODE == "sharded":
+        try:
+            await run_sharded(BOT_TOKEN)
+        finally:
+            print("🛑 Shutting down Rust server...")
+            rust_proc.terminate()
+        return
 
     # 🤖 Launch the bot
     bot = Bot(
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    # Every send and edit goes through the rate-limited outbound queue
+    bot.session.middleware(outbox)
+    # Shared FSM storage; the dispatcher flushes and closes it on shutdown.
+    # Webhook replicas share users, so they skip the in-memory front.
+    storage = create_fsm_storage(coalesce=BOT_MODE != "webhook")
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    # Per-user ordered lanes go in front of the FSM middleware so each update
+    # reads its state only after the user's previous update is done
+    dp.update.outer_middleware(user_lanes)
+    dp.update.outer_middleware(dp.fsm)
 
     dp.include_router(start_router)
     dp.include_router(wallets_router)
@@ -50,13 +88,50 @@ async def main():
     dp.include_router(start_buy_sell_router)
     dp.include_router(withdraw_router)
     dp.include_router(settings_router)
+    dp.include_router(admin_router)
+    dp.include_router(history_router)
+
+    # 📒 Persist fills journaled before the last shutdown/crash, then keep flushing
+    await replay_journal()
+    tasks = [
+        asyncio.create_task(run_journal_flusher()),
+        # 📡 Track confirmations of sent transactions; a worker polls only its own users' trades.
+        # Webhook replicas all poll every pending trade: each trade leaves PENDING once,
+        # so only one of them credits or reports it
+        asyncio.create_task(run_confirmation_tracker(
+            bot,
+            shard=BOT_SHARD,
+            workers=BOT_WORKERS if BOT_MODE == "worker" else 1,
+        )),
+        # ⚡ Keep the priority fee estimate warm for "auto" fee mode
+        asyncio.create_task(run_fee_sampler()),
+    ]
+    if RUN_MAINTENANCE:
+        tasks += [
+            # 🧮 Periodically rebuild referral counters from scratch
+            asyncio.create_task(run_referral_reconciler()),
+            # 🗂 Create upcoming trades partitions, archive expired ones
+            asyncio.create_task(run_partition_maintenance()),
+            # 🧹 Drop expired FSM records
+            asyncio.create_task(run_fsm_purger(storage)),
+        ]
 
-    print("🤖 Bot is running...")
+    print(f"🤖 Bot is running ({BOT_MODE})...")
     try:
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        elif BOT_MODE == "worker":
+            await run_worker(dp, bot)
+        else:
+            await dp.start_polling(bot)
     finally:
-        print("🛑 Shutting down Rust server...")
-        rust_proc.terminate()
+        for task in tasks:
+            task.cancel()
+        if rust_proc is not None:
+            print("🛑 Shutting down Rust server...")
+            rust_proc.terminate()
+        # Whatever fails to flush here stays in the journal for the next start
+        await flush_journal()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,9 @@
+-- Confirmation status for recorded trades.
+-- Rows written before the tracker existed are assumed to have landed.
+
+CREATE TYPE tradestatus AS ENUM ('PENDING', 'CONFIRMED', 'FAILED', 'DROPPED');
+
+ALTER TABLE trades ADD COLUMN status tradestatus NOT NULL DEFAULT 'CONFIRMED';
+ALTER TABLE trades ALTER COLUMN status SET DEFAULT 'PENDING';
+
+CREATE INDEX ix_trades_pending ON trades (id) WHERE status = 'PENDING';
@@ -0,0 +1,3 @@
+-- Priority fee mode: "fixed" uses tx_fee as is, "auto" follows the network estimate capped by tx_fee.
+
+ALTER TABLE users ADD COLUMN fee_mode TEXT DEFAULT 'fixed';
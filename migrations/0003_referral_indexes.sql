@@ -0,0 +1,9 @@
+-- Indexes behind the incrementally maintained referral counters.
+-- A referee can be rewarded only once; drop duplicates left by earlier races first.
+
+DELETE FROM referral_rewards r
+USING referral_rewards d
+WHERE r.referee_id = d.referee_id AND r.id > d.id;
+
+CREATE UNIQUE INDEX uix_referral_rewards_referee ON referral_rewards (referee_id);
+CREATE INDEX ix_users_referred_by ON users (referred_by);
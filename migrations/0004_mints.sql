@@ -0,0 +1,8 @@
+-- Decimals per token mint, needed to value positions stored in atomic units.
+-- Filled on demand; to resolve already traded tokens up front run:
+--     python -m bot.services.mints
+
+CREATE TABLE mints (
+    address  TEXT PRIMARY KEY,
+    decimals SMALLINT NOT NULL
+);
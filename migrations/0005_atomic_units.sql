@@ -0,0 +1,43 @@
+-- Store token amounts as atomic units and USDC values as micro-USDC (BIGINT)
+-- instead of arbitrary-precision NUMERIC.
+-- Legacy token amounts were written as atomic units / 10^6 whatever the mint's
+-- real decimals (DexScreener returns none, so the old code fell back to 6), so
+-- they are scaled back with 10^6, not with mints.decimals.
+
+BEGIN;
+
+-- positions
+ALTER TABLE positions ADD COLUMN token_units BIGINT, ADD COLUMN entry_micro BIGINT;
+
+UPDATE positions p SET
+    token_units = round(p.token_amount * 1000000)::BIGINT,
+    entry_micro = round(p.entry_amount_usdc * 1000000)::BIGINT;
+
+-- Dust left over by the old arithmetic carries no cost basis
+UPDATE positions SET entry_micro = 0 WHERE token_units = 0;
+
+ALTER TABLE positions DROP COLUMN token_amount, DROP COLUMN entry_amount_usdc;
+ALTER TABLE positions RENAME COLUMN token_units TO token_amount;
+ALTER TABLE positions RENAME COLUMN entry_micro TO entry_amount_usdc;
+ALTER TABLE positions
+    ALTER COLUMN token_amount SET NOT NULL, ALTER COLUMN token_amount SET DEFAULT 0,
+    ALTER COLUMN entry_amount_usdc SET NOT NULL, ALTER COLUMN entry_amount_usdc SET DEFAULT 0;
+
+-- trades
+ALTER TABLE trades
+    ADD COLUMN token_units BIGINT,
+    ADD COLUMN usdc_micro BIGINT,
+    ADD COLUMN realized_micro BIGINT;
+
+UPDATE trades t SET
+    token_units = round(t.token_amount * 1000000)::BIGINT,
+    usdc_micro = round(t.amount_usdc * 1000000)::BIGINT,
+    realized_micro = round(t.realized_pnl * 1000000)::BIGINT;
+
+ALTER TABLE trades DROP COLUMN token_amount, DROP COLUMN amount_usdc, DROP COLUMN realized_pnl;
+ALTER TABLE trades RENAME COLUMN token_units TO token_amount;
+ALTER TABLE trades RENAME COLUMN usdc_micro TO amount_usdc;
+ALTER TABLE trades RENAME COLUMN realized_micro TO realized_pnl;
+ALTER TABLE trades ALTER COLUMN token_amount SET NOT NULL, ALTER COLUMN amount_usdc SET NOT NULL;
+
+COMMIT;
@@ -0,0 +1,3 @@
+-- The trade journal flusher skips fills whose txid is already recorded (replay after a crash).
+
+CREATE INDEX ix_trades_txid ON trades (txid);
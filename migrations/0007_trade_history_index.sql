@@ -0,0 +1,4 @@
+-- Keyset pagination and CSV export of a user's trades walk this index backwards
+-- on (created_at, id); user_id comes first so each user's history is one range.
+
+CREATE INDEX ix_trades_user_created ON trades (user_id, created_at, id);
@@ -0,0 +1,63 @@
+-- Range-partition trades by month on created_at.
+-- The table is rebuilt: rows are copied into monthly partitions (plus a DEFAULT
+-- partition for anything outside them) and the id sequence is kept.
+-- Further partitions are created ahead of time, and old ones archived, by
+-- bot.services.partitions.
+
+BEGIN;
+
+ALTER TABLE trades RENAME TO trades_unpartitioned;
+ALTER TABLE trades_unpartitioned RENAME CONSTRAINT trades_pkey TO trades_unpartitioned_pkey;
+DROP INDEX IF EXISTS ix_trades_pending, ix_trades_txid, ix_trades_user_created;
+
+CREATE TABLE trades (
+    id              INTEGER NOT NULL DEFAULT nextval('trades_id_seq'),
+    user_id         INTEGER NOT NULL REFERENCES users (id),
+    token           TEXT NOT NULL,
+    wallet_address  TEXT NOT NULL,
+    type            tradetype NOT NULL,
+    token_amount    BIGINT NOT NULL,
+    amount_usdc     BIGINT NOT NULL,
+    price_per_token NUMERIC,
+    realized_pnl    BIGINT,
+    txid            VARCHAR,
+    status          tradestatus NOT NULL DEFAULT 'PENDING',
+    created_at      TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE trades_default PARTITION OF trades DEFAULT;
+
+DO $$
+DECLARE
+    m DATE := date_trunc('month', coalesce((SELECT min(created_at) FROM trades_unpartitioned), now()));
+BEGIN
+    WHILE m <= date_trunc('month', now()) + INTERVAL '2 months' LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF trades FOR VALUES FROM (%L) TO (%L)',
+            'trades_' || to_char(m, 'YYYY_MM'), m, m + INTERVAL '1 month'
+        );
+        m := m + INTERVAL '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO trades (
+    id, user_id, token, wallet_address, type, token_amount, amount_usdc,
+    price_per_token, realized_pnl, txid, status, created_at
+)
+SELECT
+    id, user_id, token, wallet_address, type, token_amount, amount_usdc,
+    price_per_token, realized_pnl, txid, status, coalesce(created_at, now())
+FROM trades_unpartitioned;
+
+-- Indexes on the parent are created on every partition, present and future
+CREATE INDEX ix_trades_pending ON trades (id) WHERE status = 'PENDING';
+CREATE INDEX ix_trades_txid ON trades (txid);
+CREATE INDEX ix_trades_user_created ON trades (user_id, created_at, id);
+CREATE INDEX ix_trades_user_token ON trades (user_id, token);
+CREATE INDEX ix_trades_wallet ON trades (wallet_address);
+
+ALTER SEQUENCE trades_id_seq OWNED BY trades.id;
+DROP TABLE trades_unpartitioned;
+
+COMMIT;
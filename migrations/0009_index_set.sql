@@ -0,0 +1,10 @@
+-- Secondary indexes for the hot read paths. Checked by: python -m benchmarks.query_plans
+-- Already covered elsewhere: users.telegram_id and users.referral_code (unique),
+-- users.referred_by (0003), positions (user_id, wallet_address, token) (unique).
+
+-- Wallets of a user, in creation order (snapshot loads, leaderboard's first wallet)
+CREATE INDEX ix_wallets_user_id ON wallets (user_id, id);
+-- Wallet lookups by address (duplicate check on import, deletion)
+CREATE INDEX ix_wallets_address ON wallets (address);
+-- Leaderboard order (points DESC, id) and rank counting
+CREATE INDEX ix_users_points ON users (points DESC, id);
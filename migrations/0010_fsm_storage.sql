@@ -0,0 +1,10 @@
+-- Shared FSM storage (states, state data, wallet selection) for FSM_STORAGE=postgres.
+
+CREATE TABLE fsm_storage (
+    key        TEXT PRIMARY KEY,
+    state      TEXT,
+    data       JSONB NOT NULL DEFAULT '{}'::jsonb,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX ix_fsm_storage_expires_at ON fsm_storage (expires_at);
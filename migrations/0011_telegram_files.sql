@@ -0,0 +1,8 @@
+-- Telegram file_id of each token icon already sent, so the picture is not
+-- downloaded from its URL again on every token panel.
+
+CREATE TABLE telegram_files (
+    url        TEXT PRIMARY KEY,
+    file_id    TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT now()
+);
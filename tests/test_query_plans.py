@@ -0,0 +1,167 @@
+"""
+Query-plan regression tests for the hot queries in pnl.py, earn_data.py,
+value_data.py and trade_history.py.
+
+Seeds a large synthetic dataset inside one transaction on the Postgres
+configured through the usual POSTGRES_* variables, runs the real query
+functions against it, EXPLAINs every statement they issue and rolls
+everything back. Each hot query is one test, failing if any of its plans
+contains a sequential scan. Skipped when no Postgres is configured:
+
+    QUERY_PLANS_USERS=50000 python -m pytest tests/test_query_plans.py
+
+Meant for a local/staging database: nothing is committed, but the seed does
+take row locks on the tables for the duration of the run.
+"""
+import asyncio
+import os
+from decimal import Decimal
+
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+if not os.getenv("POSTGRES_HOST"):
+    pytest.skip("no Postgres configured (POSTGRES_HOST)", allow_module_level=True)
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database.db import engine
+from bot.utils import value_data
+from bot.utils.earn_data import get_user_by_telegram_id, get_top_users, get_user_rank
+from bot.utils.pnl import Fill, get_positions_pnl, record_fills, apply_fills, award_points_for_active_referral
+from bot.utils.trade_history import get_trades_page
+from bot.utils.value_data import get_user_with_wallets
+
+USERS = int(os.getenv("QUERY_PLANS_USERS", "50000"))
+TOKENS = 50
+# Synthetic rows use ids far away from real ones
+TG_OFFSET = 9_000_000_000_000
+
+SEED = [
+    """
+    INSERT INTO users (telegram_id, pnl, points, referral_code, referred_by, referrals_total, referrals_active)
+    SELECT -(:tg + g), (random() * 1000)::int, (random() * 500)::int, 'QP' || g,
+           CASE WHEN g % 3 = 0 THEN 'QP' || (g / 3 + 1) END, 0, 0
+    FROM generate_series(1, :users) g
+    """,
+    """
+    INSERT INTO wallets (address, encrypted_seed, user_id)
+    SELECT 'qp' || md5(u.id::text || '-' || n), 'seed', u.id
+    FROM users u, generate_series(1, 2) n
+    WHERE u.telegram_id <= -:tg
+    """,
+    """
+    INSERT INTO mints (address, decimals)
+    SELECT 'qpmint' || t, 6 FROM generate_series(1, :tokens) t
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO positions (user_id, wallet_address, token, entry_amount_usdc, token_amount)
+    SELECT w.user_id, w.address, 'qpmint' || (1 + (w.id + k) % :tokens), 10000000, 1000000000
+    FROM wallets w JOIN users u ON u.id = w.user_id, generate_series(0, 1) k
+    WHERE u.telegram_id <= -:tg
+    """,
+    """
+    INSERT INTO trades (user_id, token, wallet_address, type, token_amount, amount_usdc,
+                        price_per_token, realized_pnl, txid, status, created_at)
+    SELECT p.user_id, p.token, p.wallet_address, 'BUY', 1000000000, 10000000, 0.01, 0,
+           'qptx' || p.id || '-' || n, 'CONFIRMED', now() - (n || ' days')::interval
+    FROM positions p, generate_series(1, 3) n
+    WHERE p.token LIKE 'qpmint%'
+    """,
+    "ANALYZE users, wallets, mints, positions, trades, referral_rewards",
+]
+
+# label → call of the hot query, given (session, seeded user, one of their tokens, fills)
+HOT_QUERIES = {
+    "value_data.get_user_with_wallets": lambda s, me, token, fills: get_user_with_wallets(me.telegram_id, s),
+    "earn_data.get_user_by_telegram_id": lambda s, me, token, fills: get_user_by_telegram_id(s, me.telegram_id),
+    "earn_data.get_top_users": lambda s, me, token, fills: get_top_users(s),
+    "earn_data.get_user_rank": lambda s, me, token, fills: get_user_rank(s, me.id),
+    "pnl.get_positions_pnl": lambda s, me, token, fills: get_positions_pnl(
+        s, me.id, list(me.wallets), token, Decimal("0.012"), 6
+    ),
+    "pnl.record_fills": lambda s, me, token, fills: record_fills(s, fills),
+    "pnl.apply_fills": lambda s, me, token, fills: apply_fills(s, fills),
+    "pnl.award_points_for_active_referral": lambda s, me, token, fills: award_points_for_active_referral(
+        s, me.id, me.referral_code
+    ),
+    "trade_history.get_trades_page": lambda s, me, token, fills: get_trades_page(s, me.id),
+}
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found += seq_scans(child)
+    return found
+
+
+async def explain_hot_queries(users: int) -> dict[str, list[tuple[str, dict]]]:
+    """Seed, run every hot query and return label → [(statement, plan)], all rolled back."""
+    captured: list[tuple[str, str, object]] = []
+    current = {"label": ""}
+    plans: dict[str, list[tuple[str, dict]]] = {label: [] for label in HOT_QUERIES}
+
+    async with engine.connect() as conn:
+        outer = await conn.begin()
+        try:
+            for stmt in SEED:
+                await conn.execute(text(stmt), {"tg": TG_OFFSET, "users": users, "tokens": TOKENS})
+
+            me = (await conn.execute(text(
+                "SELECT u.id, u.telegram_id, u.referral_code, array_agg(w.address ORDER BY w.id) AS wallets "
+                "FROM users u JOIN wallets w ON w.user_id = u.id "
+                "WHERE u.telegram_id <= -:tg GROUP BY u.id ORDER BY u.points DESC, u.id LIMIT 1"
+            ), {"tg": TG_OFFSET})).one()
+            token = (await conn.execute(text(
+                "SELECT token FROM positions WHERE wallet_address = :w LIMIT 1"
+            ), {"w": me.wallets[0]})).scalar_one()
+
+            def on_execute(_conn, _cursor, statement, parameters, _context, executemany):
+                if not executemany and statement.lstrip().split(None, 1)[0].upper() in {
+                    "SELECT", "INSERT", "UPDATE", "DELETE", "WITH"
+                }:
+                    captured.append((current["label"], statement, parameters))
+
+            event.listen(conn.sync_connection, "before_cursor_execute", on_execute)
+
+            session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+            value_data._user_snapshots.clear()
+            fills = [
+                Fill(me.id, me.wallets[0], token, 5_000_000, 500_000_000, Decimal("0.01"), "qp-buy"),
+                Fill(me.id, me.wallets[0], token, 9_000_000, -700_000_000, Decimal("0.013"), "qp-sell"),
+            ]
+            for label, run in HOT_QUERIES.items():
+                current["label"] = label
+                await run(session, me, token, fills)
+
+            event.remove(conn.sync_connection, "before_cursor_execute", on_execute)
+
+            for label, statement, parameters in captured:
+                plan = (await conn.exec_driver_sql(
+                    "EXPLAIN (FORMAT JSON) " + statement, parameters
+                )).scalar_one()
+                plans[label].append((statement, plan[0]["Plan"]))
+        finally:
+            await outer.rollback()
+    await engine.dispose()
+    return plans
+
+
+@pytest.fixture(scope="module")
+def hot_query_plans() -> dict[str, list[tuple[str, dict]]]:
+    return asyncio.run(explain_hot_queries(USERS))
+
+
+@pytest.mark.parametrize("label", list(HOT_QUERIES))
+def test_no_seq_scan(hot_query_plans, label):
+    plans = hot_query_plans[label]
+    assert plans, f"{label} issued no statements"
+    for statement, plan in plans:
+        scans = seq_scans(plan)
+        assert not scans, f"Seq Scan on {', '.join(scans)} in {label}: {' '.join(statement.split())[:200]}"